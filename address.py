@@ -2,7 +2,10 @@
 Collection of common operations on board addresses.
 """
 
-from typing import Optional, List
+from collections import deque
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
+import numpy as np
 
 # the rows on the board
 NUMBERS = "01234"
@@ -56,10 +59,6 @@ corner_positions = [
 ]
 
 
-def is_in_corner(addr: str) -> bool:
-    return addr in corner_positions
-
-
 def to_indices(addr: str) -> tuple:
     """
     Convert a position address to array indices.
@@ -74,7 +73,7 @@ def to_indices(addr: str) -> tuple:
     return letter, number
 
 
-def is_valid(addr: str):
+def _is_valid(addr: str):
     """Checks if the given address is valid."""
     if isinstance(addr, str) and len(addr) == 2:
         # b0 is the only valid addr in row 0
@@ -112,11 +111,11 @@ def get_displacement(addr_a: str, addr_b: str):
     return (x2 - x1, y2 - y1)
 
 
-def is_adjacent(addr_a: str, addr_b: str):
+def _is_adjacent(addr_a: str, addr_b: str):
     """Checks if two addresses are adjacent."""
 
     # automatically return false if either pos is invalid
-    if not is_valid(addr_a) or not is_valid(addr_b):
+    if not _is_valid(addr_a) or not _is_valid(addr_b):
         # print('Not valid positions')
         return False
 
@@ -132,7 +131,7 @@ def is_adjacent(addr_a: str, addr_b: str):
     return (abs(diff[0]) + abs(diff[1])) == 1
 
 
-def get_adjacent_addrs(addr: str) -> List[str]:
+def _get_adjacent_addrs(addr: str) -> List[str]:
     """
     Return a list of positions adjacent to this one.
     """
@@ -147,7 +146,7 @@ def get_adjacent_addrs(addr: str) -> List[str]:
         for let in LETTERS:
             for num in NUMBERS:
                 test_addr = let + num
-                if is_adjacent(addr, test_addr):
+                if _is_adjacent(addr, test_addr):
                     adjacent_addrs.append(test_addr)
 
     return adjacent_addrs
@@ -161,6 +160,16 @@ def move_towards(addr_from: str, addr_to: str, steps=1):
 
     Only works if the two addresses are in the same row or same column.
     """
+    # jumping over an adjacent address is the common case (captures)
+    if steps == 2:
+        landing = _JUMP_LANDINGS.get((addr_from, addr_to))
+        if landing is not None:
+            return landing
+
+    return _move_towards(addr_from, addr_to, steps)
+
+
+def _move_towards(addr_from: str, addr_to: str, steps=1):
     disp = get_displacement(addr_from, addr_to)
     if disp[0] and disp[1]:  # both components are non-zero
         raise ValueError("addresses not in same row or same column")
@@ -210,3 +219,163 @@ def move(addr: str, dx: int, dy: int) -> Optional[str]:
         return str(LETTERS[col]) + str(NUMBERS[row])
     except IndexError:
         return None
+
+
+# Board topology
+# --------------
+# Everything below is computed once at import time from the functions above,
+# so that move generation only has to do table lookups.
+# Positions are indexed by their order in possible_pos.
+
+# the index of each address in possible_pos
+ADDR_INDEX: Dict[str, int] = {addr: i for i, addr in enumerate(possible_pos)}
+
+# the number of positions on the board
+NUM_POSITIONS = len(possible_pos)
+
+# for each position, the indices of its adjacent positions
+NEIGHBORS: List[Tuple[int, ...]] = [
+    tuple(ADDR_INDEX[adj] for adj in _get_adjacent_addrs(addr))
+    for addr in possible_pos
+]
+
+# for each position, True if a piece there cannot be captured
+CORNERS: List[bool] = [addr in corner_positions for addr in possible_pos]
+
+
+def _build_jumps() -> List[Tuple[int, int, int]]:
+    """
+    Find every (from, over, landing) triple where a piece at "from" can
+    jump over the adjacent position "over" into "landing".
+    """
+    jumps = []
+    for i, addr_from in enumerate(possible_pos):
+        for j in NEIGHBORS[i]:
+            for k in NEIGHBORS[j]:
+                if k == i:
+                    continue
+                addr_to = possible_pos[k]
+                delta = get_displacement(addr_from, addr_to)
+                if delta not in [(0, 2), (2, 0), (0, -2), (-2, 0)]:
+                    continue
+                # the landing must be in line with the jump
+                # (rules out bending around the origin position)
+                if _move_towards(addr_from, possible_pos[j], 2) == addr_to:
+                    jumps.append((i, j, k))
+    return jumps
+
+
+# all jumps on the board, as (from, over, landing) triples
+JUMPS: List[Tuple[int, int, int]] = _build_jumps()
+
+# for each position, the (over, landing) pairs of jumps starting there
+JUMPS_FROM: List[Tuple[Tuple[int, int], ...]] = [
+    tuple((j, k) for i, j, k in JUMPS if i == n) for n in range(NUM_POSITIONS)
+]
+
+
+def _build_distances(blocked: int = 0) -> np.ndarray:
+    """
+    Find the number of steps between every pair of positions
+    with breadth-first search, without going through blocked positions
+    (given as a bitmask of indices).
+
+    Unreachable pairs, and pairs with a blocked position, are -1.
+    """
+    distances = np.full((NUM_POSITIONS, NUM_POSITIONS), -1, dtype=np.int8)
+    for source in range(NUM_POSITIONS):
+        if blocked >> source & 1:
+            continue
+        distances[source, source] = 0
+        queue = deque([source])
+        while queue:
+            i = queue.popleft()
+            for j in NEIGHBORS[i]:
+                if distances[source, j] < 0 and not blocked >> j & 1:
+                    distances[source, j] = distances[source, i] + 1
+                    queue.append(j)
+    distances.setflags(write=False)
+    return distances
+
+
+# the number of steps between every pair of positions
+DISTANCES: np.ndarray = _build_distances()
+
+# string versions of the tables above
+_VALID_ADDRS = frozenset(possible_pos)
+_CORNER_ADDRS = frozenset(corner_positions)
+_ADJACENT_ADDRS: Dict[str, Tuple[str, ...]] = {
+    addr: tuple(possible_pos[j] for j in NEIGHBORS[i])
+    for i, addr in enumerate(possible_pos)
+}
+_ADJACENT_PAIRS = frozenset(
+    (addr, adj) for addr, adjs in _ADJACENT_ADDRS.items() for adj in adjs
+)
+_JUMP_LANDINGS: Dict[Tuple[str, str], str] = {
+    (possible_pos[i], possible_pos[j]): possible_pos[k] for i, j, k in JUMPS
+}
+_JUMP_OVERS: Dict[Tuple[str, str], str] = {
+    (possible_pos[i], possible_pos[k]): possible_pos[j] for i, j, k in JUMPS
+}
+
+
+def is_in_corner(addr: str) -> bool:
+    return addr in _CORNER_ADDRS
+
+
+def is_valid(addr: str):
+    """Checks if the given address is valid."""
+    return isinstance(addr, str) and addr in _VALID_ADDRS
+
+
+def is_adjacent(addr_a: str, addr_b: str):
+    """Checks if two addresses are adjacent."""
+    return (addr_a, addr_b) in _ADJACENT_PAIRS
+
+
+def get_adjacent_addrs(addr: str) -> List[str]:
+    """
+    Return a list of positions adjacent to this one.
+    """
+    if addr[1:] == "0":
+        addr = "b0"  # every address in row 0 is the origin position
+    return list(_ADJACENT_ADDRS[addr])
+
+
+def get_jump_landing(addr_from: str, addr_over: str) -> Optional[str]:
+    """
+    Get the address a piece at addr_from lands on after jumping over
+    the adjacent address addr_over.
+
+    If the jump is not possible on this board, None is returned.
+    """
+    return _JUMP_LANDINGS.get((addr_from, addr_over))
+
+
+def get_jump_over(addr_from: str, addr_to: str) -> Optional[str]:
+    """
+    Get the address that is jumped over when a piece at addr_from
+    jumps to addr_to.
+
+    If the jump is not possible on this board, None is returned.
+    """
+    return _JUMP_OVERS.get((addr_from, addr_to))
+
+
+def get_distance(addr_a: str, addr_b: str) -> int:
+    """Get the least number of steps between two addresses."""
+    return int(DISTANCES[ADDR_INDEX[addr_a], ADDR_INDEX[addr_b]])
+
+
+@lru_cache(maxsize=2048)
+def get_distances(blocked: int = 0) -> np.ndarray:
+    """
+    Get the number of steps between every pair of positions
+    when the positions in the bitmask `blocked` (e.g. the tigers)
+    cannot be passed through. Unreachable pairs are -1.
+
+    The returned matrix is read-only, and cached for each mask.
+    """
+    if not blocked:
+        return DISTANCES
+    return _build_distances(blocked)
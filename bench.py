@@ -0,0 +1,294 @@
+"""
+Times the hot paths of the game, alone and in a whole CPU vs. CPU game.
+
+Results are written as JSON with the environment they were measured in,
+and can be compared against a saved baseline. To run,
+
+    python bench.py -o baseline.json
+    python bench.py --compare baseline.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+import numpy as np
+
+from huligutta import Board, BitBoard
+import address
+import cpu
+import functions
+import perft
+import selfplay
+
+# a benchmark is a function that sets up and returns the function to time
+Benchmark = Callable[[], Callable[[], object]]
+
+# slowdowns larger than this fraction are reported as regressions
+THRESHOLD = 0.10
+
+
+def _setup(board_class, name: str):
+    backend = "bit" if board_class is BitBoard else "object"
+    board, _ = perft.setup(backend, perft.POSITIONS[name])
+    return board
+
+
+# micro-benchmarks
+# ----------------
+
+
+def bench_adjacent_addrs():
+    addrs = address.possible_pos
+    return lambda: [address.get_adjacent_addrs(addr) for addr in addrs]
+
+
+def bench_is_adjacent():
+    pairs = [(a, b) for a in address.possible_pos for b in address.possible_pos]
+    return lambda: [address.is_adjacent(a, b) for a, b in pairs]
+
+
+def bench_move_towards():
+    pairs = [
+        (a, b)
+        for a in address.possible_pos
+        for b in address.get_adjacent_addrs(a)
+    ]
+    return lambda: [address.move_towards(a, b, 2) for a, b in pairs]
+
+
+def bench_copy_board():
+    board = _setup(Board, "movement")
+    return board.copy_board
+
+
+def bench_tiger_moves(board_class=Board):
+    def setup():
+        return _setup(board_class, "movement").get_tiger_possible_moves
+
+    return setup
+
+
+def bench_capturing_positions():
+    board = _setup(Board, "movement")
+    tigers = board.get_all_tigers()
+    return lambda: [tiger._get_capturing_positions() for tiger in tigers]
+
+
+def bench_goat_move(board_class=Board, name="movement"):
+    def setup():
+        board = _setup(board_class, name)
+        random.seed(0)
+        return lambda: cpu.compute_goat_move(board)
+
+    return setup
+
+
+def bench_optimal_stalemate():
+    triples = random.Random(0).sample(list(_tiger_triples()), 50)
+    return lambda: [functions.get_optimal_stalemate(*t) for t in triples]
+
+
+def _tiger_triples():
+    addrs = address.possible_pos
+    n = len(addrs)
+    for i in range(n):
+        for j in range(i + 1, n):
+            for k in range(j + 1, n):
+                yield addrs[i], addrs[j], addrs[k]
+
+
+def bench_edit_distance(cached: bool):
+    def setup():
+        board = _setup(Board, "movement")
+        if cached:
+            return lambda: functions.edit_distance(board)
+
+        def run():
+            functions._edit_distance.cache_clear()
+            return functions.edit_distance(board)
+
+        return run
+
+    return setup
+
+
+# macro-benchmarks
+# ----------------
+
+
+def bench_game(board_name: str):
+    def setup():
+        return lambda: selfplay.play_game(0, board_name)
+
+    return setup
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "address.get_adjacent_addrs": bench_adjacent_addrs,
+    "address.is_adjacent": bench_is_adjacent,
+    "address.move_towards": bench_move_towards,
+    "Board.copy_board": bench_copy_board,
+    "Board.get_tiger_possible_moves": bench_tiger_moves(Board),
+    "BitBoard.get_tiger_possible_moves": bench_tiger_moves(BitBoard),
+    "Tiger._get_capturing_positions": bench_capturing_positions,
+    "cpu.compute_goat_move[placement]": bench_goat_move(Board, "placement"),
+    "cpu.compute_goat_move[movement]": bench_goat_move(Board, "movement"),
+    "cpu.compute_goat_move[bit]": bench_goat_move(BitBoard, "movement"),
+    "functions.get_optimal_stalemate": bench_optimal_stalemate,
+    "functions.edit_distance": bench_edit_distance(cached=False),
+    "functions.edit_distance[cached]": bench_edit_distance(cached=True),
+    "game[object]": bench_game("object"),
+    "game[bit]": bench_game("bit"),
+}
+
+
+class Timing(NamedTuple):
+    """The time one call of a benchmark took, in seconds."""
+
+    min: float
+    median: float
+    mean: float
+    stdev: float
+
+    # the number of calls per repeat, and the number of repeats
+    loops: int
+    repeat: int
+
+
+def measure(run: Callable[[], object], repeat=5, min_time=0.2) -> Timing:
+    """
+    Time a function. The number of calls per repeat is doubled until
+    a repeat takes at least `min_time` seconds.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    times = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        times.append((time.perf_counter() - start) / loops)
+
+    stdev = statistics.stdev(times) if len(times) > 1 else 0.0
+    return Timing(
+        min(times),
+        statistics.median(times),
+        statistics.mean(times),
+        stdev,
+        loops,
+        repeat,
+    )
+
+
+def get_metadata() -> dict:
+    """Describe the environment the benchmarks are run in."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(names: List[str], repeat=5, min_time=0.2, verbose=True) -> dict:
+    """Run benchmarks and get the results as a JSON-serializable dict."""
+    results = {}
+    for name in names:
+        timing = measure(BENCHMARKS[name](), repeat, min_time)
+        results[name] = dict(timing._asdict(), ops_per_sec=1 / timing.median)
+        if verbose:
+            print(
+                f"{name:<36} {timing.median * 1e6:>12.2f} us "
+                f"(+- {timing.stdev * 1e6:.2f})"
+            )
+    return {"metadata": get_metadata(), "benchmarks": results}
+
+
+def compare(results: dict, baseline: dict, threshold=THRESHOLD) -> List[str]:
+    """
+    Print how the results compare to a baseline.
+    Returns the names of the benchmarks that got slower than the threshold.
+    """
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<36} {'-':>12} {result['median'] * 1e6:>12.2f}")
+            continue
+        change = result["median"] / base["median"] - 1
+        mark = ""
+        if change > threshold:
+            mark = "  slower"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  faster"
+        print(
+            f"{name:<36} {base['median'] * 1e6:>12.2f} "
+            f"{result['median'] * 1e6:>12.2f} {change:>+8.1%}{mark}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-o", "--output", help="write the results to this file")
+    parser.add_argument("--compare", help="compare against a saved result file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "-k", "--filter", help="only run benchmarks whose names contain this"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.filter or args.filter in name]
+    results = run(names, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,83 @@
 Contains functions relating to
 generating moves given a board.
 """
+import functools
 import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from huligutta import Board
+from huligutta.bitboard import FULL_MASK, NEIGHBOR_MASKS, from_board
 from typing import Optional
+import address
+
+# an endgame tablebase to play perfectly with (see load_tablebase())
+tablebase = None
+
+
+def load_tablebase(path: str):
+    """Load an endgame tablebase built by huligutta.tablebase.
+
+    Once loaded, both CPUs play from the tablebase
+    after all the goats have been placed.
+    """
+    global tablebase
+    from huligutta.tablebase import Tablebase
+
+    tablebase = Tablebase(path)
+
+
+# a search engine to choose moves with (see use_search() and use_mcts())
+searcher = None
+
+
+def use_search(time_limit: Optional[float] = None, node_limit: Optional[int] = None):
+    """Choose moves with an alpha-beta search instead of the heuristics.
+
+    Each move is searched for up to time_limit seconds and/or
+    node_limit positions. The statistics of the last search are
+    in searcher.last_result. Call with no budget to stop searching.
+    """
+    global searcher
+    from huligutta.search import Searcher
+
+    if hasattr(searcher, "close"):
+        searcher.close()
+    if time_limit is None and node_limit is None:
+        searcher = None
+    else:
+        searcher = Searcher(time_limit, node_limit)
+
+
+def use_mcts(
+    time_ms: Optional[float] = None, rollouts: Optional[int] = None, processes=1
+):
+    """Choose moves with Monte Carlo tree search instead of the heuristics.
+
+    Each move is searched for up to time_ms milliseconds and/or
+    rollouts playouts, spread over a number of processes.
+    Call with no budget to stop searching.
+    """
+    global searcher
+    from huligutta.mcts import MCTS
+
+    if hasattr(searcher, "close"):
+        searcher.close()
+    if time_ms is None and rollouts is None:
+        searcher = None
+    else:
+        searcher = MCTS(time_ms, rollouts, processes)
+
+
+def play_move(board: Board, move: tuple, is_tiger: bool) -> bool:
+    """Play a move returned by compute_tiger_move or compute_goat_move.
+
+    Returns True if the move was successful.
+    """
+    if len(move) == 1:  # place a piece
+        if is_tiger:
+            return board.place_tiger(move[0])
+        return board.place_goat(move[0])
+    return board.move_piece(move[0], move[1])  # move a piece
 
 
 def compute_tiger_move(board: Board) -> Optional[tuple]:
@@ -15,6 +89,14 @@ def compute_tiger_move(board: Board) -> Optional[tuple]:
     or a tuple containing a position if a piece needs to be placed.
     """
 
+    if tablebase is not None and board.is_all_goats_placed:
+        move = tablebase.best_move(board, is_goat_turn=False)
+        if move is not None:
+            return move
+
+    if searcher is not None:
+        return searcher.search(board, is_goat_turn=False).move
+
     # Randomize tiger positions
     tiger_list = board.get_all_tiger_positions()
     if len(tiger_list) < 3:
@@ -56,6 +138,14 @@ def compute_goat_move(board: Board) -> Optional[tuple]:
     or a tuple containing a position if a piece needs to be placed.
     """
 
+    if tablebase is not None and board.is_all_goats_placed:
+        move = tablebase.best_move(board, is_goat_turn=True)
+        if move is not None:
+            return move
+
+    if searcher is not None:
+        return searcher.search(board, is_goat_turn=True).move
+
     # list of goats that are about to be captured
     danger_goats = board.get_tiger_capturing_moves()
 
@@ -73,20 +163,17 @@ def compute_goat_move(board: Board) -> Optional[tuple]:
             landing_pos, goat_pos = random.choice(danger_goats)
             pos_choice = landing_pos
         else:
-            # try to choose a position that blocks a tiger
-            pos_choice = None
-            empty_list = board.get_all_empty_positions()
-
-            for pos in empty_list:
-                if board.is_pos_blocking(pos.address) and board.is_pos_safe(
-                    pos.address
-                ):
-                    pos_choice = pos
-                    break
+            # try to choose a safe position that blocks a tiger
+            threats = board.get_threat_map()
+            empty = FULL_MASK & ~(board.tigers | board.goats)
+            choices = empty & threats.blocking & ~threats.threatened
+            if choices:
+                # the first one, in address order
+                i = (choices & -choices).bit_length() - 1
+                return (address.possible_pos[i],)
 
             # if cannot find a blocking move, choose a random position
-            if pos_choice is None:
-                pos_choice = random.choice(empty_list)
+            pos_choice = random.choice(board.get_all_empty_positions())
 
         if pos_choice:
             return (pos_choice.address,)
@@ -105,17 +192,21 @@ def compute_goat_move(board: Board) -> Optional[tuple]:
             goat_pos_choice = goat_pos
             move_choice = random.choice(goat_pos.piece.get_valid_moves())
         else:
-            # try to find a safe move
-            for goat_pos in goat_list:
-                # this goat is blocking a tiger, try to find another one
-                if board.is_pos_blocking(goat_pos.address):
-                    continue
-
-                for move in goat_pos.piece.get_valid_moves():
-                    if board.is_pos_safe(move):
-                        goat_pos_choice = goat_pos
-                        move_choice = move
-                        break
+            # try to find a safe move for a goat that isn't blocking a tiger
+            threats = board.get_threat_map()
+            safe = FULL_MASK & ~(board.tigers | board.goats | threats.threatened)
+            goats = board.goats & ~threats.blocking
+
+            # the goats are tried from the last one in address order
+            while goats:
+                i = goats.bit_length() - 1
+                goats ^= 1 << i
+                moves = NEIGHBOR_MASKS[i] & safe
+                if moves:
+                    goat_pos_choice = board.get_pos(address.possible_pos[i])
+                    j = next(j for j in address.NEIGHBORS[i] if moves >> j & 1)
+                    move_choice = address.possible_pos[j]
+                    break
 
         # if couldn't find a goat yet, pick one at random
         if goat_pos_choice is None:
@@ -131,3 +222,71 @@ def compute_goat_move(board: Board) -> Optional[tuple]:
             return (goat_pos_choice.address, move_choice)
         else:
             return None
+
+
+class BackgroundCPU:
+    """Computes CPU moves in a worker thread, so the GUI stays responsive.
+
+    Moves are computed one at a time, on a copy of the board. While the
+    other side is thinking, an engine with a ponder() method (such as
+    the alpha-beta search) can keep searching the position the other
+    side faces. Call close() to stop the thread.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cpu")
+        # the stop events of the moves and ponders that haven't finished
+        self._stop_events = {}
+        self._ponder = None
+
+    def _run(self, compute, board, stop: threading.Event):
+        # searches are only ever run on this thread, one at a time
+        engine = searcher
+        if hasattr(engine, "stop_event"):
+            engine.stop_event = stop
+        try:
+            if stop.is_set():
+                return None
+            return compute(board)
+        finally:
+            if hasattr(engine, "stop_event"):
+                engine.stop_event = None
+
+    def _submit(self, compute, board) -> Future:
+        stop = threading.Event()
+        future = self._executor.submit(self._run, compute, from_board(board), stop)
+        self._stop_events[future] = stop
+        future.add_done_callback(lambda f: self._stop_events.pop(f, None))
+        return future
+
+    def compute(self, board: Board, is_tiger: bool) -> Future:
+        """Start computing a move. Returns a future of the move."""
+        self.stop_pondering()
+        if is_tiger:
+            return self._submit(compute_tiger_move, board)
+        return self._submit(compute_goat_move, board)
+
+    def ponder(self, board: Board, is_goat_turn: bool):
+        """Search the other side's position until the next move is computed."""
+        self.stop_pondering()
+        if hasattr(searcher, "ponder"):
+            ponder = functools.partial(searcher.ponder, is_goat_turn=is_goat_turn)
+            self._ponder = self._submit(ponder, board)
+
+    def stop_pondering(self):
+        if self._ponder is not None:
+            self.cancel(self._ponder)
+            self._ponder = None
+
+    def cancel(self, future: Future):
+        """Cancel a move; a search that already started is stopped early."""
+        if not future.cancel():
+            stop = self._stop_events.get(future)
+            if stop is not None:
+                stop.set()
+
+    def close(self):
+        """Stop computing and stop the worker thread."""
+        for stop in list(self._stop_events.values()):
+            stop.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
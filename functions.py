@@ -8,12 +8,17 @@ __email__ = "cjfelix.hawaii.edu"
 __status__ = "Dev"
 
 from huligutta import Board, Tiger
+from huligutta import stalemate as stalemate_catalog
+from huligutta.bitboard import get_masks
+from huligutta.ranking import popcount
+from functools import lru_cache
 from itertools import combinations
 from copy import deepcopy
-import networkx as nx
-from networkx.algorithms import bipartite
+from scipy.optimize import linear_sum_assignment
 import random
 import numpy as np
+import address
+from address import possible_pos
 
 log_file = "dataset/data.txt"
 
@@ -32,24 +37,9 @@ def get_optimal_stalemate(pos1: str, pos2: str, pos3: str) -> Board:
     board.place_tiger(pos2)
     board.place_tiger(pos3)
 
-    tigers = board.get_all_tigers()
-
-    positions = board.positions
-
-    # first pass: place goats in all positions adjacent to the tigers
-    for tiger in tigers:
-
-        # place goats in all positions adjacent to the tiger
-        for adj_pos in tiger.pos.get_adjacent_positions():
-            if adj_pos.is_empty():
-                adj_pos.place_goat()
-
-    # second pass: place goats to block all capturing moves
-    for tiger in tigers:
-
-        # place goats in all capturing positions
-        for capturing_addr in tiger.get_capturing_moves():
-            board.place_goat(capturing_addr)
+    # the stalemating goats are precomputed for every set of tigers
+    for addr in stalemate_catalog.get_goat_addrs(pos1, pos2, pos3):
+        board.place_goat(addr)
 
     return board
 
@@ -125,102 +115,92 @@ def edit_distance(board: Board) -> int:
     # input: board positions
     # return: edit distance value
 
-    tigers = board.get_all_tiger_positions()
-    numGoats = board.get_num_goats()
+    return _edit_distance(*get_masks(board))
 
-    stalemate_board = get_optimal_stalemate(
-        tigers[0].address, tigers[1].address, tigers[2].address
-    )
-    # _, stalematePositions = stalemate(tigers[0], tigers[1], tigers[2])
-    possible_pos = board.get_all_addresses()
-    # Initializing Bipartite graph
-    B = nx.Graph()
-    B.add_nodes_from(list(range(23)), bipartite=0)
-    B.add_nodes_from(possible_pos, bipartite=1)
-
-    # Populate graph
-    for i, pos in enumerate(possible_pos):
-        for stalematePos in stalemate_board.get_all_positions():
-
-            # print('DEBUG: pos ', pos, ' stalematePos ',stalematePos)
-            # print('DEBUG: possible_pos[pos] ', boardPosition[possible_pos[pos]], ' stalematePositions[stalematePos] ', stalematePositions[stalematePos])
-            # print('DEBUG: pos ', possible_pos[pos], ' stalematePos ',stalematePos)
-            # print(10 - num_moves(pos,stalematePos))
-            if board.get_pos(stalematePos.address).is_goat() and stalematePos.is_goat():
-
-                # print('stalematePos',stalematePos, 'weight',10 - num_moves(possible_pos[pos],stalematePos))
-                B.add_edge(
-                    i,
-                    stalematePos,
-                    weight=-10 + num_moves(pos, stalematePos.address),
-                )
-            # elif boardPosition[possible_pos[pos]] == stalematePositions[stalematePos] and possible_pos[pos] == stalematePos:
-            #     B.add_edge(pos,stalematePos, weight = -1e20)
-            else:
-                B.add_edge(i, stalematePos.address, weight=1e20)
-
-    # Bipartite Max Matching
-    # print(B.edges(data=True))
-
-    try:
-        maxMatching = bipartite.minimum_weight_full_matching(B)
-    except Exception:
-        return 0
 
-    # print(maxMatching)
-    Sum = 0
-    # Collect sum of weights
-    n = 0
-    for key, item in maxMatching.items():
-        if n == 23:
-            break
-        # # print(B.get_edge_data(key,item)['weight'])
-        if board.get_pos(possible_pos[key]).is_goat():
-            Sum = Sum + num_moves(possible_pos[key], item)
-        # print(Sum)
-        n = n + 1
+def edit_distance_batch(boards) -> np.ndarray:
+    """
+    Compute the edit distance of many boards.
 
-    return Sum
+    `boards` can be a list of boards, or a pair of arrays of
+    tiger and goat bitmasks (see huligutta.bitboard.get_masks()).
 
+    The stalemates and the cost matrices of all the boards are looked up
+    at once; only the assignment problems are solved one board at a time.
+    """
+    if isinstance(boards, tuple):
+        tiger_masks, goat_masks = boards
+    else:
+        masks = [get_masks(board) for board in boards]
+        tiger_masks = [tigers for tigers, _ in masks]
+        goat_masks = [goats for _, goats in masks]
+
+    tiger_masks = np.asarray(tiger_masks, dtype=np.int64).reshape(-1)
+    goat_masks = np.asarray(goat_masks, dtype=np.int64).reshape(-1)
+    distances = np.zeros(len(tiger_masks), dtype=np.int64)
+
+    # there is no stalemate without three tigers
+    has_stalemate = popcount(tiger_masks) == 3
+    stalemates = stalemate_catalog.get_goat_masks(tiger_masks[has_stalemate])
+    goat_masks = goat_masks[has_stalemate]
+
+    # the goats and the stalemate positions of each board, in the
+    # first num_goats and num_targets columns
+    goat = ((goat_masks[:, None] >> _SHIFTS) & 1).astype(bool)
+    target = ((stalemates[:, None] >> _SHIFTS) & 1).astype(bool)
+    goat_order = np.argsort(~goat, axis=1, kind="stable")
+    target_order = np.argsort(~target, axis=1, kind="stable")
+    num_goats = goat.sum(axis=1)
+    num_targets = target.sum(axis=1)
+
+    # the distance of every goat to every stalemate position
+    costs = move_distances[goat_order[:, :, None], target_order[:, None, :]]
+
+    totals = np.zeros(len(costs), dtype=np.int64)
+    for n in np.flatnonzero((num_goats > 0) & (num_targets > 0)):
+        cost = costs[n, : num_goats[n], : num_targets[n]]
+        row_ind, col_ind = linear_sum_assignment(cost)
+        totals[n] = cost[row_ind, col_ind].sum()
+
+    distances[has_stalemate] = totals
+    return distances
+
+
+# distances are cached by the pieces, which are all they depend on
+@lru_cache(maxsize=1 << 16)
+def _edit_distance(tigers: int, goats: int) -> int:
+    """
+    The least number of moves needed to move the goats onto
+    the positions that stalemate the tigers.
 
-def num_moves(pos1, pos2):
-    # Input: i,j indices in the position graph
-    # Output: number of moves from start posiiton to end position
-    dist = 0
-    alphabet = " abcdef"
-
-    startX = pos1[0]
-    startY = pos1[1]
-    endX = pos2[0]
-    endY = pos2[1]
-
-    # print('pos1 ', pos1)
-    # print('pos2 ', pos2)
-    # print('endX ',alphabet.index(endX) )
-    # print('endY ',int(endY))
-    # print('startX ',alphabet.index(startX) )
-    # print('startY ',int(startY))
-
-    if pos1 == pos2:
+    Each goat is assigned to one stalemate position (or none, if there are
+    more goats than positions) by solving a linear assignment problem.
+    """
+    tiger_addrs = [addr for i, addr in enumerate(possible_pos) if tigers >> i & 1]
+    if len(tiger_addrs) != 3:
+        return 0  # there is no stalemate without three tigers
+
+    stalemate = stalemate_catalog.get_goat_mask(*tiger_addrs)
+    rows = [i for i in range(len(possible_pos)) if goats >> i & 1]
+    cols = [i for i in range(len(possible_pos)) if stalemate >> i & 1]
+    if not rows or not cols:
         return 0
-    else:
-        if pos1 == "b0":
-            if endX in "bcde":
-                startX = endX
-            elif endX == "a":
-                startX = "b"
-            elif endX == "f":
-                startX = "e"
-        elif pos2 == "b0":
-            if startX in "bcde":
-                endX = startX
-            elif startX == "a":
-                endX = "b"
-            elif startX == "f":
-                endX = "e"
-        return abs((int(endY) - int(startY))) + abs(
-            (alphabet.index(endX) - alphabet.index(startX))
-        )
+
+    costs = move_distances[np.ix_(rows, cols)]
+    row_ind, col_ind = linear_sum_assignment(costs)
+    return int(costs[row_ind, col_ind].sum())
+
+
+def num_moves(pos1, pos2):
+    # Input: addresses of two positions
+    # Output: number of moves from start position to end position
+    return address.get_distance(pos1, pos2)
+
+
+# the number of moves between every pair of positions, by index in possible_pos
+move_distances = address.DISTANCES
+
+_SHIFTS = np.arange(len(possible_pos), dtype=np.int64)
 
 
 def board2mat(board):
@@ -11,10 +11,13 @@ __status__ = "Dev"
 from tkinter import *
 from tkinter import messagebox
 import os
+import random
 import numpy as np
 import sys
 import time
 from huligutta import Board
+from huligutta.board import NUM_TIGERS
+from huligutta.gamelog import GameLogger, GameRecord
 from functions import *
 from PIL import ImageTk, Image
 from random import randint, choice, sample
@@ -24,7 +27,9 @@ import cpu
 # GAME VARIABLES
 # ==============
 
-DELAY = 0.1  # how long it takes for the CPU to make a move (in seconds)
+DELAY = 0.1  # how long it takes for the CPU to make a move (in seconds, can be 0)
+POLL_DELAY = 20  # how often to check if the CPU has computed its move (in milliseconds)
+PONDER = True  # if True, the CPU keeps searching while the player thinks
 
 # Game mode:
 # Uncomment to choose the game mode
@@ -83,10 +88,36 @@ possible_pos = [
     "f2",
     "f3",
 ]
+# where each position is drawn on the screen
+screen_positions = {
+    "b0": (boardSize / 2, boardSize / 10),
+    "a1": (boardSize / 10, boardSize / 2 - 70),
+    "a2": (boardSize / 10, boardSize / 2),
+    "a3": (boardSize / 10, boardSize / 2 + 70),
+    "b1": (boardSize / 2 - 65, boardSize / 2 - 70),
+    "b2": (boardSize / 2 - 100, boardSize / 2),
+    "b3": (boardSize / 2 - 135, boardSize / 2 + 70),
+    "b4": (boardSize / 10, boardSize - boardSize / 10),
+    "c1": (boardSize / 2 - 25, boardSize / 2 - 70),
+    "c2": (boardSize / 2 - 38, boardSize / 2),
+    "c3": (boardSize / 2 - 53, boardSize / 2 + 70),
+    "c4": (boardSize / 2 - 80, boardSize - boardSize / 10),
+    "d1": (boardSize / 2 + 25, boardSize / 2 - 70),
+    "d2": (boardSize / 2 + 38, boardSize / 2),
+    "d3": (boardSize / 2 + 53, boardSize / 2 + 70),
+    "d4": (boardSize / 2 + 80, boardSize - boardSize / 10),
+    "e1": (boardSize / 2 + 65, boardSize / 2 - 70),
+    "e2": (boardSize / 2 + 100, boardSize / 2),
+    "e3": (boardSize / 2 + 135, boardSize / 2 + 70),
+    "e4": (boardSize - boardSize / 10, boardSize - boardSize / 10),
+    "f1": (boardSize - boardSize / 10, boardSize / 2 - 70),
+    "f2": (boardSize - boardSize / 10, boardSize / 2),
+    "f3": (boardSize - boardSize / 10, boardSize / 2 + 70),
+}
 root = os.path.abspath("images")
 # Game modes:
 class Main:
-    def __init__(self, mode):
+    def __init__(self, mode, delay=DELAY):
 
         img_tiger_path = root + "/tiger.gif"
         img_goat_path = root + "/goat.gif"
@@ -111,6 +142,40 @@ class Main:
         # if False, stop the program
         self.is_running = True
 
+        # CPU scheduling
+        # ------------------------------------------------------------------------------
+
+        # how long to wait before each CPU move (in seconds)
+        self.delay = delay
+        # if True, CPU vs. CPU games stop until resumed or stepped
+        self.is_paused = False
+        # if True, CPU vs. CPU games ignore the delay
+        self.is_fast_forward = False
+        # the id of the pending CPU turn callback, if any
+        self.cpu_job = None
+        # incremented every time a game is started
+        self.game_id = 0
+        # computes the CPU moves of player vs. CPU games in a worker thread
+        self.cpu_worker = cpu.BackgroundCPU()
+        # the CPU move being computed, if any
+        self.cpu_future = None
+
+        # game logging
+        # ------------------------------------------------------------------------------
+
+        self.logger = GameLogger()
+        # the seed of the current game
+        self.seed = None
+        # features logged during the current game, with the move they were logged at
+        self.features = []
+        # if True, the current game has already been logged
+        self.is_logged = False
+
+        print("========================")
+        print("Attempts: " + str(len(self.logger)))
+        print("Game Mode: " + MODE)
+        print("========================")
+
         # For self.turn, Goat: False, Tiger: True
         self.turn = False  # TODO: make this a number or string for readability?
         self.initialize_board()
@@ -125,6 +190,7 @@ class Main:
         self.numGoats = StringVar()
         self.goatsEatentext = StringVar()
         self.selectedBtn = StringVar()
+        self.thinkingtext = StringVar()
         self.goatEaten = 0
         self.goatCount = 0
         self.moveCount = 0
@@ -143,6 +209,11 @@ class Main:
             font=("Helvetica", fontSize),
             textvariable=self.selectedBtn,
         ).place(x=boardSize - 100, y=50)
+        self.thinkingDisp = Label(
+            self.window,
+            font=("Helvetica", fontSize),
+            textvariable=self.thinkingtext,
+        ).place(x=boardSize - 100, y=75)
         self.goatDisp = Label(
             self.window,
             font=("Helvetica", fontSize),
@@ -154,6 +225,13 @@ class Main:
             textvariable=self.goatsEatentext,
         ).place(x=10, y=50)
         self.update_canvas()
+
+        # position buttons, by address
+        self.buttons = {}
+        # the name of the image each button shows ("" if empty)
+        self.button_images = {}
+        self.create_buttons()
+
         self.reportBugbtn = Button(
             self.window, text="Report Bug", command=lambda: self.report_bug()
         ).place(x=70, y=boardSize - 15, anchor=CENTER)
@@ -162,6 +240,22 @@ class Main:
             self.window, text="Undo", command=lambda: self.undo_move()
         ).place(x=170, y=boardSize - 15, anchor=CENTER)
 
+        if MODE == "cpu":
+            self.pausetext = StringVar(value="Pause")
+            self.fasttext = StringVar(value="Fast")
+            self.btn_pause = Button(
+                self.window, textvariable=self.pausetext, command=self.toggle_pause
+            ).place(x=270, y=boardSize - 15, anchor=CENTER)
+            self.btn_step = Button(
+                self.window, text="Step", command=self.step_cpu
+            ).place(x=340, y=boardSize - 15, anchor=CENTER)
+            self.btn_fast = Button(
+                self.window, textvariable=self.fasttext, command=self.toggle_fast_forward
+            ).place(x=410, y=boardSize - 15, anchor=CENTER)
+            self.window.bind("<space>", lambda event: self.toggle_pause())
+            self.window.bind("s", lambda event: self.step_cpu())
+            self.window.bind("f", lambda event: self.toggle_fast_forward())
+
         # Buttons
         # self.btn1  = Button(self.window, bd=buttonStyle,command=lambda : self.button_position('b0')).place(x=boardSize/2,y=boardSize/10,height=30,width=30,anchor=CENTER)
         # self.btn2  = Button(self.window, bd=buttonStyle,command=lambda : self.button_position('a1')).place(x=boardSize/10,y=boardSize/2 - 70,height=30,width=30,anchor=CENTER)
@@ -241,12 +335,6 @@ class Main:
             boardSize - boardSize / 10,
         )
 
-        printAndLog("========================")
-        attempts = textCount("Attempts: ")
-        printAndLog("Attempts: " + str(attempts))
-        printAndLog("Game Mode: " + MODE)
-        printAndLog("========================")
-
     def button_position(self, pos):
         """
         Called when a position button is clicked.
@@ -271,7 +359,6 @@ class Main:
         if self.moveCount_prev != self.moveCount:
             self.update_game()
             self.log_data()
-        self.window.mainloop()
 
     def pvpMode(self, pos):
 
@@ -420,11 +507,32 @@ class Main:
         self.update_canvas()
         self.update_game()
 
-        time.sleep(DELAY)
-        self.do_cpu_tiger_move()
+        # let the CPU tiger reply once the goat has moved
+        if self.turn == True:
+            self.cancel_cpu_turn()
+            self.cpu_job = self.window.after(self.get_delay_ms(), self.reply_cpu_tiger)
+
+    def reply_cpu_tiger(self):
+        """Start the CPU tiger's reply to the player goat's move."""
+        self.cpu_job = None
+        self.think(True, self.finish_cpu_tiger)
+
+    def finish_cpu_tiger(self, move):
+        """Play the CPU tiger's reply once it is computed."""
+        game_id = self.game_id
+        self.play_cpu_move(move, is_tiger=True)
+        self.update_game()
 
+        # the move may have ended the game and started a new one
+        if game_id != self.game_id:
+            return
+        if board.get_num_tigers() < NUM_TIGERS:
+            # keep placing tigers at the start of the game
+            self.think(True, self.finish_cpu_tiger)
+            return
         self.turn = False
         self.update_canvas()
+        self.ponder()
 
     def tigerMode(self, addr: str):
         """
@@ -482,50 +590,161 @@ class Main:
         # do CPU goat move
         if pass_turn:
             self.turn = False
-            self.do_cpu_goat_move()
-            self.turn = True
+            self.cancel_cpu_turn()
+            self.cpu_job = self.window.after(self.get_delay_ms(), self.reply_cpu_goat)
+
+    def reply_cpu_goat(self):
+        """Start the CPU goat's reply to the player tiger's move."""
+        self.cpu_job = None
+        if len(board.get_all_tiger_positions()) == 3:
+            self.think(False, self.finish_cpu_goat)
+        else:
+            self.finish_cpu_goat(None)  # wait until all tigers are placed
+
+    def finish_cpu_goat(self, move):
+        """Play the CPU goat's reply once it is computed."""
+        game_id = self.game_id
+        self.play_cpu_move(move, is_tiger=False)
+        self.update_game()
+
+        # the move may have ended the game and started a new one
+        if game_id != self.game_id:
+            return
+        self.turn = True
+        self.update_canvas()
+        self.ponder()
+
+    def think(self, is_tiger: bool, on_move):
+        """Compute a CPU move in the background, then call on_move(move).
+
+        The move is computed in a worker thread, and the Tk thread
+        only checks on it with after(), so the window keeps responding.
+        """
+        self.cancel_cpu_turn()
+        self.cpu_future = self.cpu_worker.compute(board, is_tiger)
+        self.thinkingtext.set("Thinking...")
+        self.check_cpu_move(self.cpu_future, board.zobrist_hash, is_tiger, on_move)
+
+    def check_cpu_move(self, future, key, is_tiger: bool, on_move):
+        """Play the move computed in the background, if it is done."""
+        if future is not self.cpu_future:
+            return  # the move was cancelled
+        if not future.done():
+            self.cpu_job = self.window.after(
+                POLL_DELAY, self.check_cpu_move, future, key, is_tiger, on_move
+            )
+            return
+
+        self.cpu_job = None
+        self.cpu_future = None
+        self.thinkingtext.set("")
+        if board.zobrist_hash != key:
+            # a move was undone while thinking, so the move is dropped
+            if is_tiger and board.get_num_tigers() < NUM_TIGERS:
+                # the CPU's own opening tiger was undone; keep placing
+                self.think(is_tiger, on_move)
+                return
+            # give the turn back to the player
+            self.turn = not is_tiger
             self.update_canvas()
+            self.ponder()
+            return
+        on_move(future.result())
+
+    def ponder(self):
+        """Let the CPU keep searching while the player thinks."""
+        if PONDER and MODE in ("goatPlayer", "tigerPlayer"):
+            self.cpu_worker.ponder(board, is_goat_turn=MODE == "goatPlayer")
 
     def do_cpu_tiger_move(self):
         """Have the computer do a move as the Tiger."""
 
-        time.sleep(DELAY)
         if self.turn == True:
-            move = cpu.compute_tiger_move(board)
-            if move:
-                if len(move) == 1:  # place tiger
-                    self.place_tiger(move[0])
-                if len(move) == 2:  # move tiger
-                    self.move_piece(move[0], move[1])
+            self.play_cpu_move(cpu.compute_tiger_move(board), is_tiger=True)
 
         self.update_game()
 
     def do_cpu_goat_move(self):
         """Have the computer do a move as the Goat."""
 
-        time.sleep(DELAY)
         if self.turn == False and len(board.get_all_tiger_positions()) == 3:
-            move = cpu.compute_goat_move(board)
-            if move:
-                if len(move) == 1:  # place goat
-                    self.place_goat(move[0])
-                if len(move) == 2:  # move goat
-                    self.move_piece(move[0], move[1])
+            self.play_cpu_move(cpu.compute_goat_move(board), is_tiger=False)
 
         self.update_game()
 
+    def play_cpu_move(self, move, is_tiger: bool):
+        """Play a move computed by the CPU, if any."""
+        if move:
+            if len(move) == 1:  # place a piece
+                if is_tiger:
+                    self.place_tiger(move[0])
+                else:
+                    self.place_goat(move[0])
+            if len(move) == 2:  # move a piece
+                self.move_piece(move[0], move[1])
+
+    def get_delay_ms(self) -> int:
+        """Get how long to wait before the next CPU move (in milliseconds)."""
+        if self.is_fast_forward:
+            return 0
+        return int(self.delay * 1000)
+
+    def cancel_cpu_turn(self):
+        """Cancel the pending CPU turn, if any."""
+        if self.cpu_job is not None:
+            self.window.after_cancel(self.cpu_job)
+            self.cpu_job = None
+        if self.cpu_future is not None:
+            self.cpu_worker.cancel(self.cpu_future)
+            self.cpu_future = None
+            self.thinkingtext.set("")
+
+    def schedule_cpu_turn(self):
+        """Schedule the next move of a CPU vs. CPU game.
+
+        Only one move is ever pending, so the game runs from the Tk
+        mainloop instead of growing the stack.
+        """
+        self.cancel_cpu_turn()
+        if self.is_running and not self.is_paused:
+            self.cpu_job = self.window.after(self.get_delay_ms(), self.process_turn_cpu)
+
     def process_turn_cpu(self):
-        """Process a turn for a CPU vs. CPU game."""
+        """Process a move for a CPU vs. CPU game, then schedule the next one."""
 
-        self.turn = True
-        self.do_cpu_tiger_move()
-        self.turn = False
-        self.do_cpu_goat_move()
+        self.cpu_job = None
+        game_id = self.game_id
+
+        if self.turn:
+            self.do_cpu_tiger_move()
+        else:
+            self.do_cpu_goat_move()
+
+        # the move may have ended the game and started a new one
+        if game_id == self.game_id:
+            self.turn = not self.turn
 
         # self.log_data()
-        if self.is_running:
+        self.update_canvas()
+        self.schedule_cpu_turn()
+
+    def toggle_pause(self):
+        """Pause or resume a CPU vs. CPU game."""
+        self.is_paused = not self.is_paused
+        self.pausetext.set("Resume" if self.is_paused else "Pause")
+        self.schedule_cpu_turn()
+
+    def step_cpu(self):
+        """Do a single CPU move while a CPU vs. CPU game is paused."""
+        if self.is_paused:
             self.process_turn_cpu()
 
+    def toggle_fast_forward(self):
+        """Turn the delay between CPU moves on or off."""
+        self.is_fast_forward = not self.is_fast_forward
+        self.fasttext.set("Normal" if self.is_fast_forward else "Fast")
+        self.schedule_cpu_turn()
+
     def process_turn_goat(self):
         """Process a turn for a player goat vs. CPU tiger."""
 
@@ -541,27 +760,44 @@ class Main:
         If the move is successful, returns True."""
         success = board.move_piece(from_addr, to_addr)
         if success:
-            printAndLog(board.last_move)
+            print(board.last_move)
         return success
 
     def place_goat(self, addr: str):
         """Place a piece on the board and log it."""
         success = board.place_goat(addr)
         if success:
-            printAndLog(board.last_move)
+            print(board.last_move)
         return success
 
     def place_tiger(self, addr: str):
         """Place a piece on the board and log it."""
         success = board.place_tiger(addr)
         if success:
-            printAndLog(board.last_move)
+            print(board.last_move)
         return success
 
     def undo_move(self, n=1):
         board.undo_move()
+        self.features = [f for f in self.features if f["move"] <= board.num_moves]
         self.update_game()
 
+    def log_game(self, winner=None):
+        """Log the current game, unless it is empty or was already logged."""
+        if self.is_logged or board.num_moves == 0:
+            return
+        self.logger.write(
+            GameRecord(
+                MODE,
+                self.seed,
+                [delta.notation for delta in board.move_history],
+                winner,
+                board.num_captured,
+                self.features or None,
+            )
+        )
+        self.is_logged = True
+
     def update_game(self):
         """Update the screen."""
 
@@ -593,13 +829,16 @@ class Main:
 
         # win condition for goats
         if num_tigers == 3 and possibleMovesCount == 0:
-            printAndLog(f"Goats win ({board.num_moves} moves)")
-            messagebox.showinfo("Game Over", "Goat wins")
+            print(f"Goats win ({board.num_moves} moves)")
+            self.log_game("goat")
+            if MODE != "cpu":  # don't block unattended games
+                messagebox.showinfo("Game Over", "Goat wins")
             self.destroy()
 
         # win condition for tigers
         elif num_captured == 5:
-            printAndLog(f"Tigers win ({board.num_moves} moves)")
+            print(f"Tigers win ({board.num_moves} moves)")
+            self.log_game("tiger")
             # messagebox.showinfo("Game Over", "Tiger wins")
             self.destroy()
 
@@ -614,6 +853,7 @@ class Main:
         # printAndLog("Tigers positions: " + str(tigers))
         editDistance = edit_distance(board)
         # printAndLog("Edit distance: " + str(editDistance))
+        self.features.append({"move": board.num_moves, "edit_distance": editDistance})
 
     def update_canvas(self):
         """Updates any canvas items based on the state of the board."""
@@ -636,47 +876,25 @@ class Main:
         # also update the window
         self.window.update()
 
+    def create_buttons(self):
+        """Create a button for every position (only done once)."""
+        for addr, (x, y) in screen_positions.items():
+            button = Button(
+                self.window,
+                image="",
+                bd=buttonStyle,
+                command=lambda addr=addr: self.button_position(addr),
+            )
+            button.place(x=x, y=y, height=30, width=30, anchor=CENTER)
+            self.buttons[addr] = button
+            self.button_images[addr] = ""
+
     def update_buttons(self, pos, img):
-        # change the images of the board pieces
-
-        screen_positions = {
-            "b0": (boardSize / 2, boardSize / 10),
-            "a1": (boardSize / 10, boardSize / 2 - 70),
-            "a2": (boardSize / 10, boardSize / 2),
-            "a3": (boardSize / 10, boardSize / 2 + 70),
-            "b1": (boardSize / 2 - 65, boardSize / 2 - 70),
-            "b2": (boardSize / 2 - 100, boardSize / 2),
-            "b3": (boardSize / 2 - 135, boardSize / 2 + 70),
-            "b4": (boardSize / 10, boardSize - boardSize / 10),
-            "c1": (boardSize / 2 - 25, boardSize / 2 - 70),
-            "c2": (boardSize / 2 - 38, boardSize / 2),
-            "c3": (boardSize / 2 - 53, boardSize / 2 + 70),
-            "c4": (boardSize / 2 - 80, boardSize - boardSize / 10),
-            "d1": (boardSize / 2 + 25, boardSize / 2 - 70),
-            "d2": (boardSize / 2 + 38, boardSize / 2),
-            "d3": (boardSize / 2 + 53, boardSize / 2 + 70),
-            "d4": (boardSize / 2 + 80, boardSize - boardSize / 10),
-            "e1": (boardSize / 2 + 65, boardSize / 2 - 70),
-            "e2": (boardSize / 2 + 100, boardSize / 2),
-            "e3": (boardSize / 2 + 135, boardSize / 2 + 70),
-            "e4": (boardSize - boardSize / 10, boardSize - boardSize / 10),
-            "f1": (boardSize - boardSize / 10, boardSize / 2 - 70),
-            "f2": (boardSize - boardSize / 10, boardSize / 2),
-            "f3": (boardSize - boardSize / 10, boardSize / 2 + 70),
-        }
-
-        _ = Button(
-            self.window,
-            image=img,
-            bd=buttonStyle,
-            command=lambda: self.button_position(pos),
-        ).place(
-            x=screen_positions[pos][0],
-            y=screen_positions[pos][1],
-            height=30,
-            width=30,
-            anchor=CENTER,
-        )
+        # change the image of a board piece, if it changed since the last update
+        name = str(img)
+        if self.button_images[pos] != name:
+            self.buttons[pos].configure(image=img)
+            self.button_images[pos] = name
 
     def report_bug(self):
         printAndLog("Bug reporting...")
@@ -710,24 +928,35 @@ class Main:
 
         #########################################################
 
+        # log the previous game if it was restarted before it ended
+        self.log_game()
+
         board.clear()
+        self.cancel_cpu_turn()
+        self.cpu_worker.stop_pondering()
+        self.game_id += 1
+        self.seed = random.randrange(1 << 32)
+        random.seed(self.seed)
+        self.features = []
+        self.is_logged = False
         self.turn = True
 
         if MODE == "tigerPlayer":
-            pass
+            self.ponder()
         elif MODE == "goatPlayer":
-            self.do_cpu_tiger_move()
-            self.do_cpu_tiger_move()
-            self.do_cpu_tiger_move()
-            self.turn = False
+            # the CPU places its tigers before the player's turn
+            self.think(True, self.finish_cpu_tiger)
         elif MODE == "cpu":
-            self.process_turn_cpu()  # starts a loop that runs both CPU moves
+            self.schedule_cpu_turn()  # runs both CPU moves from the mainloop
 
         self.update_game()
-        self.window.mainloop()
 
 
 if __name__ == "__main__":
 
     game = Main(MODE)
     game.start()
+    game.window.mainloop()
+    game.log_game()
+    game.logger.close()
+    game.cpu_worker.close()
@@ -11,4 +11,12 @@ __status__ = "Dev"
 from huligutta.board import Board
 from huligutta.position import Position
 from huligutta.piece import Piece, Tiger, Goat
+from huligutta.bitboard import BitBoard
+from huligutta.transposition import TranspositionTable
+from huligutta.vectorized import VectorizedGames
 
+
+# profile the rules engine if HULIGUTTA_PROFILE is set (see huligutta.profiling)
+from huligutta import profiling
+
+profiling.enable_from_env()
@@ -0,0 +1,76 @@
+"""
+file: actions.py
+Description: Integer encoding of moves
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+import address
+
+# the kinds of action
+PLACE = 0  # place a piece on an empty position
+STEP = 1  # move a piece to an adjacent position
+JUMP = 2  # move a tiger over a goat, capturing it
+PASS = 3  # do nothing (only when no other action is possible)
+
+
+class Action(NamedTuple):
+    """
+    An action, with positions given by their index in address.possible_pos.
+    Positions that don't apply to the kind of action are -1.
+    """
+
+    kind: int
+    pos_from: int
+    pos_to: int
+    pos_over: int
+
+
+def _build_actions() -> List[Action]:
+    actions = [Action(PLACE, -1, i, -1) for i in range(address.NUM_POSITIONS)]
+    for i, adjs in enumerate(address.NEIGHBORS):
+        actions.extend(Action(STEP, i, j, -1) for j in adjs)
+    actions.extend(Action(JUMP, i, k, j) for i, j, k in address.JUMPS)
+    actions.append(Action(PASS, -1, -1, -1))
+    return actions
+
+
+# every action, indexed by its integer encoding
+ACTIONS: List[Action] = _build_actions()
+
+# the number of possible actions
+NUM_ACTIONS = len(ACTIONS)
+
+# the encoding of the pass action
+PASS_ACTION = NUM_ACTIONS - 1
+
+# the encoding of each move, keyed by the positions it moves between
+# (pos_to,) for placements, (pos_from, pos_to) for steps and jumps
+_ACTION_INDEX: Dict[tuple, int] = {}
+for _n, _action in enumerate(ACTIONS):
+    if _action.kind == PLACE:
+        _ACTION_INDEX[(_action.pos_to,)] = _n
+    elif _action.kind in (STEP, JUMP):
+        # a pair of positions is never both a step and a jump
+        assert (_action.pos_from, _action.pos_to) not in _ACTION_INDEX
+        _ACTION_INDEX[(_action.pos_from, _action.pos_to)] = _n
+
+
+def encode_move(move: Optional[tuple]) -> int:
+    """
+    Encode a move in the format returned by cpu.compute_tiger_move and
+    cpu.compute_goat_move: (addr,) to place a piece, (addr_from, addr_to)
+    to move one, or None to pass.
+    """
+    if move is None:
+        return PASS_ACTION
+    return _ACTION_INDEX[tuple(address.ADDR_INDEX[addr] for addr in move)]
+
+
+def decode_action(action: int) -> Optional[tuple]:
+    """Decode an action into the move format used by cpu.py."""
+    kind, pos_from, pos_to, _ = ACTIONS[action]
+    if kind == PLACE:
+        return (address.possible_pos[pos_to],)
+    if kind == PASS:
+        return None
+    return (address.possible_pos[pos_from], address.possible_pos[pos_to])
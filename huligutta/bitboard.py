@@ -0,0 +1,598 @@
+"""
+file: bitboard.py
+Description: Board backend that stores the game state as bitmasks
+"""
+
+from typing import List, NamedTuple, Optional, Tuple, Union
+from huligutta.board import NUM_TIGERS, MAX_GOATS, CAPTURES_TO_WIN
+from huligutta import zobrist
+import address
+
+# a mask with a bit set for every position on the board
+FULL_MASK = (1 << address.NUM_POSITIONS) - 1
+
+# for each position, a mask of its adjacent positions
+NEIGHBOR_MASKS: List[int] = [
+    sum(1 << j for j in adjs) for adjs in address.NEIGHBORS
+]
+
+# a mask of all corner positions (pieces there cannot be captured)
+CORNER_MASK = sum(1 << i for i, corner in enumerate(address.CORNERS) if corner)
+
+# for each position, the (goat bit, landing bit, goat index, landing index)
+# of every capture a tiger standing there could make
+CAPTURES_FROM: List[Tuple[Tuple[int, int, int, int], ...]] = [
+    tuple(
+        (1 << j, 1 << k, j, k)
+        for j, k in jumps
+        if not CORNER_MASK & (1 << j)
+    )
+    for jumps in address.JUMPS_FROM
+]
+
+
+class ThreatMap(NamedTuple):
+    """Bitmasks of the positions the tigers threaten."""
+
+    # positions a goat could be captured on (whether or not there is one)
+    threatened: int
+
+    # positions next to a tiger (a goat there blocks the tiger)
+    blocking: int
+
+    # goats that can be captured
+    capturable: int
+
+
+def get_threat_map(tigers: int, goats: int) -> ThreatMap:
+    """Compute the threat map of a board given by its bitmasks."""
+    empty = FULL_MASK & ~(tigers | goats)
+    threatened, blocking = 0, 0
+    mask = tigers
+    while mask:
+        low = mask & -mask
+        i = low.bit_length() - 1
+        mask ^= low
+        blocking |= NEIGHBOR_MASKS[i]
+        for goat_bit, landing_bit, _, _ in CAPTURES_FROM[i]:
+            if empty & landing_bit:
+                threatened |= goat_bit
+    return ThreatMap(threatened, blocking, threatened & goats)
+
+
+def get_masks(board) -> Tuple[int, int]:
+    """Get the tiger and goat bitmasks of any board."""
+    return board.tigers, board.goats
+
+
+def from_board(board) -> "BitBoard":
+    """Copy the state of any board to a new BitBoard (without its history)."""
+    bit_board = BitBoard()
+    bit_board.tigers, bit_board.goats = get_masks(board)
+    bit_board.num_captured = board.num_captured
+    bit_board.is_all_goats_placed = board.is_all_goats_placed
+    bit_board.is_goat_turn = board.is_goat_turn
+    bit_board.zobrist_hash = board.zobrist_hash
+    return bit_board
+
+
+def iter_bits(mask: int):
+    """Iterate over the indices of the set bits of a mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitPiece:
+    """
+    A view of a piece on a BitBoard.
+
+    Pieces are not stored on the board; this is created on demand so that
+    code written against huligutta.Piece keeps working.
+    """
+
+    __slots__ = ("board", "index")
+
+    def __init__(self, board: "BitBoard", index: int):
+        self.board = board
+        self.index = index
+
+    @property
+    def pos(self) -> "BitPosition":
+        return BitPosition(self.board, self.index)
+
+    def get_valid_moves(self) -> List[str]:
+        """
+        Get a list of all addresses this piece can move to.
+        """
+        empty = self.board.empty
+        return [
+            address.possible_pos[j]
+            for j in address.NEIGHBORS[self.index]
+            if empty >> j & 1
+        ]
+
+
+class BitTiger(BitPiece):
+    """A view of a Tiger on a BitBoard."""
+
+    __slots__ = ()
+
+    def _get_capturing_positions(self) -> List[tuple]:
+        """
+        Returns a list of tuples of landing positions and goat positions
+        where moving to the landing position will capture the goat.
+        """
+        board = self.board
+        return [
+            (BitPosition(board, k), BitPosition(board, j))
+            for j, k in board._get_captures(self.index)
+        ]
+
+    def can_capture_pos(self, addr: str) -> Optional[str]:
+        """
+        Checks if this tiger can capture a goat placed at a
+        specific position.
+
+        If it can, then the landing position is returned.
+        """
+        j = address.ADDR_INDEX[addr]
+        empty = self.board.empty
+        for _, _, goat_j, k in CAPTURES_FROM[self.index]:
+            if goat_j == j and empty >> k & 1:
+                return address.possible_pos[k]
+        return None
+
+    def get_capturing_moves(self) -> List[str]:
+        """
+        Get a list of addresses where moving there will capture
+        a goat.
+        """
+        return [
+            address.possible_pos[k]
+            for _, k in self.board._get_captures(self.index)
+        ]
+
+    def get_valid_moves(self) -> List[str]:
+        # combine capturing moves and valid moves
+        valid_moves = super().get_valid_moves()
+        valid_moves.extend(self.get_capturing_moves())
+        return valid_moves
+
+    def __str__(self):
+        return "X"
+
+
+class BitGoat(BitPiece):
+    """A view of a Goat on a BitBoard."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return "O"
+
+
+class BitPosition:
+    """
+    A view of a position on a BitBoard, identified
+    with a letter and number i.e. "a1".
+    """
+
+    __slots__ = ("board", "index")
+
+    def __init__(self, board: "BitBoard", index: int):
+        self.board = board
+        self.index = index
+
+    @property
+    def address(self) -> str:
+        return address.possible_pos[self.index]
+
+    @property
+    def piece(self) -> Union[tuple, BitPiece]:
+        if self.board.tigers >> self.index & 1:
+            return BitTiger(self.board, self.index)
+        if self.board.goats >> self.index & 1:
+            return BitGoat(self.board, self.index)
+        return ()
+
+    def is_empty(self) -> bool:
+        return not (self.board.tigers | self.board.goats) >> self.index & 1
+
+    def is_goat(self) -> bool:
+        return bool(self.board.goats >> self.index & 1)
+
+    def is_tiger(self) -> bool:
+        return bool(self.board.tigers >> self.index & 1)
+
+    def get_adjacent_positions(self) -> List["BitPosition"]:
+        return [BitPosition(self.board, j) for j in address.NEIGHBORS[self.index]]
+
+    def is_adjacent(self, pos_to: "BitPosition") -> bool:
+        """
+        Checks if this position is adjacent to the given position.
+        """
+        return bool(NEIGHBOR_MASKS[self.index] >> pos_to.index & 1)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, BitPosition)
+            and other.board is self.board
+            and other.index == self.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.board), self.index))
+
+    def __str__(self):
+        if self.is_empty():
+            return "-"
+        return str(self.piece)
+
+
+class BitBoard:
+    """
+    Represents the game board as two bitmasks.
+
+    Bit i of `tigers` (or `goats`) is set if position address.possible_pos[i]
+    holds a Tiger (or Goat). This has the same interface as huligutta.Board,
+    but positions and pieces are views that are created when requested.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Reset the board.
+        """
+        self.tigers = 0
+        self.goats = 0
+
+        # the last threat map, and the (tigers, goats) it was computed for
+        self._threat_map: Optional[ThreatMap] = None
+        self._threat_key: Optional[Tuple[int, int]] = None
+
+        # the number of captured goats
+        self.num_captured = 0
+
+        # if True, then 15 goats have been placed at one point
+        self.is_all_goats_placed = False
+
+        # if True, then the last move was made by a tiger
+        self.is_goat_turn = False
+
+        # the Zobrist hash of the board state
+        self.zobrist_hash = 0
+
+        # the history of previous moves, as tuples of the
+        # notation and the state of the board before the move
+        self.move_history: List[tuple] = []
+
+    @property
+    def empty(self) -> int:
+        """A mask of all empty positions."""
+        return FULL_MASK & ~(self.tigers | self.goats)
+
+    def get_state(self) -> tuple:
+        """Get the state of the board as a tuple."""
+        return (
+            self.tigers,
+            self.goats,
+            self.num_captured,
+            self.is_all_goats_placed,
+            self.is_goat_turn,
+            self.zobrist_hash,
+        )
+
+    def set_state(self, state: tuple):
+        """Restore a state returned by get_state()."""
+        (
+            self.tigers,
+            self.goats,
+            self.num_captured,
+            self.is_all_goats_placed,
+            self.is_goat_turn,
+            self.zobrist_hash,
+        ) = state
+
+    def _set_goat_turn(self, is_goat_turn: bool):
+        """Set whose turn it is, and update the hash."""
+        if is_goat_turn != self.is_goat_turn:
+            self.is_goat_turn = is_goat_turn
+            self.zobrist_hash ^= zobrist.GOAT_TURN_KEY
+
+    def copy(self) -> "BitBoard":
+        """Copy the board, including its move history."""
+        board = BitBoard()
+        board.set_state(self.get_state())
+        board.move_history = list(self.move_history)
+        return board
+
+    def print_board(self):
+        """
+        Print the board.
+        """
+        s = {addr: str(self.get_pos(addr)) for addr in address.possible_pos}
+        num_tigers, num_goats = self.num_pieces()
+
+        print(f"\t*\t*\t{ s['b0'] }\t*\t*\t")
+        for row in "123":
+            a, b, c, d, e, f = (s[let + row] for let in address.LETTERS)
+            print(f"{ a }\t{ b }\t{ c }\t\t{ d }\t{ e }\t{ f }")
+        print(f"\t{ s['b4'] }\t{ s['c4'] }\t\t{ s['d4'] }\t{ s['e4'] }")
+
+        print(f"tigers: {num_tigers}, goats: {num_goats}")
+        print(f"captured goats: {self.num_captured}")
+
+    def num_pieces(self) -> tuple:
+        """Get the number of Tigers and Goats."""
+        return bin(self.tigers).count("1"), bin(self.goats).count("1")
+
+    def get_num_goats(self) -> int:
+        """Get the number of Goats."""
+        return bin(self.goats).count("1")
+
+    def get_num_tigers(self) -> int:
+        """Get the number of Tigers."""
+        return bin(self.tigers).count("1")
+
+    def get_pos(self, addr: str) -> BitPosition:
+        """Get a Position by its address."""
+        return BitPosition(self, address.ADDR_INDEX[addr])
+
+    def get_all_positions(self) -> List[BitPosition]:
+        """Get a flattened list of board positions."""
+        return [BitPosition(self, i) for i in range(address.NUM_POSITIONS)]
+
+    def get_all_goat_positions(self) -> List[BitPosition]:
+        """Get a list of all Positions on the board that are holding a Goat."""
+        return [BitPosition(self, i) for i in iter_bits(self.goats)]
+
+    def get_all_tiger_positions(self) -> List[BitPosition]:
+        """Get a list of all Positions on the board that are holding a Tiger."""
+        return [BitPosition(self, i) for i in iter_bits(self.tigers)]
+
+    def get_all_empty_positions(self) -> List[BitPosition]:
+        return [BitPosition(self, i) for i in iter_bits(self.empty)]
+
+    def get_all_tigers(self) -> List[BitTiger]:
+        """Get a list of all Tigers on the board."""
+        return [BitTiger(self, i) for i in iter_bits(self.tigers)]
+
+    def get_all_goats(self) -> List[BitGoat]:
+        """Get a list of all Goats on the board."""
+        return [BitGoat(self, i) for i in iter_bits(self.goats)]
+
+    def get_all_addresses(self) -> List[str]:
+        return address.possible_pos
+
+    def get_piece(self, addr: str) -> Optional[BitPiece]:
+        """Get the Piece at a position.
+
+        If there is no piece at the given position, then None
+        is returned.
+        """
+        piece = self.get_pos(addr).piece
+        return piece if isinstance(piece, BitPiece) else None
+
+    def _get_captures(self, i: int) -> List[Tuple[int, int]]:
+        """
+        Get the (goat index, landing index) of every capture
+        the tiger at position i can make.
+        """
+        goats, empty = self.goats, self.empty
+        return [
+            (j, k)
+            for goat_bit, landing_bit, j, k in CAPTURES_FROM[i]
+            if goats & goat_bit and empty & landing_bit
+        ]
+
+    def get_tiger_possible_moves(self) -> List:
+        """
+        Get all the possible moves the tigers can make.
+
+        Does not include placing new tigers.
+
+        Moves are returned as a list of tuples, where
+        each tuple has the starting address and end address.
+        """
+        moves = []
+        empty = self.empty
+        for i in iter_bits(self.tigers):
+            addr_from = address.possible_pos[i]
+            for j in address.NEIGHBORS[i]:
+                if empty >> j & 1:
+                    moves.append((addr_from, address.possible_pos[j]))
+            for _, k in self._get_captures(i):
+                moves.append((addr_from, address.possible_pos[k]))
+
+        return moves
+
+    def get_tiger_capturing_moves(self) -> List[tuple]:
+        """
+        Get all the capturing moves the tigers can make.
+
+        Returns a list of tuples of tiger landing positions and goat positions.
+        """
+        return [
+            (BitPosition(self, k), BitPosition(self, j))
+            for i in iter_bits(self.tigers)
+            for j, k in self._get_captures(i)
+        ]
+
+    def get_goat_possible_moves(self) -> List:
+        """
+        Get all the possible moves the goats can make.
+
+        Does not include placing new goats.
+
+        Moves are returned as a list of tuples, where
+        each tuple has the starting address and end address.
+        """
+        moves = []
+        empty = self.empty
+        for i in iter_bits(self.goats):
+            addr_from = address.possible_pos[i]
+            for j in address.NEIGHBORS[i]:
+                if empty >> j & 1:
+                    moves.append((addr_from, address.possible_pos[j]))
+
+        return moves
+
+    def has_tiger_moves(self) -> bool:
+        """Checks if any tiger can move or capture."""
+        goats, empty = self.goats, self.empty
+        for i in iter_bits(self.tigers):
+            if NEIGHBOR_MASKS[i] & empty:
+                return True
+            for goat_bit, landing_bit, _, _ in CAPTURES_FROM[i]:
+                if goats & goat_bit and empty & landing_bit:
+                    return True
+        return False
+
+    def get_winner(self) -> Optional[str]:
+        """
+        Return "tiger" or "goat" if that side has won the game,
+        or None if the game is not over.
+        """
+        if self.num_captured >= CAPTURES_TO_WIN:
+            return "tiger"
+        if self.get_num_tigers() == NUM_TIGERS and not self.has_tiger_moves():
+            return "goat"
+        return None
+
+    @property
+    def num_moves(self) -> int:
+        return len(self.move_history)
+
+    @property
+    def last_move(self) -> str:
+        """Return the notation of the last move that was made."""
+        return self.move_history[-1][0]
+
+    def get_threat_map(self) -> ThreatMap:
+        """Get the threat map of the board, cached until the pieces change."""
+        key = (self.tigers, self.goats)
+        if key != self._threat_key:
+            self._threat_map = get_threat_map(*key)
+            self._threat_key = key
+        return self._threat_map
+
+    def is_pos_safe(self, addr: str) -> bool:
+        """Checks if a goat in this position could be captured."""
+        threatened = self.get_threat_map().threatened
+        return not threatened >> address.ADDR_INDEX[addr] & 1
+
+    def is_pos_blocking(self, addr: str) -> bool:
+        """Checks if a goat in this position blocks the movement
+        of a tiger."""
+        return bool(NEIGHBOR_MASKS[address.ADDR_INDEX[addr]] & self.tigers)
+
+    def _push_move(self, notation: str, state: tuple):
+        """Push the move and the state before it to the move history."""
+        self.move_history.append((notation, state))
+
+    def unmake_move(self) -> str:
+        """
+        Undo the last move.
+
+        Returns the notation of the move that was undone.
+        """
+        notation, state = self.move_history.pop()
+        self.set_state(state)
+        return notation
+
+    def undo_move(self, n=1):
+        """Restore a previous state of the board by n amount of moves."""
+        self.set_state(self.move_history[-n][1])
+        # delete all moves between the current state and the restored state
+        del self.move_history[-n:]
+
+    def place_tiger(self, addr: str) -> bool:
+        """Place a Tiger at the position by its address.
+        Returns true if the move was successful."""
+        i = address.ADDR_INDEX.get(addr)
+        if i is None or not self.empty >> i & 1:
+            return False
+        state = self.get_state()
+        self.tigers |= 1 << i
+        self.zobrist_hash ^= zobrist.TIGER_KEYS[i]
+        self._set_goat_turn(True)
+        self._push_move(f"T{addr}", state)
+        return True
+
+    def place_goat(self, addr: str) -> bool:
+        """Place a Goat at the position by its address.
+        Returns true if the move was successful."""
+        i = address.ADDR_INDEX.get(addr)
+        if i is None or not self.empty >> i & 1:
+            return False
+        state = self.get_state()
+        self.goats |= 1 << i
+        self.zobrist_hash ^= zobrist.GOAT_KEYS[i]
+        if not self.is_all_goats_placed and self.get_num_goats() >= MAX_GOATS:
+            self.is_all_goats_placed = True
+            self.zobrist_hash ^= zobrist.PHASE_KEY
+        self._set_goat_turn(False)
+        self._push_move(f"G{addr}", state)
+        return True
+
+    def move_piece(self, addr_from: str, addr_to: str) -> bool:
+        """Move a piece between two positions by its address.
+        Returns true if the move was successful."""
+        i = address.ADDR_INDEX.get(addr_from)
+        k = address.ADDR_INDEX.get(addr_to)
+        if i is None or k is None or not self.empty >> k & 1:
+            return False
+
+        state = self.get_state()
+        bit_from, bit_to = 1 << i, 1 << k
+
+        if self.tigers & bit_from:
+            for j, landing in self._get_captures(i):
+                if landing == k:
+                    self.tigers ^= bit_from | bit_to
+                    self.goats ^= 1 << j
+                    self.num_captured += 1
+                    self.zobrist_hash ^= (
+                        zobrist.TIGER_KEYS[i]
+                        ^ zobrist.TIGER_KEYS[k]
+                        ^ zobrist.GOAT_KEYS[j]
+                        ^ zobrist.CAPTURED_KEYS[self.num_captured - 1]
+                        ^ zobrist.CAPTURED_KEYS[self.num_captured]
+                    )
+                    self._set_goat_turn(True)
+                    self._push_move(
+                        f"{addr_from},\tx{address.possible_pos[j]},\t{addr_to}", state
+                    )
+                    return True
+
+        if not NEIGHBOR_MASKS[i] & bit_to:
+            return False
+
+        if self.tigers & bit_from:
+            self.tigers ^= bit_from | bit_to
+            self.zobrist_hash ^= zobrist.TIGER_KEYS[i] ^ zobrist.TIGER_KEYS[k]
+            self._set_goat_turn(True)
+        elif self.goats & bit_from:
+            self.goats ^= bit_from | bit_to
+            self.zobrist_hash ^= zobrist.GOAT_KEYS[i] ^ zobrist.GOAT_KEYS[k]
+            self._set_goat_turn(False)
+        else:
+            return False
+
+        self._push_move(f"{addr_from},\t{addr_to}", state)
+        return True
+
+    def clear_pos(self, addr: str):
+        """Clear the position by its address."""
+        i = address.ADDR_INDEX[addr]
+        if self.tigers >> i & 1:
+            self.zobrist_hash ^= zobrist.TIGER_KEYS[i]
+        elif self.goats >> i & 1:
+            self.zobrist_hash ^= zobrist.GOAT_KEYS[i]
+        mask = ~(1 << i)
+        self.tigers &= mask
+        self.goats &= mask
@@ -1,9 +1,65 @@
-from typing import List, Optional, cast
+from typing import List, NamedTuple, Optional, cast
 from huligutta.position import Position
 from huligutta.piece import Piece, Tiger, Goat
+from huligutta import zobrist
 import copy
 import address
 
+# the number of tigers on a full board
+NUM_TIGERS = 3
+
+# the number of goats that are placed before goats start moving
+MAX_GOATS = 15
+
+# the number of captured goats needed for the tigers to win
+CAPTURES_TO_WIN = 5
+
+_FULL_MASK = (1 << address.NUM_POSITIONS) - 1
+
+
+def _get_indices(mask: int) -> List[int]:
+    """Get the indices of the set bits of a bitmask, in increasing order."""
+    indices = []
+    while mask:
+        low = mask & -mask
+        indices.append(low.bit_length() - 1)
+        mask ^= low
+    return indices
+
+
+class MoveDelta(NamedTuple):
+    """
+    The changes a single move made to the board.
+
+    This is all that is needed to undo the move, so the move history
+    doesn't have to store copies of the board.
+    """
+
+    # the notation of the move
+    notation: str
+
+    # the address the piece moved from (None if the piece was placed)
+    addr_from: Optional[str]
+
+    # the address the piece was moved or placed to
+    addr_to: str
+
+    # the address of the goat that was captured, if any
+    addr_captured: Optional[str]
+
+    # the value of Board.is_all_goats_placed before the move
+    was_all_goats_placed: bool
+
+    # the value of Board.is_goat_turn before the move
+    was_goat_turn: bool
+
+    # the value of Board.zobrist_hash before the move
+    prev_hash: int
+
+    @property
+    def is_placement(self) -> bool:
+        return self.addr_from is None
+
 
 class Board:
     """
@@ -43,6 +99,13 @@ class Board:
         # if True, then 15 goats have been placed at one point
         self.is_all_goats_placed = False
 
+        # if True, then the last move was made by a tiger
+        self.is_goat_turn = False
+
+        # the Zobrist hash of the board state, kept up to date by
+        # Position.set_piece() (for the pieces) and the moves
+        self.zobrist_hash = 0
+
         self.clear()
 
     def clear(self):
@@ -64,10 +127,27 @@ class Board:
 
                     self.positions[let][int(num)] = pos
 
+        # the positions in the order of address.possible_pos
+        self._all_positions = [self.get_pos(addr) for addr in address.possible_pos]
+
+        # the positions holding a tiger or a goat as bitmasks (with bit i
+        # for address.possible_pos[i]), and their counts, kept up to date
+        # by Position.set_piece()
+        self._tigers = 0
+        self._goats = 0
+        self._num_tigers = 0
+        self._num_goats = 0
+
+        # the last threat map, and the (tigers, goats) it was computed for
+        self._threat_map = None
+        self._threat_key = None
+
         # also reset the number of captured pieces
         self.num_captured = 0
         self.move_history = []
         self.is_all_goats_placed = False
+        self.is_goat_turn = False
+        self.zobrist_hash = 0
 
         # print("the board has been cleared")
 
@@ -110,27 +190,53 @@ class Board:
 
     def num_pieces(self) -> tuple:
         """Get the number of Tigers and Goats."""
-
-        num_tigers, num_goats = 0, 0
-
-        for col in self.positions.values():
-            for pos in col.values():
-                if type(pos) is tuple:
-                    continue
-                if isinstance(pos.piece, Tiger):
-                    num_tigers += 1
-                if isinstance(pos.piece, Goat):
-                    num_goats += 1
-
-        return num_tigers, num_goats
+        return self._num_tigers, self._num_goats
 
     def get_num_goats(self) -> int:
         """Get the number of Goats."""
-        return len(self.get_all_goat_positions())
+        return self._num_goats
 
     def get_num_tigers(self) -> int:
         """Get the number of Tigers."""
-        return len(self.get_all_tiger_positions())
+        return self._num_tigers
+
+    @property
+    def tigers(self) -> int:
+        """A mask of the positions holding a Tiger (bit i is possible_pos[i])."""
+        return self._tigers
+
+    @property
+    def goats(self) -> int:
+        """A mask of the positions holding a Goat (bit i is possible_pos[i])."""
+        return self._goats
+
+    def _update_index(self, pos: "Position", piece):
+        """Update the piece index and the hash before a position's
+        piece is replaced."""
+        if self._all_positions[pos.index] is not pos:
+            return  # a position that isn't on this board (see copy_board())
+
+        i = pos.index
+        bit = 1 << i
+        old_type = type(pos.piece)
+        if old_type is Tiger:
+            self._tigers ^= bit
+            self._num_tigers -= 1
+            self.zobrist_hash ^= zobrist.TIGER_KEYS[i]
+        elif old_type is Goat:
+            self._goats ^= bit
+            self._num_goats -= 1
+            self.zobrist_hash ^= zobrist.GOAT_KEYS[i]
+
+        new_type = type(piece)
+        if new_type is Tiger:
+            self._tigers |= bit
+            self._num_tigers += 1
+            self.zobrist_hash ^= zobrist.TIGER_KEYS[i]
+        elif new_type is Goat:
+            self._goats |= bit
+            self._num_goats += 1
+            self.zobrist_hash ^= zobrist.GOAT_KEYS[i]
 
     def get_pos(self, addr: str) -> "Position":
         """Get a Position by its address."""
@@ -143,21 +249,22 @@ class Board:
 
         For a 2D list of positions, use self.position.
         """
-        flat_positions = [j for i in self.positions.values() for j in i.values()]
-        # filter out non-positions
-        flat_positions = [pos for pos in flat_positions if type(pos) is Position]
-        return flat_positions
+        return list(self._all_positions)
 
     def get_all_goat_positions(self) -> List["Position"]:
         """Get a list of all Positions on the board that are holding a Goat."""
-        return [pos for pos in self.get_all_positions() if pos.is_goat()]
+        positions = self._all_positions
+        return [positions[i] for i in _get_indices(self._goats)]
 
     def get_all_tiger_positions(self) -> List["Position"]:
         """Get a list of all Positions on the board that are holding a Tiger."""
-        return [pos for pos in self.get_all_positions() if pos.is_tiger()]
+        positions = self._all_positions
+        return [positions[i] for i in _get_indices(self._tigers)]
 
     def get_all_empty_positions(self) -> List["Position"]:
-        return [pos for pos in self.get_all_positions() if pos.is_empty()]
+        positions = self._all_positions
+        empty = _FULL_MASK & ~(self._tigers | self._goats)
+        return [positions[i] for i in _get_indices(empty)]
 
     def get_all_tigers(self) -> List[Tiger]:
         """Get a list of all Tigers on the board."""
@@ -194,11 +301,10 @@ class Board:
         each tuple has the starting address and end address.
         """
         moves = []
-        for pos in self.get_all_positions():
-            if pos.is_tiger():
-                addr_from = pos.address
-                for addr_to in pos.piece.get_valid_moves():
-                    moves.append((addr_from, addr_to))
+        for pos in self.get_all_tiger_positions():
+            addr_from = pos.address
+            for addr_to in pos.piece.get_valid_moves():
+                moves.append((addr_from, addr_to))
 
         return moves
 
@@ -225,14 +331,31 @@ class Board:
         each tuple has the starting address and end address.
         """
         moves = []
-        for pos in self.get_all_positions():
-            if pos.is_goat():
-                addr_from = pos.address
-                for addr_to in pos.piece.get_valid_moves():
-                    moves.append((addr_from, addr_to))
+        for pos in self.get_all_goat_positions():
+            addr_from = pos.address
+            for addr_to in pos.piece.get_valid_moves():
+                moves.append((addr_from, addr_to))
 
         return moves
 
+    def has_tiger_moves(self) -> bool:
+        """Checks if any tiger can move or capture."""
+        for pos in self.get_all_tiger_positions():
+            if pos.piece.get_valid_moves():
+                return True
+        return False
+
+    def get_winner(self) -> Optional[str]:
+        """
+        Return "tiger" or "goat" if that side has won the game,
+        or None if the game is not over.
+        """
+        if self.num_captured >= CAPTURES_TO_WIN:
+            return "tiger"
+        if self.get_num_tigers() == NUM_TIGERS and not self.has_tiger_moves():
+            return "goat"
+        return None
+
     @property
     def num_moves(self) -> int:
         return len(self.move_history)
@@ -242,43 +365,96 @@ class Board:
         """Return the notation of the last move that was made."""
         return self.move_history[-1][0]
 
+    def get_threat_map(self):
+        """
+        Get the positions the tigers threaten as a
+        huligutta.bitboard.ThreatMap, cached until the pieces change.
+        """
+        from huligutta.bitboard import get_threat_map
+
+        key = (self._tigers, self._goats)
+        if key != self._threat_key:
+            self._threat_map = get_threat_map(*key)
+            self._threat_key = key
+        return self._threat_map
+
     def is_pos_safe(self, addr: str) -> bool:
         """Checks if a goat in this position could be captured."""
-        for tiger_pos in self.get_all_tiger_positions():
-            if tiger_pos.piece.can_capture_pos(addr):
-                return False
-
-        return True
+        threatened = self.get_threat_map().threatened
+        return not threatened >> address.ADDR_INDEX[addr] & 1
 
     def is_pos_blocking(self, addr: str) -> bool:
         """Checks if a goat in this position blocks the movement
         of a tiger."""
-        for tiger_pos in self.get_all_tiger_positions():
-            if tiger_pos.is_adjacent(self.get_pos(addr)):
-                return True
+        blocking = self.get_threat_map().blocking
+        return bool(blocking >> address.ADDR_INDEX[addr] & 1)
+
+    def _get_undo_state(self) -> tuple:
+        """Get the state that a move changes but that can't be
+        recomputed when undoing it."""
+        return (self.is_all_goats_placed, self.is_goat_turn, self.zobrist_hash)
+
+    def _push_move(
+        self,
+        notation: str,
+        addr_to: str,
+        undo_state: tuple,
+        addr_from: Optional[str] = None,
+        addr_captured: Optional[str] = None,
+    ):
+        """Push the changes made by a move to the end of the move history."""
+        self.move_history.append(
+            MoveDelta(notation, addr_from, addr_to, addr_captured, *undo_state)
+        )
+
+    def _set_goat_turn(self, is_goat_turn: bool):
+        """Set whose turn it is, and update the hash."""
+        if is_goat_turn != self.is_goat_turn:
+            self.is_goat_turn = is_goat_turn
+            self.zobrist_hash ^= zobrist.GOAT_TURN_KEY
+
+    def unmake_move(self) -> str:
+        """
+        Undo the last move by applying the inverse of its changes.
 
-        return False
+        Returns the notation of the move that was undone.
+        """
+        delta = self.move_history.pop()
+        pos_to = self.get_pos(delta.addr_to)
+
+        if delta.addr_from is not None:
+            # move the piece back to where it came from
+            pos_from = self.get_pos(delta.addr_from)
+            piece = pos_to.piece
+            pos_from.set_piece(type(piece)(self, pos_from))
+
+        pos_to.clear()
 
-    def _push_move(self, notation: str):
-        """Push the move to the end of the move history."""
-        # copy the state of the board
-        self.positions_copy = self.copy_board()
-        # push it to the end of the move history
-        self.move_history.append((notation, self.positions_copy))
+        if delta.addr_captured is not None:
+            self.get_pos(delta.addr_captured).place_goat()
+            self.num_captured -= 1
+
+        self.is_all_goats_placed = delta.was_all_goats_placed
+        self.is_goat_turn = delta.was_goat_turn
+        self.zobrist_hash = delta.prev_hash
+        return delta.notation
 
     def undo_move(self, n=1):
         """Restore a previous state of the board by n amount of moves."""
-        self.state = self.move_history[-n - 1]
-        self.positions = self.copy_board(self.state[1])
-        # delete all moves between the current state and the restored state
-        del self.move_history[-n:]
+        for _ in range(n):
+            self.unmake_move()
 
     def place_tiger(self, addr: str) -> bool:
         """Place a Tiger at the position by its address.
         Returns true if the move was successful."""
         try:
-            self.get_pos(addr).place_tiger()
-            self._push_move(f"T{addr}")
+            pos = self.get_pos(addr)
+            if not pos.is_empty():
+                return False
+            undo_state = self._get_undo_state()
+            pos.place_tiger()
+            self._set_goat_turn(True)
+            self._push_move(f"T{addr}", addr, undo_state)
             return True
         except Exception:
             return False
@@ -287,10 +463,16 @@ class Board:
         """Place a Goat at the position by its address.
         Returns true if the move was successful."""
         try:
-            self.get_pos(addr).place_goat()
-            if len(self.get_all_goat_positions()) >= 15:
+            pos = self.get_pos(addr)
+            if not pos.is_empty():
+                return False
+            undo_state = self._get_undo_state()
+            pos.place_goat()
+            if not self.is_all_goats_placed and self._num_goats >= MAX_GOATS:
                 self.is_all_goats_placed = True
-            self._push_move(f"G{addr}")
+                self.zobrist_hash ^= zobrist.PHASE_KEY
+            self._set_goat_turn(False)
+            self._push_move(f"G{addr}", addr, undo_state)
             return True
         except Exception:
             return False
@@ -304,10 +486,24 @@ class Board:
         piece = pos_from.piece
 
         if isinstance(piece, Piece):
+            undo_state = self._get_undo_state()
+            num_captured = self.num_captured
             res = piece.move(pos_to)
             # print(f"moved {piece} from {addr_from} to {addr_to}")
             if res:
-                self._push_move(res)
+                # (the pieces were hashed as they were set)
+                is_tiger = isinstance(piece, Tiger)
+                self._set_goat_turn(is_tiger)
+
+                addr_captured = None
+                if self.num_captured > num_captured:
+                    addr_captured = address.get_jump_over(addr_from, addr_to)
+                    # update the captured count in the hash
+                    self.zobrist_hash ^= (
+                        zobrist.CAPTURED_KEYS[num_captured]
+                        ^ zobrist.CAPTURED_KEYS[self.num_captured]
+                    )
+                self._push_move(res, addr_to, undo_state, addr_from, addr_captured)
                 return True
         return False
 
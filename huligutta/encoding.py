@@ -0,0 +1,166 @@
+"""
+file: encoding.py
+Description: Encode boards as feature planes for training
+
+A batch of boards is encoded as an array of shape
+(num_boards, NUM_PLANES, NUM_POSITIONS), with one plane per feature
+and one column per position in address.possible_pos. Any numeric dtype
+can be used (uint8 and float32 are the usual ones), and the output can
+be a preallocated buffer that is filled in place.
+"""
+
+from typing import Optional
+import numpy as np
+from huligutta.bitboard import get_masks
+from huligutta.board import NUM_TIGERS
+from huligutta.vectorized import TIGER, GOAT
+import address
+
+# the feature planes
+TIGERS = 0  # 1 where there is a tiger
+GOATS = 1  # 1 where there is a goat
+EMPTIES = 2  # 1 where the position is empty
+TIGER_MOVES = 3  # 1 where a tiger can be placed or move to (including captures)
+GOAT_MOVES = 4  # 1 where a goat can be placed or move to
+THREATS = 5  # 1 where a goat can be captured
+GOAT_TURN = 6  # all 1 if goats are to move
+ALL_GOATS_PLACED = 7  # all 1 once every goat has been placed
+NUM_CAPTURED = 8  # the number of goats captured, in every column
+
+NUM_PLANES = 9
+
+_N = address.NUM_POSITIONS
+_SHIFTS = np.arange(_N, dtype=np.int64)
+
+# the steps between positions, sorted by destination
+_STEPS = sorted(
+    ((i, j) for i, adjs in enumerate(address.NEIGHBORS) for j in adjs),
+    key=lambda step: step[1],
+)
+_STEP_FROM = np.array([i for i, _ in _STEPS], dtype=np.intp)
+_STEP_TO = np.array([j for _, j in _STEPS], dtype=np.intp)
+_STEP_STARTS = np.searchsorted(_STEP_TO, np.arange(_N))
+
+# captures (tiger, goat, landing), and where each target starts
+# when they're sorted by landing position and by goat position
+_CAPTURES = [jump for jump in address.JUMPS if not address.CORNERS[jump[1]]]
+_BY_LANDING = np.array(sorted(_CAPTURES, key=lambda c: c[2]), dtype=np.intp)
+_LANDINGS, _LANDING_STARTS = np.unique(_BY_LANDING[:, 2], return_index=True)
+_BY_GOAT = np.array(sorted(_CAPTURES, key=lambda c: c[1]), dtype=np.intp)
+_GOATS, _GOAT_STARTS = np.unique(_BY_GOAT[:, 1], return_index=True)
+
+# every position can be stepped to
+assert len(np.unique(_STEP_TO)) == _N
+
+
+def _get_targets(can: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Reduce (num_boards, moves) sorted by target to (num_boards, targets)."""
+    return np.logical_or.reduceat(can, starts, axis=1)
+
+
+def encode_occupancy(
+    tiger: np.ndarray,
+    goat: np.ndarray,
+    num_captured,
+    is_all_goats_placed,
+    is_goat_turn,
+    out: Optional[np.ndarray] = None,
+    dtype=np.float32,
+) -> np.ndarray:
+    """
+    Encode boards given as (num_boards, NUM_POSITIONS) boolean arrays of
+    where the tigers and goats are, and arrays of the rest of the state.
+    """
+    num_boards = len(tiger)
+    if out is None:
+        out = np.empty((num_boards, NUM_PLANES, _N), dtype=dtype)
+    elif out.shape[0] < num_boards or out.shape[1:] != (NUM_PLANES, _N):
+        raise ValueError(f"out must have shape ({num_boards}, {NUM_PLANES}, {_N})")
+    out = out[:num_boards]
+
+    empty = ~(tiger | goat)
+    out[:, TIGERS] = tiger
+    out[:, GOATS] = goat
+    out[:, EMPTIES] = empty
+
+    # placing, moving and capturing
+    # (goats pass until all the tigers are placed)
+    # ----------------
+    tigers_placed = (tiger.sum(axis=1) >= NUM_TIGERS)[:, None]
+    goats_placed = np.asarray(is_all_goats_placed, dtype=bool)[:, None]
+
+    tiger_moves = _get_targets(tiger[:, _STEP_FROM] & empty[:, _STEP_TO], _STEP_STARTS)
+    c = _BY_LANDING
+    can_capture = tiger[:, c[:, 0]] & goat[:, c[:, 1]] & empty[:, c[:, 2]]
+    tiger_moves[:, _LANDINGS] |= _get_targets(can_capture, _LANDING_STARTS)
+    out[:, TIGER_MOVES] = np.where(tigers_placed, tiger_moves, empty)
+
+    c = _BY_GOAT
+    can_capture = tiger[:, c[:, 0]] & goat[:, c[:, 1]] & empty[:, c[:, 2]]
+    out[:, THREATS] = 0
+    out[:, THREATS, _GOATS] = _get_targets(can_capture, _GOAT_STARTS)
+
+    can_step = goat[:, _STEP_FROM] & empty[:, _STEP_TO]
+    goat_moves = np.where(goats_placed, _get_targets(can_step, _STEP_STARTS), empty)
+    out[:, GOAT_MOVES] = goat_moves & tigers_placed
+
+    # the rest of the state
+    # ----------------
+    out[:, GOAT_TURN] = np.asarray(is_goat_turn)[:, None]
+    out[:, ALL_GOATS_PLACED] = np.asarray(is_all_goats_placed)[:, None]
+    out[:, NUM_CAPTURED] = np.asarray(num_captured)[:, None]
+    return out
+
+
+def encode_masks(
+    tigers,
+    goats,
+    num_captured,
+    is_all_goats_placed,
+    is_goat_turn,
+    out: Optional[np.ndarray] = None,
+    dtype=np.float32,
+) -> np.ndarray:
+    """
+    Encode boards given as arrays of tiger and goat bitmasks
+    (see huligutta.bitboard.get_masks()) and the rest of the state.
+    """
+    tiger = ((np.asarray(tigers, dtype=np.int64)[:, None] >> _SHIFTS) & 1).astype(bool)
+    goat = ((np.asarray(goats, dtype=np.int64)[:, None] >> _SHIFTS) & 1).astype(bool)
+    return encode_occupancy(
+        tiger, goat, num_captured, is_all_goats_placed, is_goat_turn, out, dtype
+    )
+
+
+def encode_games(games, out: Optional[np.ndarray] = None, dtype=np.float32):
+    """Encode every game of a VectorizedGames."""
+    return encode_occupancy(
+        games.cells == TIGER,
+        games.cells == GOAT,
+        games.num_captured,
+        games.is_all_goats_placed,
+        games.is_goat_turn,
+        out,
+        dtype,
+    )
+
+
+def encode_boards(boards, out: Optional[np.ndarray] = None, dtype=np.float32):
+    """Encode a list of boards (of any kind)."""
+    masks = [get_masks(board) for board in boards]
+    return encode_masks(
+        [tigers for tigers, _ in masks],
+        [goats for _, goats in masks],
+        [board.num_captured for board in boards],
+        [board.is_all_goats_placed for board in boards],
+        [board.is_goat_turn for board in boards],
+        out,
+        dtype,
+    )
+
+
+def encode_board(board, out: Optional[np.ndarray] = None, dtype=np.float32):
+    """Encode a single board as an array of shape (NUM_PLANES, NUM_POSITIONS)."""
+    if out is not None:
+        out = out[None]
+    return encode_boards([board], out, dtype)[0]
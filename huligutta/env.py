@@ -0,0 +1,370 @@
+"""
+file: env.py
+Description: Gym-style environment of many games for reinforcement learning
+
+An environment steps a batch of games together:
+
+    env = VectorEnv(64)
+    obs, info = env.reset(seed=0)
+    while training:
+        actions = policy(obs, info["action_mask"])
+        obs, rewards, terminated, truncated, info = env.step(actions)
+
+Observations are feature planes (see huligutta.encoding), actions are
+integers (see huligutta.actions), and the legal actions of every game
+are given as a boolean mask in info["action_mask"]. Both sides are
+played through the same environment; info["is_goat_turn"] tells which
+side is to move, and rewards are given to the tigers (the goats get the
+negative). Finished games are started again on the same step, and their
+last observation is kept in info["final_observation"].
+
+The games follow the same rules as huligutta.Board (see
+huligutta.vectorized). SubprocessVectorEnv spreads the games over
+worker processes.
+"""
+
+import multiprocessing
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from huligutta.actions import NUM_ACTIONS
+from huligutta.bitboard import BitBoard
+from huligutta.encoding import NUM_PLANES, encode_games
+from huligutta.vectorized import (
+    VectorizedGames,
+    MAX_MOVES,
+    NO_WINNER,
+    TIGER_WIN,
+    GOAT_WIN,
+    TIGER,
+    GOAT,
+)
+import address
+
+_BITS = 1 << np.arange(address.NUM_POSITIONS, dtype=np.int64)
+
+
+class Snapshot(NamedTuple):
+    """The state of every game before a step, as given to reward hooks."""
+
+    cells: np.ndarray
+    num_captured: np.ndarray
+    is_goat_turn: np.ndarray
+    done: np.ndarray
+
+
+# a reward hook gets the state before a step and the games after it,
+# and returns a reward for the tigers in each game
+RewardHook = Callable[[Snapshot, VectorizedGames], np.ndarray]
+
+
+def _take_snapshot(games: VectorizedGames) -> Snapshot:
+    return Snapshot(
+        games.cells.copy(),
+        games.num_captured.copy(),
+        games.is_goat_turn.copy(),
+        games.done.copy(),
+    )
+
+
+def _get_masks(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the tiger and goat bitmasks of each row of cells."""
+    return (cells == TIGER) @ _BITS, (cells == GOAT) @ _BITS
+
+
+# reward hooks
+# ----------------
+
+
+def win_reward(before: Snapshot, games: VectorizedGames) -> np.ndarray:
+    """1 when the tigers win, -1 when the goats win."""
+    finished = games.done & ~before.done
+    rewards = np.zeros(games.num_games, dtype=np.float32)
+    rewards[finished & (games.winner == TIGER_WIN)] = 1.0
+    rewards[finished & (games.winner == GOAT_WIN)] = -1.0
+    return rewards
+
+
+class CaptureReward:
+    """`scale` for every goat captured."""
+
+    def __init__(self, scale: float = 0.2):
+        self.scale = scale
+
+    def __call__(self, before: Snapshot, games: VectorizedGames) -> np.ndarray:
+        captured = games.num_captured - before.num_captured
+        return (self.scale * captured).astype(np.float32)
+
+
+class EditDistanceReward:
+    """
+    `scale` for every move the goats are set back from stalemating the
+    tigers (see functions.edit_distance), and `-scale` for every move
+    they get closer.
+    """
+
+    def __init__(self, scale: float = 0.05):
+        self.scale = scale
+
+    def __call__(self, before: Snapshot, games: VectorizedGames) -> np.ndarray:
+        from functions import edit_distance_batch
+
+        rewards = np.zeros(games.num_games, dtype=np.float32)
+        active = np.flatnonzero(~before.done)
+        if not len(active):
+            return rewards
+        distance_before = edit_distance_batch(_get_masks(before.cells[active]))
+        distance_after = edit_distance_batch(_get_masks(games.cells[active]))
+        rewards[active] = self.scale * (distance_after - distance_before)
+        return rewards
+
+
+# environments
+# ----------------
+
+
+class VectorEnv:
+    """
+    A batch of games stepped together in this process.
+
+    `rewards` are the reward hooks, whose rewards are summed. If
+    `autoreset` is False, finished games stay finished (with no legal
+    actions) until reset() is called. Games are cut off as draws after
+    `max_moves` moves, which is reported as truncation.
+    """
+
+    # the shape of the observation of one game
+    observation_shape = (NUM_PLANES, address.NUM_POSITIONS)
+
+    # the number of possible actions
+    num_actions = NUM_ACTIONS
+
+    def __init__(
+        self,
+        num_envs: int,
+        rewards: Sequence[RewardHook] = (win_reward,),
+        autoreset=True,
+        max_moves: int = MAX_MOVES,
+        seed=None,
+        dtype=np.float32,
+        check=True,
+    ):
+        self.num_envs = num_envs
+        self.rewards = list(rewards)
+        self.autoreset = autoreset
+        self.dtype = dtype
+        # raise a ValueError on illegal actions
+        self.check = check
+        self.games = VectorizedGames(num_envs, max_moves, seed)
+
+    def _get_observation(self) -> np.ndarray:
+        return encode_games(self.games, dtype=self.dtype)
+
+    def _get_info(self) -> dict:
+        return {
+            "action_mask": self.games.get_legal_actions(),
+            "is_goat_turn": self.games.is_goat_turn.copy(),
+        }
+
+    def reset(self, seed=None) -> Tuple[np.ndarray, dict]:
+        """Start new games. Returns the observations and info."""
+        if seed is not None:
+            self.games.rng = np.random.default_rng(seed)
+        self.games.reset()
+        return self._get_observation(), self._get_info()
+
+    def step(self, actions) -> tuple:
+        """
+        Make an action in every game.
+
+        Returns the observations, the rewards (for the tigers),
+        which games were won (terminated) or drawn by running out of
+        moves (truncated), and info.
+        """
+        games = self.games
+        before = _take_snapshot(games) if self.rewards else None
+        finished = games.step(actions, check=self.check)
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        for hook in self.rewards:
+            rewards += hook(before, games)
+
+        terminated = finished & (games.winner != NO_WINNER)
+        truncated = finished & (games.winner == NO_WINNER)
+        winner = games.winner.copy()
+
+        final_observation = None
+        if self.autoreset and finished.any():
+            final_observation = self._get_observation()
+            games.reset(finished)
+
+        info = self._get_info()
+        info["winner"] = winner
+        if final_observation is not None:
+            info["final_observation"] = final_observation
+        return self._get_observation(), rewards, terminated, truncated, info
+
+    def sample_actions(self, action_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Choose a random legal action in every game."""
+        return self.games.get_random_actions(action_mask)
+
+    def get_board(self, i: int) -> BitBoard:
+        """Copy game i to a board (without its move history)."""
+        return self.games.to_board(i)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _worker(conn, num_envs: int, kwargs: dict):
+    env = VectorEnv(num_envs, **kwargs)
+    try:
+        while True:
+            command, arg = conn.recv()
+            if command == "step":
+                conn.send(env.step(arg))
+            elif command == "reset":
+                conn.send(env.reset(arg))
+            elif command == "sample":
+                conn.send(env.sample_actions(arg))
+            elif command == "board":
+                conn.send(env.get_board(arg))
+            elif command == "close":
+                break
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        conn.close()
+
+
+def _concat_infos(infos: List[dict], sizes: List[int], dtype) -> dict:
+    info = {}
+    for key in ("action_mask", "is_goat_turn", "winner"):
+        if key in infos[0]:
+            info[key] = np.concatenate([i[key] for i in infos])
+
+    # only some workers may have had finished games
+    finals = [i.get("final_observation") for i in infos]
+    if any(final is not None for final in finals):
+        shape = (sum(sizes),) + VectorEnv.observation_shape
+        info["final_observation"] = np.zeros(shape, dtype=dtype)
+        start = 0
+        for final, size in zip(finals, sizes):
+            if final is not None:
+                info["final_observation"][start : start + size] = final
+            start += size
+    return info
+
+
+class SubprocessVectorEnv:
+    """
+    A batch of games spread over worker processes, each stepping its
+    share of the games with a VectorEnv. Takes the same arguments as
+    VectorEnv (reward hooks must be picklable). Call close() to stop
+    the workers.
+    """
+
+    observation_shape = VectorEnv.observation_shape
+    num_actions = VectorEnv.num_actions
+
+    def __init__(
+        self, num_envs: int, num_workers: Optional[int] = None, seed=None, **kwargs
+    ):
+        num_workers = min(num_workers or multiprocessing.cpu_count(), num_envs)
+        self.num_envs = num_envs
+        self.dtype = kwargs.get("dtype", np.float32)
+        self.sizes = [len(s) for s in np.array_split(np.arange(num_envs), num_workers)]
+        self._splits = np.cumsum(self.sizes)[:-1]
+        seeds = np.random.SeedSequence(seed).spawn(num_workers)
+
+        self._conns = []
+        self._processes = []
+        for size, worker_seed in zip(self.sizes, seeds):
+            conn, worker_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(worker_conn, size, dict(kwargs, seed=worker_seed)),
+                daemon=True,
+            )
+            process.start()
+            worker_conn.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+
+    def _call(self, command: str, args: list) -> list:
+        # send every command before waiting, so the workers run together
+        for conn, arg in zip(self._conns, args):
+            conn.send((command, arg))
+        return [conn.recv() for conn in self._conns]
+
+    def reset(self, seed=None) -> Tuple[np.ndarray, dict]:
+        """Start new games. Returns the observations and info."""
+        if seed is None:
+            seeds = [None] * len(self._conns)
+        else:
+            seeds = np.random.SeedSequence(seed).spawn(len(self._conns))
+        results = self._call("reset", seeds)
+        obs = np.concatenate([obs for obs, _ in results])
+        return obs, _concat_infos([info for _, info in results], self.sizes, self.dtype)
+
+    def step(self, actions) -> tuple:
+        """Make an action in every game (see VectorEnv.step())."""
+        actions = np.asarray(actions)
+        results = self._call("step", np.split(actions, self._splits))
+        obs, rewards, terminated, truncated, infos = zip(*results)
+        return (
+            np.concatenate(obs),
+            np.concatenate(rewards),
+            np.concatenate(terminated),
+            np.concatenate(truncated),
+            _concat_infos(list(infos), self.sizes, self.dtype),
+        )
+
+    def sample_actions(self, action_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Choose a random legal action in every game."""
+        if action_mask is None:
+            masks = [None] * len(self._conns)
+        else:
+            masks = np.split(action_mask, self._splits)
+        return np.concatenate(self._call("sample", masks))
+
+    def get_board(self, i: int) -> BitBoard:
+        """Copy game i to a board (without its move history)."""
+        if not 0 <= i < self.num_envs:
+            raise IndexError("game index out of range")
+        worker = int(np.searchsorted(self._splits, i, side="right"))
+        start = self._splits[worker - 1] if worker else 0
+        conn = self._conns[worker]
+        conn.send(("board", i - int(start)))
+        return conn.recv()
+
+    def close(self):
+        """Stop the worker processes."""
+        for conn in self._conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_env(num_envs: int, num_workers: int = 1, **kwargs):
+    """Make a VectorEnv, or a SubprocessVectorEnv if num_workers > 1."""
+    if num_workers > 1:
+        return SubprocessVectorEnv(num_envs, num_workers, **kwargs)
+    return VectorEnv(num_envs, **kwargs)
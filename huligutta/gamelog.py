@@ -0,0 +1,217 @@
+"""
+file: gamelog.py
+Description: Buffered, append-only log of game records
+
+Each game is written as one JSON line in a segment file
+(games-00000.jsonl, games-00001.jsonl, ...). A binary index next to
+the segments holds a fixed-size entry per game, so the number of games
+and the location of any game are read without scanning the segments:
+
+    index.bin = MAGIC + (segment: u32, offset: u64, length: u32) per game
+
+Records are buffered in memory and written out every `flush_every`
+records or `flush_seconds` seconds, and when the logger is closed.
+"""
+
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+# where games are logged by default
+LOG_DIR = os.path.join("dataset", "games")
+
+_MAGIC = b"HULILOG1"
+_ENTRY = struct.Struct("<IQI")
+_INDEX_NAME = "index.bin"
+
+
+def _segment_name(segment: int) -> str:
+    return f"games-{segment:05d}.jsonl"
+
+
+class GameRecord(NamedTuple):
+    """A finished (or abandoned) game."""
+
+    # the game mode, e.g. "cpu" or "goatPlayer"
+    mode: str
+
+    # the seed of the random number generator, if known
+    seed: Optional[int]
+
+    # the notation of every move
+    moves: List[str]
+
+    # "tiger", "goat", or None if the game didn't finish
+    winner: Optional[str]
+
+    # the number of goats captured
+    num_captured: int
+
+    # per-move features (e.g. {"edit_distance": 8}), if any
+    features: Optional[List[Dict[str, Any]]] = None
+
+    # when the game ended (seconds since the epoch)
+    time: Optional[float] = None
+
+    # the first position, if the game didn't start on an empty board
+    # (e.g. {"tigers": ["b0"], "goats": ["a1"], "is_all_goats_placed": False,
+    # "is_goat_turn": True})
+    start: Optional[Dict[str, Any]] = None
+
+
+class GameLogger:
+    """Appends game records to a log directory."""
+
+    def __init__(
+        self,
+        directory: str = LOG_DIR,
+        segment_size: int = 1 << 24,
+        flush_every: int = 16,
+        flush_seconds: float = 5.0,
+    ):
+        self.directory = directory
+        # start a new segment once a segment is larger than this (in bytes)
+        self.segment_size = segment_size
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, _INDEX_NAME)
+        if not os.path.exists(self._index_path):
+            with open(self._index_path, "wb") as file:
+                file.write(_MAGIC)
+
+        # continue the last segment
+        self._num_written = _read_count(self._index_path)
+        self._segment = 0
+        if self._num_written:
+            self._segment = _read_entry(self._index_path, self._num_written - 1)[0]
+        self._offset = self._get_segment_size(self._segment)
+
+        self._buffer: List[bytes] = []
+        self._last_flush = time.monotonic()
+
+    def __len__(self) -> int:
+        """The number of games logged so far (including unflushed ones)."""
+        return self._num_written + len(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get_segment_size(self, segment: int) -> int:
+        path = os.path.join(self.directory, _segment_name(segment))
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def write(self, record: GameRecord):
+        """Log a game."""
+        if record.time is None:
+            record = record._replace(time=round(time.time(), 3))
+        line = json.dumps(record._asdict(), separators=(",", ":")) + "\n"
+        self._buffer.append(line.encode())
+
+        if (
+            len(self._buffer) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write out the buffered records."""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        entries = []
+        segment_file = None
+        try:
+            for line in self._buffer:
+                if self._offset and self._offset + len(line) > self.segment_size:
+                    self._segment += 1
+                    self._offset = 0
+                    if segment_file is not None:
+                        segment_file.close()
+                        segment_file = None
+                if segment_file is None:
+                    path = os.path.join(self.directory, _segment_name(self._segment))
+                    segment_file = open(path, "ab")
+                segment_file.write(line)
+                entries.append(_ENTRY.pack(self._segment, self._offset, len(line)))
+                self._offset += len(line)
+        finally:
+            if segment_file is not None:
+                segment_file.close()
+
+        # the index is written last, so it only points to complete records
+        with open(self._index_path, "ab") as file:
+            file.write(b"".join(entries))
+        self._num_written += len(entries)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+
+class GameLog:
+    """Reads the games in a log directory."""
+
+    def __init__(self, directory: str = LOG_DIR):
+        self.directory = directory
+        self._index_path = os.path.join(directory, _INDEX_NAME)
+
+    def __len__(self) -> int:
+        """The number of games in the log."""
+        if not os.path.exists(self._index_path):
+            return 0
+        return _read_count(self._index_path)
+
+    def get_offset(self, i: int) -> tuple:
+        """Get the (segment, offset, length) of game i."""
+        if i < 0:
+            i += len(self)
+        return _read_entry(self._index_path, i)
+
+    def __getitem__(self, i: int) -> GameRecord:
+        segment, offset, length = self.get_offset(i)
+        with open(os.path.join(self.directory, _segment_name(segment)), "rb") as file:
+            file.seek(offset)
+            return GameRecord(**json.loads(file.read(length)))
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        if not len(self):
+            return
+        with open(self._index_path, "rb") as file:
+            file.seek(len(_MAGIC))
+            entries = list(_ENTRY.iter_unpack(file.read()))
+
+        segment_file, current = None, None
+        try:
+            for segment, offset, length in entries:
+                if segment != current:
+                    if segment_file is not None:
+                        segment_file.close()
+                    path = os.path.join(self.directory, _segment_name(segment))
+                    segment_file, current = open(path, "rb"), segment
+                segment_file.seek(offset)
+                yield GameRecord(**json.loads(segment_file.read(length)))
+        finally:
+            if segment_file is not None:
+                segment_file.close()
+
+
+def _read_count(index_path: str) -> int:
+    return (os.path.getsize(index_path) - len(_MAGIC)) // _ENTRY.size
+
+
+def _read_entry(index_path: str, i: int) -> tuple:
+    with open(index_path, "rb") as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{index_path} is not a game log index")
+        if not 0 <= i < _read_count(index_path):
+            raise IndexError("game index out of range")
+        file.seek(len(_MAGIC) + i * _ENTRY.size)
+        return _ENTRY.unpack(file.read(_ENTRY.size))
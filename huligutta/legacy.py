@@ -0,0 +1,347 @@
+"""
+file: legacy.py
+Description: Read the legacy text log (dataset/data.txt) back into games
+
+The old log is a mix of attempt banners, bug reports, move notations
+(Tb0, Ga1, "b1,\tb2", "b1,\txb2,\tb3"), board dumps
+({'b0': 'X', 'a1': 'O', 'a2': (), ...}) and statistics. The file is
+read one line at a time and split into games at each banner. Each game
+is replayed through the rules on a BitBoard: notations must be legal
+moves, and consecutive board dumps must be connected by a few legal
+moves, which are filled in. A game stops at the first line that cannot
+be replayed, and the reason is kept.
+
+To convert the log into game records (see huligutta.gamelog), run
+
+    python -m huligutta.legacy dataset/data.txt -o dataset/games
+
+"""
+
+import argparse
+import ast
+import re
+from collections import Counter
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from huligutta.bitboard import BitBoard
+from huligutta.board import MAX_GOATS
+from huligutta.gamelog import GameLogger, GameRecord
+from huligutta.search import get_moves, make_move, unmake_move
+from huligutta import zobrist
+import address
+
+# the most moves that are searched for between two board dumps
+MAX_PLIES = 3
+
+_ADDR = r"([a-f][0-4])"
+_PLACE = re.compile(rf"^([TG]){_ADDR}$")
+_MOVE = re.compile(rf"^{_ADDR},\t{_ADDR}$")
+_CAPTURE = re.compile(rf"^{_ADDR},\tx{_ADDR},\t{_ADDR}$")
+_RESULT = re.compile(r"^(Goats|Tigers?) wins?\b")
+
+
+class LegacyGame(NamedTuple):
+    """A game read from the legacy log."""
+
+    # the attempt number from the banner, if any
+    attempt: Optional[int]
+
+    # the game mode from the banner, if any
+    mode: Optional[str]
+
+    # the first position, if the game didn't start on an empty board
+    # (as a BitBoard state, see BitBoard.get_state())
+    start: Optional[tuple]
+
+    # the notation of every move that was replayed
+    moves: List[str]
+
+    # the position after each move (and the first position), as BitBoard states
+    positions: List[tuple]
+
+    # "tiger", "goat", or None if the game didn't finish
+    winner: Optional[str]
+
+    # why the replay stopped early, or None if the whole game was replayed
+    error: Optional[str]
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error is None
+
+
+def parse_board_dump(line: str) -> Tuple[int, int]:
+    """Get the tiger and goat bitmasks of a board dump."""
+    contents = ast.literal_eval(line)
+    tigers = goats = 0
+    for addr, content in contents.items():
+        if content == "X":
+            tigers |= 1 << address.ADDR_INDEX[addr]
+        elif content == "O":
+            goats |= 1 << address.ADDR_INDEX[addr]
+    return tigers, goats
+
+
+def _find_moves(board, is_goat_turn, tigers, goats, plies) -> Optional[list]:
+    """
+    Search for up to `plies` legal moves (including goat passes) that
+    lead to the given pieces. Returns a list of (move, is_goat_turn).
+    """
+    if board.tigers == tigers and board.goats == goats:
+        return []
+    if plies == 0 or board.get_winner() is not None:
+        return None
+    moves = get_moves(board, is_goat_turn)
+    if is_goat_turn and None not in moves:
+        moves.append(None)  # the CPU goats can pass
+    for move in moves:
+        make_move(board, move, is_goat_turn)
+        found = _find_moves(board, not is_goat_turn, tigers, goats, plies - 1)
+        unmake_move(board, move)
+        if found is not None:
+            return [(move, is_goat_turn)] + found
+    return None
+
+
+class _Replay:
+    """Replays the lines of a single game."""
+
+    def __init__(self, attempt=None, mode=None):
+        self.attempt = attempt
+        self.mode = mode
+        self.board = BitBoard()
+        self.is_goat_turn = False
+        self.start = None
+        self.moves: List[str] = []
+        self.positions = [self.board.get_state()]
+        self.winner = None
+        self.error = None
+        # if True, the side to move and phase of the start aren't known yet
+        self.is_start_unknown = False
+
+    @property
+    def is_empty(self) -> bool:
+        return (
+            not self.moves
+            and self.start is None
+            and self.winner is None
+            and self.error is None
+        )
+
+    def _play(self, move, is_goat_turn):
+        if move is not None:
+            make_move(self.board, move, is_goat_turn)
+            self.moves.append(self.board.last_move)
+            self.positions.append(self.board.get_state())
+        self.is_goat_turn = not is_goat_turn
+
+    def play(self, move: tuple, is_goat_turn: bool):
+        """Replay a move from its notation."""
+        if self.is_goat_turn != is_goat_turn and not self.is_goat_turn:
+            # the CPU goats can pass, but tigers never do
+            self.error = f"{_format(move)}: out of turn"
+            return
+        if move not in get_moves(self.board, is_goat_turn):
+            self.error = f"{_format(move)}: illegal move"
+            return
+        self._play(move, is_goat_turn)
+
+    def reach(self, tigers: int, goats: int):
+        """Replay the moves that lead to a board dump."""
+        if self.is_start_unknown:
+            self._reach_from_start(tigers, goats)
+            return
+
+        found = _find_moves(self.board, self.is_goat_turn, tigers, goats, MAX_PLIES)
+        if found is None and not self.moves and self.start is None:
+            # the game didn't start on an empty board
+            self._set_start(tigers, goats)
+            return
+        if found is None:
+            self.error = f"no legal moves reach the board after move {len(self.moves)}"
+            return
+        for move, is_goat_turn in found:
+            self._play(move, is_goat_turn)
+
+    def _set_start(self, tigers: int, goats: int):
+        self.board.tigers, self.board.goats = tigers, goats
+        self.board.is_all_goats_placed = bin(goats).count("1") >= MAX_GOATS
+        self.board.zobrist_hash = zobrist.compute_hash(self.board)
+        self.start = self.board.get_state()
+        self.positions = [self.start]
+        self.is_start_unknown = True
+
+    def _reach_from_start(self, tigers: int, goats: int):
+        # try each side to move and phase until the next board is reached
+        board = self.board
+        for is_all_goats_placed in (board.is_all_goats_placed, True, False):
+            board.is_all_goats_placed = is_all_goats_placed
+            board.zobrist_hash = zobrist.compute_hash(board)
+            for is_goat_turn in (True, False):
+                found = _find_moves(board, is_goat_turn, tigers, goats, MAX_PLIES)
+                if found is not None:
+                    self.start = self.positions[0] = board.get_state()
+                    self.is_start_unknown = False
+                    for move, side in found:
+                        self._play(move, side)
+                    return
+        self.error = "no legal moves reach the second board"
+
+    def finish(self) -> LegacyGame:
+        if self.winner is None and self.error is None:
+            self.winner = self.board.get_winner()
+        return LegacyGame(
+            self.attempt,
+            self.mode,
+            self.start,
+            self.moves,
+            self.positions,
+            self.winner,
+            self.error,
+        )
+
+
+def _format(move: tuple) -> str:
+    return ",".join(move)
+
+
+def _check_addrs(game: _Replay, addrs: tuple) -> bool:
+    """Stop replaying a game at addresses that aren't on the board."""
+    for addr in addrs:
+        if addr not in address.ADDR_INDEX:
+            game.error = f"{addr}: not a position"
+            return False
+    return True
+
+
+def iter_games(lines: Iterable[str]) -> Iterator[LegacyGame]:
+    """
+    Split the lines of the legacy log into games and replay them.
+
+    `lines` can be an open file; it is read one line at a time.
+    """
+    game = _Replay()
+    for line in lines:
+        line = line.rstrip("\n")
+        stripped = line.strip()
+
+        # banners and bug reports
+        # ----------------
+        if stripped.startswith("Attempts:"):
+            if not game.is_empty:
+                yield game.finish()
+            game = _Replay(attempt=int(stripped.split(":")[1]))
+            continue
+        if stripped.startswith("Game Mode:"):
+            game.mode = stripped.split(":", 1)[1].strip()
+            continue
+
+        if game.error is not None:
+            continue  # skip the rest of a game that can't be replayed
+
+        # moves
+        # ----------------
+        match = _PLACE.match(line)
+        if match:
+            if _check_addrs(game, match.groups()[1:]):
+                game.play((match[2],), is_goat_turn=match[1] == "G")
+            continue
+        match = _MOVE.match(line) or _CAPTURE.match(line)
+        if match:
+            if not _check_addrs(game, match.groups()):
+                continue
+            addr_from, addr_to = match[1], match[match.lastindex]
+            over = address.get_jump_over(addr_from, addr_to)
+            if match.lastindex == 3 and over != match[2]:
+                game.error = f"{_format(match.groups())}: captures the wrong goat"
+                continue
+            is_goat = bool(game.board.goats >> address.ADDR_INDEX[addr_from] & 1)
+            game.play((addr_from, addr_to), is_goat_turn=is_goat)
+            continue
+
+        # board dumps and results
+        # ----------------
+        if stripped.startswith("{"):
+            try:
+                masks = parse_board_dump(stripped)
+            except (ValueError, SyntaxError, KeyError, AttributeError):
+                game.error = f"unreadable board after move {len(game.moves)}"
+                continue
+            game.reach(*masks)
+            continue
+        match = _RESULT.match(stripped)
+        if match:
+            game.winner = "goat" if match[1] == "Goats" else "tiger"
+
+        # anything else ("Move: 3", "Edit distance: 5", ...) is ignored
+
+    if not game.is_empty:
+        yield game.finish()
+
+
+def iter_positions(lines: Iterable[str], valid_only=True) -> Iterator[tuple]:
+    """
+    Yield (position, winner) for every position of every game,
+    with positions as BitBoard states.
+    """
+    for game in iter_games(lines):
+        if valid_only and not game.is_valid:
+            continue
+        for position in game.positions:
+            yield position, game.winner
+
+
+def to_record(game: LegacyGame) -> GameRecord:
+    """Convert a game to a game log record."""
+    start = None
+    if game.start is not None:
+        tigers, goats, _, is_all_goats_placed, is_goat_turn, _ = game.start
+        start = {
+            "tigers": [a for i, a in enumerate(address.possible_pos) if tigers >> i & 1],
+            "goats": [a for i, a in enumerate(address.possible_pos) if goats >> i & 1],
+            "is_all_goats_placed": is_all_goats_placed,
+            "is_goat_turn": is_goat_turn,
+        }
+    return GameRecord(
+        game.mode or "legacy",
+        None,
+        game.moves,
+        game.winner,
+        game.positions[-1][2],
+        start=start,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the legacy text log.")
+    parser.add_argument("path", nargs="?", default="dataset/data.txt")
+    parser.add_argument("-o", "--output", help="log the games to this directory")
+    parser.add_argument(
+        "--all", action="store_true", help="also log games that stopped early"
+    )
+    args = parser.parse_args()
+
+    counts = Counter()
+    errors = Counter()
+    logger = GameLogger(args.output) if args.output else None
+    with open(args.path) as file:
+        for game in iter_games(file):
+            counts["games"] += 1
+            counts["moves"] += len(game.moves)
+            if game.is_valid:
+                counts["valid"] += 1
+            else:
+                errors[re.sub(r"\d+", "N", game.error)] += 1
+            if logger is not None and (game.is_valid or args.all):
+                logger.write(to_record(game))
+                counts["logged"] += 1
+    if logger is not None:
+        logger.close()
+
+    for key, value in counts.items():
+        print(f"{key}: {value}")
+    for error, count in errors.most_common():
+        print(f"  {count} x {error}")
+
+
+if __name__ == "__main__":
+    main()
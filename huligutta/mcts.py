@@ -0,0 +1,355 @@
+"""
+file: mcts.py
+Description: Monte Carlo tree search player
+
+The tree is stored in flat arrays indexed by node, with the children of
+a node stored next to each other, so UCT selection over them is a
+single NumPy expression. Leaves are collected in batches (with a virtual
+loss on the path, so a batch spreads over the tree) and played out
+together in a VectorizedGames. With more than one process, each worker
+grows its own tree from the same root and the root statistics are
+summed (root parallelism).
+"""
+
+import math
+import multiprocessing
+import time
+from typing import List, NamedTuple, Optional
+import numpy as np
+from huligutta.actions import ACTIONS, JUMP, decode_action, encode_move
+from huligutta.bitboard import BitBoard, from_board
+from huligutta.search import get_moves, make_move, unmake_move
+from huligutta.vectorized import VectorizedGames, TIGER_WIN, GOAT_WIN
+
+# the exploration constant of UCT
+EXPLORATION = 1.4
+
+# the number of leaves played out together
+BATCH_SIZE = 32
+
+# playouts longer than this many moves are counted as draws
+ROLLOUT_MOVES = 100
+
+# the kinds of rollout
+RANDOM = "random"
+HEURISTIC = "heuristic"  # tigers always capture when they can
+
+_IS_JUMP = np.array([action.kind == JUMP for action in ACTIONS])
+
+
+class MCTSResult(NamedTuple):
+    """The result of a search, and statistics about it."""
+
+    # the best move found, in the format used by cpu.py
+    move: Optional[tuple]
+
+    # the fraction of playouts through the move won by the side to move
+    # (draws count as half)
+    score: float
+
+    # the number of playouts
+    rollouts: int
+
+    # the time the search took in seconds
+    seconds: float
+
+    @property
+    def rollouts_per_sec(self) -> float:
+        return self.rollouts / self.seconds if self.seconds else 0.0
+
+
+class Tree:
+    """
+    A search tree stored in flat arrays.
+
+    Node 0 is the root. The value of a node is the total reward of the
+    side that made the move into it, so parents pick the child with the
+    highest value.
+    """
+
+    def __init__(self, capacity: int = 1 << 12):
+        self.size = 1
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int32)
+        self.action = np.zeros(capacity, dtype=np.int16)
+        # the node's side to move
+        self.is_goat_turn = np.zeros(capacity, dtype=bool)
+        self.visits = np.zeros(capacity, dtype=np.float64)
+        self.value = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self, needed: int):
+        capacity = len(self.parent)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == len(self.parent):
+            return
+        for name in (
+            "parent",
+            "first_child",
+            "num_children",
+            "action",
+            "is_goat_turn",
+            "visits",
+            "value",
+        ):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[: len(array)] = array
+            if name in ("parent", "first_child"):
+                grown[len(array) :] = -1
+            setattr(self, name, grown)
+
+    def expand(self, node: int, actions: List[int]):
+        """Add the children of a node."""
+        start, count = self.size, len(actions)
+        self._grow(start + count)
+        self.parent[start : start + count] = node
+        self.action[start : start + count] = actions
+        self.is_goat_turn[start : start + count] = not self.is_goat_turn[node]
+        self.first_child[node] = start
+        self.num_children[node] = count
+        self.size += count
+
+    def select_child(self, node: int, exploration: float) -> int:
+        """Pick the child with the highest upper confidence bound (UCT)."""
+        start = self.first_child[node]
+        stop = start + self.num_children[node]
+        visits = self.visits[start:stop]
+        unvisited = np.flatnonzero(visits == 0)
+        if len(unvisited):
+            return start + unvisited[0]
+        log_n = math.log(self.visits[node])
+        uct = self.value[start:stop] / visits + exploration * np.sqrt(log_n / visits)
+        return start + int(uct.argmax())
+
+    def backpropagate(self, node: int, tiger_reward: float):
+        """Add a playout result to a node and its ancestors."""
+        while node >= 0:
+            # the side that moved into the node is the other side
+            if self.is_goat_turn[node]:
+                self.value[node] += tiger_reward
+            else:
+                self.value[node] += 1.0 - tiger_reward
+            node = self.parent[node]
+
+    def get_root_stats(self) -> List[tuple]:
+        """Get the (action, visits, value) of each child of the root."""
+        start = self.first_child[0]
+        return [
+            (int(self.action[i]), float(self.visits[i]), float(self.value[i]))
+            for i in range(start, start + self.num_children[0])
+        ]
+
+
+def _get_actions(board: BitBoard, is_goat_turn: bool, rng) -> List[int]:
+    actions = [encode_move(move) for move in get_moves(board, is_goat_turn)]
+    # unvisited children are tried in order, so shuffle them
+    rng.shuffle(actions)
+    return actions
+
+
+def _tiger_reward(winner: Optional[str]) -> float:
+    if winner == "tiger":
+        return 1.0
+    if winner == "goat":
+        return 0.0
+    return 0.5
+
+
+def grow_tree(
+    board: BitBoard,
+    is_goat_turn: bool,
+    rollouts: Optional[int] = None,
+    time_ms: Optional[float] = None,
+    seed: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+    rollout_moves: int = ROLLOUT_MOVES,
+    rollout: str = RANDOM,
+    exploration: float = EXPLORATION,
+) -> Tree:
+    """
+    Grow a search tree from a board until the budget of rollouts
+    or milliseconds runs out.
+    """
+    start = time.perf_counter()
+    deadline = None if time_ms is None else start + time_ms / 1000
+    rng = np.random.default_rng(seed)
+    games = VectorizedGames(batch_size, rollout_moves, rng.integers(1 << 62))
+
+    tree = Tree()
+    tree.is_goat_turn[0] = is_goat_turn
+    tree.expand(0, _get_actions(board, is_goat_turn, rng))
+
+    done = 0
+    while True:
+        if rollouts is not None and done >= rollouts:
+            break
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+
+        num_leaves = batch_size
+        if rollouts is not None:
+            num_leaves = min(num_leaves, rollouts - done)
+
+        # select leaves
+        # ----------------
+        leaves = []
+        games.done[:] = True
+        for b in range(num_leaves):
+            node, path = 0, []
+            tree.visits[0] += 1  # virtual loss until the playout is done
+            winner = None
+            while tree.num_children[node] > 0:
+                node = tree.select_child(node, exploration)
+                tree.visits[node] += 1
+                move = decode_action(int(tree.action[node]))
+                make_move(board, move, not tree.is_goat_turn[node])
+                path.append(move)
+                winner = board.get_winner()
+                if winner is not None:
+                    break
+
+            # expand the leaf unless the game is over, and play out from it
+            if winner is None:
+                if tree.visits[node] > 1:
+                    side = bool(tree.is_goat_turn[node])
+                    tree.expand(node, _get_actions(board, side, rng))
+                    node = tree.first_child[node]
+                    tree.visits[node] += 1
+                    move = decode_action(int(tree.action[node]))
+                    make_move(board, move, side)
+                    path.append(move)
+                    winner = board.get_winner()
+                if winner is None:
+                    games.set_board(b, board, bool(tree.is_goat_turn[node]))
+
+            leaves.append((node, winner))
+            for move in reversed(path):
+                unmake_move(board, move)
+
+        # play out the leaves together
+        # ----------------
+        while not games.done.all():
+            legal = games.get_legal_actions()
+            if rollout == HEURISTIC:
+                tiger_jumps = legal & _IS_JUMP
+                capturing = tiger_jumps.any(axis=1)
+                legal[capturing] = tiger_jumps[capturing]
+            games.step(games.get_random_actions(legal), check=False)
+
+        for b, (node, winner) in enumerate(leaves):
+            if winner is not None:
+                reward = _tiger_reward(winner)
+            elif games.winner[b] == TIGER_WIN:
+                reward = 1.0
+            elif games.winner[b] == GOAT_WIN:
+                reward = 0.0
+            else:
+                reward = 0.5
+            tree.backpropagate(node, reward)
+
+        done += num_leaves
+
+    return tree
+
+
+def _grow_root_stats(args: tuple) -> List[tuple]:
+    board, is_goat_turn, kwargs = args
+    return grow_tree(board, is_goat_turn, **kwargs).get_root_stats()
+
+
+class MCTS:
+    """
+    Searches for the best move with Monte Carlo tree search.
+
+    The budget per move is given in rollouts and/or milliseconds.
+    With processes > 1, every process grows its own tree; the
+    rollout budget is split between them, the time budget is not.
+    Call close() to stop the worker processes.
+    """
+
+    def __init__(
+        self,
+        time_ms: Optional[float] = None,
+        rollouts: Optional[int] = None,
+        processes: int = 1,
+        seed: Optional[int] = None,
+        batch_size: int = BATCH_SIZE,
+        rollout_moves: int = ROLLOUT_MOVES,
+        rollout: str = RANDOM,
+        exploration: float = EXPLORATION,
+    ):
+        if time_ms is None and rollouts is None:
+            raise ValueError("a budget of time_ms or rollouts is needed")
+
+        self.time_ms = time_ms
+        self.rollouts = rollouts
+        self.processes = processes
+        self.rng = np.random.default_rng(seed)
+        self.options = {
+            "batch_size": batch_size,
+            "rollout_moves": rollout_moves,
+            "rollout": rollout,
+            "exploration": exploration,
+        }
+
+        self.last_result: Optional[MCTSResult] = None
+        self._pool = None
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def search(self, board, is_goat_turn: bool) -> MCTSResult:
+        """Search for the best move of the side to move."""
+        start = time.perf_counter()
+        board = from_board(board)
+
+        moves = get_moves(board, is_goat_turn)
+        if len(moves) <= 1:
+            # no choice to make (or the tigers cannot move)
+            move = moves[0] if moves else None
+            self.last_result = MCTSResult(move, 0.5, 0, 0.0)
+            return self.last_result
+
+        rollouts = self.rollouts
+        if rollouts is not None:
+            rollouts = -(-rollouts // self.processes)  # round up
+        tasks = [
+            (
+                board,
+                is_goat_turn,
+                dict(
+                    self.options,
+                    rollouts=rollouts,
+                    time_ms=self.time_ms,
+                    seed=int(self.rng.integers(1 << 62)),
+                ),
+            )
+            for _ in range(self.processes)
+        ]
+        if self.processes > 1:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.processes)
+            results = self._pool.map(_grow_root_stats, tasks)
+        else:
+            results = [_grow_root_stats(tasks[0])]
+
+        # sum the root statistics of every tree
+        visits, values = {}, {}
+        for stats in results:
+            for action, n, value in stats:
+                visits[action] = visits.get(action, 0.0) + n
+                values[action] = values.get(action, 0.0) + value
+
+        best = max(visits, key=visits.get)
+        score = values[best] / visits[best] if visits[best] else 0.5
+        total = int(sum(visits.values()))
+        self.last_result = MCTSResult(
+            decode_action(best), score, total, time.perf_counter() - start
+        )
+        return self.last_result
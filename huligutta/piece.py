@@ -145,17 +145,10 @@ class Tiger(Piece):
         if address.is_in_corner(addr):
             return None
 
-        # check adjacent positions to the goat
-        for empty_pos in pos.get_adjacent_positions():
-            if empty_pos is self.pos:
-                continue
-
-            delta = address.get_displacement(self.pos.address, empty_pos.address)
-            if delta not in [(0, 2), (2, 0), (0, -2), (-2, 0)]:
-                continue
-
-            if empty_pos.is_empty():
-                return empty_pos.address
+        # check the position behind the goat
+        landing_addr = address.get_jump_landing(self.pos.address, addr)
+        if landing_addr and self.board.get_pos(landing_addr).is_empty():
+            return landing_addr
 
         return None
 
@@ -200,6 +193,7 @@ class Tiger(Piece):
         landing_pos.set_piece(Tiger(self.board, landing_pos))  # new position of tiger
 
         self.board.num_captured += 1  # increment captured pieces
+        # (Board.move_piece() updates the hash)
         # print(f"the goat at {target_pos.address} has been captured")
 
         return True
@@ -33,6 +33,9 @@ class Position:
             print("Tried initializing position with invalid address")
             raise e
 
+        # the index of the address in address.possible_pos
+        self.index = address.ADDR_INDEX[addr]
+
     def is_empty(self) -> bool:
         return self.piece == ()
 
@@ -44,6 +47,7 @@ class Position:
 
     def set_piece(self, piece: Union[tuple, "Piece"]):
         """Place a piece into this position."""
+        self.board._update_index(self, piece)
         self.piece = piece
 
     def clear(self):
@@ -0,0 +1,314 @@
+"""
+file: profiling.py
+Description: Opt-in call counters and timings of the rules engine
+
+The operations in TARGETS (move generation, capture checks, copies,
+placements and CPU decisions) can be counted and timed:
+
+    with profiling.profile() as profiler:
+        selfplay.play_game(0, "object")
+    print(profiler.format_table())
+    profiler.write_collapsed("games.folded")
+
+or for a whole run, by setting HULIGUTTA_PROFILE:
+
+    HULIGUTTA_PROFILE=1 python perft.py             # print a table at exit
+    HULIGUTTA_PROFILE=run.folded python perft.py    # also write stacks
+
+Collapsed stacks ("Board.get_tiger_possible_moves;Tiger.get_valid_moves 120",
+in microseconds of time spent in the last operation itself) can be drawn
+with flamegraph.pl or speedscope. Only calls between instrumented
+operations are shown.
+
+While profiling, the operations are replaced with timed wrappers; when
+it's turned off the originals are put back, so it costs nothing when off.
+Calls made through names imported before profiling started (such as
+`from huligutta.search import get_moves`) are not counted, and neither
+are calls in other processes: profile self-play with `selfplay.py -j 1`,
+which plays the games in the profiled process.
+"""
+
+import atexit
+import contextlib
+import functools
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# the environment variable that turns profiling on for a whole run
+ENV_VAR = "HULIGUTTA_PROFILE"
+
+# the operations that are instrumented, by category:
+# (module, class or None for a function, attribute)
+TARGETS: Dict[str, List[Tuple[str, Optional[str], str]]] = {
+    "moves": [
+        ("huligutta.board", "Board", "get_tiger_possible_moves"),
+        ("huligutta.board", "Board", "get_goat_possible_moves"),
+        ("huligutta.board", "Board", "has_tiger_moves"),
+        ("huligutta.piece", "Piece", "get_valid_moves"),
+        ("huligutta.piece", "Tiger", "get_valid_moves"),
+        ("huligutta.bitboard", "BitBoard", "get_tiger_possible_moves"),
+        ("huligutta.bitboard", "BitBoard", "get_goat_possible_moves"),
+        ("huligutta.bitboard", "BitBoard", "has_tiger_moves"),
+        ("huligutta.bitboard", "BitPiece", "get_valid_moves"),
+        ("huligutta.bitboard", "BitTiger", "get_valid_moves"),
+        ("huligutta.search", None, "get_moves"),
+    ],
+    "captures": [
+        ("huligutta.board", "Board", "get_tiger_capturing_moves"),
+        ("huligutta.board", "Board", "get_threat_map"),
+        ("huligutta.board", "Board", "is_pos_safe"),
+        ("huligutta.piece", "Tiger", "_get_capturing_positions"),
+        ("huligutta.piece", "Tiger", "can_capture_pos"),
+        ("huligutta.piece", "Tiger", "get_capturing_moves"),
+        ("huligutta.piece", "Tiger", "capture"),
+        ("huligutta.bitboard", "BitBoard", "get_tiger_capturing_moves"),
+        ("huligutta.bitboard", "BitBoard", "get_threat_map"),
+        ("huligutta.bitboard", "BitBoard", "is_pos_safe"),
+        ("huligutta.bitboard", "BitTiger", "_get_capturing_positions"),
+        ("huligutta.bitboard", "BitTiger", "can_capture_pos"),
+        ("huligutta.bitboard", "BitTiger", "get_capturing_moves"),
+    ],
+    "copies": [
+        ("huligutta.board", "Board", "copy_board"),
+        ("huligutta.board", "Board", "_get_undo_state"),
+        ("huligutta.bitboard", "BitBoard", "copy"),
+        ("huligutta.bitboard", "BitBoard", "get_state"),
+        ("huligutta.bitboard", "BitBoard", "set_state"),
+    ],
+    "placements": [
+        ("huligutta.board", "Board", "place_tiger"),
+        ("huligutta.board", "Board", "place_goat"),
+        ("huligutta.board", "Board", "move_piece"),
+        ("huligutta.board", "Board", "unmake_move"),
+        ("huligutta.position", "Position", "set_piece"),
+        ("huligutta.bitboard", "BitBoard", "place_tiger"),
+        ("huligutta.bitboard", "BitBoard", "place_goat"),
+        ("huligutta.bitboard", "BitBoard", "move_piece"),
+        ("huligutta.bitboard", "BitBoard", "unmake_move"),
+    ],
+    "cpu": [
+        ("cpu", None, "compute_tiger_move"),
+        ("cpu", None, "compute_goat_move"),
+        ("cpu", None, "play_move"),
+        ("huligutta.search", "Searcher", "search"),
+        ("huligutta.mcts", "MCTS", "search"),
+    ],
+}
+
+
+class OpStats(NamedTuple):
+    """The counts and timings of an operation."""
+
+    # the name of the operation, like "Board.copy_board"
+    name: str
+
+    # the category of the operation (see TARGETS)
+    category: str
+
+    # the number of times it was called
+    calls: int
+
+    # the time spent in it, in seconds (recursive calls are counted once)
+    total: float
+
+    # the time spent in it but not in the other operations it called
+    own: float
+
+    @property
+    def per_call(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class Profiler:
+    """Collects the counts and timings of the instrumented operations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._categories: Dict[str, str] = {}
+        # name -> [calls, total, own]
+        self._stats: Dict[str, list] = {}
+        # stack of names -> own time
+        self._stacks: Dict[tuple, float] = {}
+
+    def reset(self):
+        """Forget everything that was collected."""
+        with self._lock:
+            for stats in self._stats.values():
+                stats[:] = [0, 0.0, 0.0]
+            self._stacks.clear()
+
+    def _get_stack(self) -> list:
+        # each thread has its own stack of [path, time spent in callees]
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def wrap(self, name: str, category: str, func):
+        """Get a timed version of a function."""
+        self._categories[name] = category
+        stats = self._stats.setdefault(name, [0, 0.0, 0.0])
+        stacks = self._stacks
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = self._get_stack()
+            path = stack[-1][0] + (name,) if stack else (name,)
+            frame = [path, 0.0]
+            stack.append(frame)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                stack.pop()
+                own = elapsed - frame[1]
+                if stack:
+                    stack[-1][1] += elapsed
+                stats[0] += 1
+                stats[2] += own
+                if name not in path[:-1]:
+                    stats[1] += elapsed
+                stacks[path] = stacks.get(path, 0.0) + own
+
+        wrapper.__wrapped_by_profiler__ = func
+        return wrapper
+
+    def snapshot(self) -> List[OpStats]:
+        """Get the stats of every operation that was called, slowest first."""
+        with self._lock:
+            ops = [
+                OpStats(name, self._categories[name], *stats)
+                for name, stats in self._stats.items()
+                if stats[0]
+            ]
+        return sorted(ops, key=lambda op: op.total, reverse=True)
+
+    def format_table(self) -> str:
+        """Format the stats as a table."""
+        lines = [
+            f"{'operation':<36} {'category':<10} {'calls':>9} "
+            f"{'total ms':>10} {'own ms':>10} {'us/call':>9}"
+        ]
+        for op in self.snapshot():
+            lines.append(
+                f"{op.name:<36} {op.category:<10} {op.calls:>9} "
+                f"{op.total * 1e3:>10.2f} {op.own * 1e3:>10.2f} "
+                f"{op.per_call * 1e6:>9.2f}"
+            )
+        return "\n".join(lines)
+
+    def collapsed(self) -> List[str]:
+        """
+        Get the collapsed stacks, one per line, with the time spent
+        in the last operation of each in microseconds.
+        """
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return [
+            f"{';'.join(path)} {round(own * 1e6)}"
+            for path, own in stacks
+            if round(own * 1e6) > 0
+        ]
+
+    def write_collapsed(self, path: str):
+        """Write the collapsed stacks to a file (for flamegraph.pl)."""
+        with open(path, "w") as file:
+            for line in self.collapsed():
+                file.write(line + "\n")
+
+
+# the profiler that is running, if any
+_profiler: Optional[Profiler] = None
+
+# the original functions that were replaced: (owner, attribute, original)
+_patched: List[tuple] = []
+
+
+def _iter_targets() -> Iterator[Tuple[str, object, str, str]]:
+    """Yield (name, owner, attribute, category) of every target that exists."""
+    for category, targets in TARGETS.items():
+        for module_name, class_name, attr in targets:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue  # e.g. cpu, when not run from the project root
+            owner = module if class_name is None else getattr(module, class_name)
+            # only what the class defines itself, not what it inherits
+            if attr not in vars(owner):
+                continue
+            name = f"{class_name or module_name}.{attr}"
+            yield name, owner, attr, category
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+def get_profiler() -> Optional[Profiler]:
+    """Get the running profiler, if profiling is on."""
+    return _profiler
+
+
+def enable(profiler: Optional[Profiler] = None) -> Profiler:
+    """Start profiling. Returns the profiler the stats are collected in."""
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    _profiler = profiler or Profiler()
+    for name, owner, attr, category in _iter_targets():
+        original = vars(owner)[attr]
+        setattr(owner, attr, _profiler.wrap(name, category, original))
+        _patched.append((owner, attr, original))
+    return _profiler
+
+
+def disable() -> Optional[Profiler]:
+    """Stop profiling and put the original functions back."""
+    global _profiler
+    while _patched:
+        owner, attr, original = _patched.pop()
+        setattr(owner, attr, original)
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+@contextlib.contextmanager
+def profile(profiler: Optional[Profiler] = None):
+    """Profile the operations run inside a `with` block."""
+    was_enabled = is_enabled()
+    profiler = enable(profiler)
+    try:
+        yield profiler
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def _report(path: Optional[str]):
+    profiler = disable()
+    if profiler is None:
+        return
+    print(profiler.format_table(), file=sys.stderr)
+    if path:
+        profiler.write_collapsed(path)
+        print(f"collapsed stacks written to {path}", file=sys.stderr)
+
+
+def enable_from_env():
+    """
+    Start profiling if HULIGUTTA_PROFILE is set, and report at exit.
+    The variable is either 1 or the path to write collapsed stacks to.
+    """
+    value = os.environ.get(ENV_VAR, "")
+    if value in ("", "0") or is_enabled():
+        return
+    enable()
+    atexit.register(_report, None if value == "1" else value)
@@ -0,0 +1,338 @@
+"""
+file: ranking.py
+Description: Number every state of the game with a dense integer
+
+A state (tiger positions, goat positions, goats captured, whether every
+goat has been placed, side to move) is ranked in two steps:
+
+  - Sets of positions are ranked with the combinatorial number system
+    (colexicographic order): the set {p1 < p2 < ... < pk} has rank
+    C(p1, 1) + C(p2, 2) + ... + C(pk, k). Goat positions are first
+    renumbered to skip the positions that hold a tiger, so the sets of g
+    goats next to t tigers are ranked 0 to C(23 - t, g) - 1.
+
+  - States are grouped into blocks by (num_tigers, num_goats,
+    num_captured, is_all_goats_placed). Within a block, a state's index
+    is (side * T + tiger rank) * G + goat rank, with T and G the number of
+    tiger and goat sets. Blocks are laid out one after the other, so the
+    ranks of all states are 0 to NUM_STATES - 1.
+
+Every state that can occur in a game has a rank (and some that can't,
+e.g. with more captures than goats placed), so values for positions can
+be stored in flat NumPy arrays or memory-mapped files indexed by rank.
+"""
+
+from math import comb
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Tuple
+import numpy as np
+from huligutta.bitboard import get_masks
+from huligutta.board import NUM_TIGERS, MAX_GOATS, CAPTURES_TO_WIN
+import address
+
+_N = address.NUM_POSITIONS
+
+# C(n, k) for n and k up to the number of positions
+BINOM = np.array(
+    [[comb(n, k) for k in range(_N + 1)] for n in range(_N + 1)], dtype=np.int64
+)
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(1 << 12)], dtype=np.int64)
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """Count the bits of bitmasks (of up to 24 bits)."""
+    return _POPCOUNT[masks & 0xFFF] + _POPCOUNT[masks >> 12]
+
+
+# sets of positions
+# ----------------
+
+
+def rank_set(mask: int) -> int:
+    """Rank a set of positions (as a bitmask) among the sets of its size."""
+    rank, count = 0, 0
+    while mask:
+        i = (mask & -mask).bit_length() - 1
+        count += 1
+        rank += comb(i, count)
+        mask &= mask - 1
+    return rank
+
+
+def rank_sets(masks: np.ndarray, n: int = _N) -> np.ndarray:
+    """Rank sets of positions out of the first n positions."""
+    masks = np.asarray(masks, dtype=np.int64)
+    rank = np.zeros(masks.shape, dtype=np.int64)
+    count = np.zeros(masks.shape, dtype=np.int64)
+    for i in range(n):
+        bit = (masks >> i) & 1
+        count += bit
+        rank += bit * BINOM[i, count]
+    return rank
+
+
+def unrank_set(rank: int, k: int, n: int = _N) -> int:
+    """Get the set of k out of n positions with a rank, as a bitmask."""
+    mask = 0
+    for i in range(n - 1, -1, -1):
+        if k and comb(i, k) <= rank:
+            rank -= comb(i, k)
+            k -= 1
+            mask |= 1 << i
+    return mask
+
+
+def unrank_sets(ranks: np.ndarray, k, n: int = _N) -> np.ndarray:
+    """Inverse of rank_sets(). `k` can be an array of set sizes."""
+    rank = np.array(ranks, dtype=np.int64)
+    k = np.broadcast_to(np.asarray(k, dtype=np.int64), rank.shape).copy()
+    masks = np.zeros(rank.shape, dtype=np.int64)
+    for i in range(n - 1, -1, -1):
+        take = (k > 0) & (BINOM[i, k] <= rank)
+        rank -= np.where(take, BINOM[i, k], 0)
+        k -= take
+        masks |= take.astype(np.int64) << i
+    return masks
+
+
+def get_sets(n: int, k: int) -> np.ndarray:
+    """Get every set of k out of n positions as bitmasks, ordered by rank."""
+    masks = np.array(
+        [sum(1 << p for p in c) for c in combinations(range(n), k)], dtype=np.int64
+    )
+    ordered = np.empty_like(masks)
+    ordered[rank_sets(masks, n)] = masks
+    return ordered
+
+
+def compress(goats: int, tigers: int) -> int:
+    """Renumber goat positions so they skip positions holding a tiger."""
+    rel, below = 0, 0
+    for i in range(_N):
+        if not tigers >> i & 1:
+            rel |= (goats >> i & 1) << below
+            below += 1
+    return rel
+
+
+def compress_masks(goats: np.ndarray, tigers: np.ndarray) -> np.ndarray:
+    """Batch version of compress()."""
+    rel = np.zeros(np.shape(goats), dtype=np.int64)
+    below = np.zeros(np.shape(goats), dtype=np.int64)
+    for i in range(_N):
+        rel |= ((goats >> i) & 1) << below
+        below += ((tigers >> i) & 1) ^ 1
+    return rel
+
+
+def expand_masks(rel: np.ndarray, tigers: np.ndarray) -> np.ndarray:
+    """Inverse of compress_masks()."""
+    goats = np.zeros(np.shape(rel), dtype=np.int64)
+    below = np.zeros(np.shape(rel), dtype=np.int64)
+    for i in range(_N):
+        free = ((tigers >> i) & 1) ^ 1
+        goats |= ((rel >> below) & free) << i
+        below += free
+    return goats
+
+
+# positions within a block
+# ----------------
+
+
+def get_block_size(num_tigers: int, num_goats: int) -> int:
+    """The number of states with both sides to move for a number of pieces."""
+    return 2 * comb(_N, num_tigers) * comb(_N - num_tigers, num_goats)
+
+
+def rank_positions(is_goat_turn, tigers, goats, num_tigers: int, num_goats: int):
+    """
+    Get the index of states within their block. All the states must have
+    the given number of tigers and goats.
+    """
+    tigers = np.asarray(tigers, dtype=np.int64)
+    tiger_rank = rank_sets(tigers)
+    goat_rank = rank_sets(compress_masks(np.asarray(goats), tigers), _N - num_tigers)
+    side = np.asarray(is_goat_turn, dtype=np.int64)
+    num_goat_sets = comb(_N - num_tigers, num_goats)
+    return (side * comb(_N, num_tigers) + tiger_rank) * num_goat_sets + goat_rank
+
+
+def unrank_positions(index, num_tigers: int, num_goats: int) -> tuple:
+    """Inverse of rank_positions(). Returns (is_goat_turn, tigers, goats)."""
+    index = np.asarray(index, dtype=np.int64)
+    rest, goat_rank = np.divmod(index, comb(_N - num_tigers, num_goats))
+    side, tiger_rank = np.divmod(rest, comb(_N, num_tigers))
+    tigers = unrank_sets(tiger_rank, num_tigers)
+    goats = expand_masks(unrank_sets(goat_rank, num_goats, _N - num_tigers), tigers)
+    return side.astype(bool), tigers, goats
+
+
+# blocks
+# ----------------
+
+
+class Block(NamedTuple):
+    """The states with a given number of pieces and phase."""
+
+    num_tigers: int
+    num_goats: int
+    num_captured: int
+    is_all_goats_placed: bool
+
+    # the rank of the first state of the block
+    offset: int
+
+    # the number of states in the block
+    size: int
+
+
+def _build_blocks() -> List[Block]:
+    keys = [(t, 0, 0, False) for t in range(NUM_TIGERS)]
+    for num_captured in range(CAPTURES_TO_WIN + 1):
+        # goats are placed until MAX_GOATS are on the board
+        for num_goats in range(MAX_GOATS):
+            keys.append((NUM_TIGERS, num_goats, num_captured, False))
+        # then every capture leaves one goat less
+        for num_goats in range(max(0, MAX_GOATS - num_captured), MAX_GOATS + 1):
+            keys.append((NUM_TIGERS, num_goats, num_captured, True))
+
+    blocks, offset = [], 0
+    for t, g, c, p in keys:
+        size = get_block_size(t, g)
+        blocks.append(Block(t, g, c, p, offset, size))
+        offset += size
+    return blocks
+
+
+# every block, in the order they are laid out
+BLOCKS: List[Block] = _build_blocks()
+
+# the number of ranked states
+NUM_STATES = BLOCKS[-1].offset + BLOCKS[-1].size
+
+_BLOCK_INDEX: Dict[tuple, int] = {block[:4]: n for n, block in enumerate(BLOCKS)}
+
+# the block of each (num_tigers, num_goats, num_captured, is_all_goats_placed),
+# or -1 if there is none
+_BLOCK_TABLE = np.full((NUM_TIGERS + 1, _N + 1, CAPTURES_TO_WIN + 1, 2), -1)
+for _n, _block in enumerate(BLOCKS):
+    _BLOCK_TABLE[_block[:3] + (int(_block.is_all_goats_placed),)] = _n
+
+_OFFSETS = np.array([block.offset for block in BLOCKS], dtype=np.int64)
+_NUM_TIGERS = np.array([block.num_tigers for block in BLOCKS], dtype=np.int64)
+_NUM_GOATS = np.array([block.num_goats for block in BLOCKS], dtype=np.int64)
+_NUM_CAPTURED = np.array([block.num_captured for block in BLOCKS], dtype=np.int64)
+_IS_ALL_GOATS_PLACED = np.array([block.is_all_goats_placed for block in BLOCKS])
+_NUM_TIGER_SETS = BINOM[_N, _NUM_TIGERS]
+_NUM_GOAT_SETS = BINOM[_N - _NUM_TIGERS, _NUM_GOATS]
+
+
+def get_block(
+    num_tigers: int, num_goats: int, num_captured: int, is_all_goats_placed: bool
+) -> Block:
+    """Get the block of states with a number of pieces and phase."""
+    key = (num_tigers, num_goats, num_captured, bool(is_all_goats_placed))
+    if key not in _BLOCK_INDEX:
+        raise ValueError(f"no states with {key}")
+    return BLOCKS[_BLOCK_INDEX[key]]
+
+
+# states
+# ----------------
+
+
+def rank_state(
+    tigers: int,
+    goats: int,
+    num_captured: int,
+    is_all_goats_placed: bool,
+    is_goat_turn: bool,
+) -> int:
+    """Rank a state given by tiger and goat bitmasks."""
+    num_tigers = bin(tigers).count("1")
+    num_goats = bin(goats).count("1")
+    block = get_block(num_tigers, num_goats, num_captured, is_all_goats_placed)
+    num_goat_sets = comb(_N - num_tigers, num_goats)
+    side = 1 if is_goat_turn else 0
+    tiger_rank = rank_set(tigers)
+    goat_rank = rank_set(compress(goats, tigers))
+    index = (side * comb(_N, num_tigers) + tiger_rank) * num_goat_sets + goat_rank
+    return block.offset + index
+
+
+def unrank_state(rank: int) -> Tuple[int, int, int, bool, bool]:
+    """
+    Inverse of rank_state(). Returns (tigers, goats, num_captured,
+    is_all_goats_placed, is_goat_turn).
+    """
+    if not 0 <= rank < NUM_STATES:
+        raise ValueError("rank out of range")
+    block = BLOCKS[int(np.searchsorted(_OFFSETS, rank, side="right")) - 1]
+    t, g = block.num_tigers, block.num_goats
+    rest, goat_rank = divmod(rank - block.offset, comb(_N - t, g))
+    side, tiger_rank = divmod(rest, comb(_N, t))
+    tigers = unrank_set(tiger_rank, t)
+    goats = int(expand_masks(unrank_set(goat_rank, g, _N - t), tigers))
+    return tigers, goats, block.num_captured, block.is_all_goats_placed, bool(side)
+
+
+def rank_states(
+    tigers, goats, num_captured, is_all_goats_placed, is_goat_turn
+) -> np.ndarray:
+    """Batch version of rank_state(), over arrays of each part of the state."""
+    tigers = np.asarray(tigers, dtype=np.int64)
+    goats = np.asarray(goats, dtype=np.int64)
+    num_tigers = popcount(tigers)
+    num_goats = popcount(goats)
+    block = _BLOCK_TABLE[
+        num_tigers,
+        num_goats,
+        np.asarray(num_captured, dtype=np.int64),
+        np.asarray(is_all_goats_placed, dtype=np.int64),
+    ]
+    if (block < 0).any():
+        raise ValueError("no rank for some states")
+
+    tiger_rank = rank_sets(tigers)
+    goat_rank = rank_sets(compress_masks(goats, tigers))
+    side = np.asarray(is_goat_turn, dtype=np.int64)
+    index = (side * _NUM_TIGER_SETS[block] + tiger_rank) * _NUM_GOAT_SETS[block]
+    return _OFFSETS[block] + index + goat_rank
+
+
+def unrank_states(ranks) -> Tuple[np.ndarray, ...]:
+    """
+    Batch version of unrank_state(). Returns arrays of tigers, goats,
+    num_captured, is_all_goats_placed and is_goat_turn.
+    """
+    ranks = np.asarray(ranks, dtype=np.int64)
+    if ((ranks < 0) | (ranks >= NUM_STATES)).any():
+        raise ValueError("rank out of range")
+    block = np.searchsorted(_OFFSETS, ranks, side="right") - 1
+    rest, goat_rank = np.divmod(ranks - _OFFSETS[block], _NUM_GOAT_SETS[block])
+    side, tiger_rank = np.divmod(rest, _NUM_TIGER_SETS[block])
+    tigers = unrank_sets(tiger_rank, _NUM_TIGERS[block])
+    goats = expand_masks(unrank_sets(goat_rank, _NUM_GOATS[block]), tigers)
+
+    return (
+        tigers,
+        goats,
+        _NUM_CAPTURED[block],
+        _IS_ALL_GOATS_PLACED[block],
+        side.astype(bool),
+    )
+
+
+def rank_board(board, is_goat_turn=None) -> int:
+    """
+    Rank a board (of any kind). The side to move defaults to
+    board.is_goat_turn.
+    """
+    if is_goat_turn is None:
+        is_goat_turn = board.is_goat_turn
+    tigers, goats = get_masks(board)
+    return rank_state(
+        tigers, goats, board.num_captured, board.is_all_goats_placed, is_goat_turn
+    )
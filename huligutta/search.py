@@ -0,0 +1,335 @@
+"""
+file: search.py
+Description: Alpha-beta game tree search for the CPU players
+
+Moves are searched with negamax alpha-beta and iterative deepening,
+until a time or node budget runs out. Moves are made and unmade on a
+single BitBoard instead of copying boards, and searched positions are
+kept in a transposition table between iterations.
+"""
+
+import threading
+import time
+from typing import List, NamedTuple, Optional
+from huligutta.bitboard import (
+    NEIGHBOR_MASKS,
+    CAPTURES_FROM,
+    BitBoard,
+    from_board,
+    iter_bits,
+)
+from huligutta.board import NUM_TIGERS
+from huligutta.transposition import (
+    TranspositionTable,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND,
+)
+from huligutta import zobrist
+import address
+
+# the score of winning the game right now
+WIN_SCORE = 100000
+
+# scores above this are wins (and below its negative are losses)
+_WIN_THRESHOLD = WIN_SCORE - 1000
+
+# the weights of the evaluation (from the tigers' point of view)
+CAPTURE_WEIGHT = 100
+THREAT_WEIGHT = 20
+MOBILITY_WEIGHT = 2
+
+# how often (in nodes) the time is checked
+_CHECK_INTERVAL = 1024
+
+# the deepest search allowed
+MAX_DEPTH = 64
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the budget runs out."""
+
+
+class SearchResult(NamedTuple):
+    """The result of a search, and statistics about it."""
+
+    # the best move found, in the format used by cpu.py
+    move: Optional[tuple]
+
+    # the score of the move for the side to move
+    score: int
+
+    # the deepest iteration that was completed
+    depth: int
+
+    # the number of positions searched
+    nodes: int
+
+    # the time the search took in seconds
+    seconds: float
+
+    @property
+    def nps(self) -> float:
+        """Nodes searched per second."""
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+
+def evaluate(board: BitBoard) -> int:
+    """Score a board from the tigers' point of view."""
+    tigers, goats = board.tigers, board.goats
+    empty = board.empty
+
+    mobility = 0
+    threats = 0
+    for i in iter_bits(tigers):
+        mobility += bin(NEIGHBOR_MASKS[i] & empty).count("1")
+        for goat_bit, landing_bit, _, _ in CAPTURES_FROM[i]:
+            if goats & goat_bit and empty & landing_bit:
+                threats += 1
+
+    return (
+        board.num_captured * CAPTURE_WEIGHT
+        + threats * THREAT_WEIGHT
+        + mobility * MOBILITY_WEIGHT
+    )
+
+
+def get_moves(board: BitBoard, is_goat_turn: bool) -> List[Optional[tuple]]:
+    """
+    Get every move the side to move can make, captures first.
+
+    A move of None means the side passes, which goats do before
+    all the tigers are placed and when they cannot move.
+    """
+    if not is_goat_turn:
+        if board.get_num_tigers() < NUM_TIGERS:
+            return [(pos.address,) for pos in board.get_all_empty_positions()]
+
+        moves = board.get_tiger_possible_moves()
+        # captures are the only moves between positions that aren't adjacent
+        captures = [move for move in moves if not address.is_adjacent(*move)]
+        if captures:
+            steps = [move for move in moves if address.is_adjacent(*move)]
+            return captures + steps
+        return moves
+
+    if board.get_num_tigers() < NUM_TIGERS:
+        return [None]
+    if not board.is_all_goats_placed:
+        return [(pos.address,) for pos in board.get_all_empty_positions()]
+    return board.get_goat_possible_moves() or [None]
+
+
+def make_move(board: BitBoard, move: Optional[tuple], is_goat_turn: bool):
+    """Make a move from get_moves()."""
+    if move is None:
+        return
+    if len(move) == 1:
+        if is_goat_turn:
+            board.place_goat(move[0])
+        else:
+            board.place_tiger(move[0])
+    else:
+        board.move_piece(*move)
+
+
+def unmake_move(board: BitBoard, move: Optional[tuple]):
+    """Unmake a move made with make_move()."""
+    if move is not None:
+        board.unmake_move()
+
+
+class Searcher:
+    """
+    Searches for the best move with a budget of time and/or nodes.
+
+    If neither budget is given, the search goes to max_depth.
+    The statistics of the last search are kept in `last_result`.
+    """
+
+    def __init__(
+        self,
+        time_limit: Optional[float] = None,
+        node_limit: Optional[int] = None,
+        max_depth: int = MAX_DEPTH,
+        table_size: int = 1 << 18,
+    ):
+        # the budget per move, in seconds
+        self.time_limit = time_limit
+        # the budget per move, in positions searched
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_size)
+
+        self.nodes = 0
+        self.last_result: Optional[SearchResult] = None
+        self._deadline = None
+
+        # if set (from another thread), the search stops early
+        # and returns the best move found so far
+        self.stop_event: Optional[threading.Event] = None
+
+    def _get_key(self, board: BitBoard, is_goat_turn: bool) -> int:
+        # the turn isn't flipped on the board when a side passes
+        if board.is_goat_turn != is_goat_turn:
+            return board.zobrist_hash ^ zobrist.GOAT_TURN_KEY
+        return board.zobrist_hash
+
+    def _check_budget(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchTimeout
+        if self._deadline is not None and time.perf_counter() >= self._deadline:
+            raise SearchTimeout
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout
+
+    def search(self, board, is_goat_turn: bool) -> SearchResult:
+        """
+        Search for the best move of the side to move.
+
+        The board can be any board; it is copied to a BitBoard once,
+        and then searched with make/unmake.
+        """
+        start = time.perf_counter()
+        self._deadline = None if self.time_limit is None else start + self.time_limit
+        self.nodes = 0
+        self.table.new_search()
+
+        board = from_board(board)
+        moves = get_moves(board, is_goat_turn)
+        # the tigers lose if they cannot move
+        best_move, best_score, depth = (moves or [None])[0], 0, 0
+
+        # a single move needs no search
+        if len(moves) > 1:
+            for d in range(1, self.max_depth + 1):
+                try:
+                    best_move, best_score = self._search_root(
+                        board, is_goat_turn, moves, d
+                    )
+                except SearchTimeout:
+                    break
+                depth = d
+
+                # the result can't change once a win or loss is found
+                if abs(best_score) >= _WIN_THRESHOLD:
+                    break
+
+                # search the best move first in the next iteration
+                moves.remove(best_move)
+                moves.insert(0, best_move)
+
+        seconds = time.perf_counter() - start
+        self.last_result = SearchResult(
+            best_move, best_score, depth, self.nodes, seconds
+        )
+        return self.last_result
+
+    def ponder(self, board, is_goat_turn: bool) -> SearchResult:
+        """
+        Search without a budget, until stop_event is set or max_depth
+        is reached. Run on the opponent's time, this fills the
+        transposition table for the search of the reply.
+        """
+        budget = self.time_limit, self.node_limit
+        self.time_limit = self.node_limit = None
+        try:
+            return self.search(board, is_goat_turn)
+        finally:
+            self.time_limit, self.node_limit = budget
+
+    def _search_root(self, board, is_goat_turn, moves, depth):
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_move = moves[0]
+        for move in moves:
+            make_move(board, move, is_goat_turn)
+            try:
+                score = -self._negamax(
+                    board, not is_goat_turn, depth - 1, -beta, -alpha, 1
+                )
+            finally:
+                unmake_move(board, move)
+            if score > alpha:
+                alpha, best_move = score, move
+
+        self.table.store(
+            self._get_key(board, is_goat_turn), alpha, depth, EXACT, best_move
+        )
+        return best_move, alpha
+
+    def _negamax(self, board, is_goat_turn, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes % _CHECK_INTERVAL == 0:
+            self._check_budget()
+
+        winner = board.get_winner()
+        if winner is not None:
+            score = WIN_SCORE - ply
+            return score if (winner == "goat") == is_goat_turn else -score
+
+        if depth <= 0:
+            score = evaluate(board)
+            return -score if is_goat_turn else score
+
+        key = self._get_key(board, is_goat_turn)
+        entry = self.table.probe(key)
+        table_move = None
+        if entry is not None:
+            table_move = entry.move
+            if entry.depth >= depth:
+                score = _from_table(entry.value, ply)
+                if entry.flag == EXACT:
+                    return score
+                if entry.flag == LOWER_BOUND and score >= beta:
+                    return score
+                if entry.flag == UPPER_BOUND and score <= alpha:
+                    return score
+
+        moves = get_moves(board, is_goat_turn)
+        if table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+
+        original_alpha = alpha
+        best_score, best_move = -WIN_SCORE - 1, None
+        for move in moves:
+            make_move(board, move, is_goat_turn)
+            try:
+                score = -self._negamax(
+                    board, not is_goat_turn, depth - 1, -beta, -alpha, ply + 1
+                )
+            finally:
+                unmake_move(board, move)
+
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, _to_table(best_score, ply), depth, flag, best_move)
+        return best_score
+
+
+def _to_table(score: int, ply: int) -> int:
+    """Store wins and losses relative to the node instead of the root."""
+    if score >= _WIN_THRESHOLD:
+        return score + ply
+    if score <= -_WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_table(score: int, ply: int) -> int:
+    if score >= _WIN_THRESHOLD:
+        return score - ply
+    if score <= -_WIN_THRESHOLD:
+        return score + ply
+    return score
@@ -0,0 +1,141 @@
+"""
+file: stalemate.py
+Description: Catalog of the goats needed to stalemate every set of tigers
+
+For each of the C(23, 3) = 1771 sets of tiger positions, the catalog
+holds the goat positions that stalemate the tigers (as a bitmask over
+address.possible_pos). It is built once with the same two passes as
+functions.get_optimal_stalemate used to do, saved next to this file,
+and loaded the first time it is needed.
+"""
+
+import os
+from itertools import combinations
+from math import comb
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+from huligutta.ranking import rank_sets
+import address
+
+# where the catalog is saved
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "stalemates.npy")
+
+# every set of tiger positions (as indices into address.possible_pos),
+# in the order of the catalog
+TRIPLES: List[Tuple[int, int, int]] = sorted(
+    combinations(range(address.NUM_POSITIONS), 3),
+    key=lambda t: comb(t[0], 1) + comb(t[1], 2) + comb(t[2], 3),
+)
+
+_catalog: Optional[np.ndarray] = None
+
+
+def get_index(pos1: str, pos2: str, pos3: str) -> int:
+    """Get the catalog index of a set of tiger positions (in any order)."""
+    i, j, k = sorted(address.ADDR_INDEX[pos] for pos in (pos1, pos2, pos3))
+    if i == j or j == k:
+        raise ValueError("tiger positions must be different")
+    return comb(i, 1) + comb(j, 2) + comb(k, 3)
+
+
+def build() -> np.ndarray:
+    """
+    Compute the stalemating goats of every set of tiger positions.
+
+    First, a goat is placed in every empty position next to a tiger.
+    Then, a goat is placed on every position a tiger could land on
+    by capturing.
+    """
+    from huligutta.board import Board
+
+    catalog = np.zeros(len(TRIPLES), dtype=np.uint32)
+    for n, triple in enumerate(TRIPLES):
+        board = Board()
+        for i in triple:
+            board.place_tiger(address.possible_pos[i])
+
+        tigers = board.get_all_tigers()
+
+        # first pass: place goats in all positions adjacent to the tigers
+        for tiger in tigers:
+            for adj_pos in tiger.pos.get_adjacent_positions():
+                if adj_pos.is_empty():
+                    adj_pos.place_goat()
+
+        # second pass: place goats to block all capturing moves
+        for tiger in tigers:
+            for capturing_addr in tiger.get_capturing_moves():
+                board.place_goat(capturing_addr)
+
+        catalog[n] = sum(
+            1 << address.ADDR_INDEX[pos.address]
+            for pos in board.get_all_goat_positions()
+        )
+    return catalog
+
+
+def save(catalog: np.ndarray, path: str = CATALOG_PATH):
+    np.save(path, catalog)
+
+
+def load(path: str = CATALOG_PATH) -> np.ndarray:
+    """
+    Get the catalog, loading it on first use.
+
+    The catalog is built and saved if the file doesn't exist.
+    """
+    global _catalog
+    if _catalog is None:
+        if os.path.exists(path):
+            catalog = np.load(path)
+            if catalog.shape != (len(TRIPLES),):
+                raise ValueError(f"{path} is not a stalemate catalog")
+        else:
+            catalog = build()
+            save(catalog, path)
+        _catalog = catalog
+    return _catalog
+
+
+def get_goat_mask(pos1: str, pos2: str, pos3: str) -> int:
+    """Get the stalemating goats of a set of tigers as a bitmask."""
+    return int(load()[get_index(pos1, pos2, pos3)])
+
+
+def get_goat_masks(tiger_masks) -> np.ndarray:
+    """
+    Get the stalemating goats of many sets of tigers, given as an array
+    of bitmasks of exactly three positions each.
+    """
+    # the catalog is in the order of the ranks of the tiger sets
+    return load()[rank_sets(tiger_masks)].astype(np.int64)
+
+
+def get_goat_addrs(pos1: str, pos2: str, pos3: str) -> List[str]:
+    """Get the addresses of the stalemating goats of a set of tigers."""
+    mask = get_goat_mask(pos1, pos2, pos3)
+    return [addr for i, addr in enumerate(address.possible_pos) if mask >> i & 1]
+
+
+def get_num_goats(pos1: str, pos2: str, pos3: str) -> int:
+    """Get the number of goats needed to stalemate a set of tigers."""
+    return bin(get_goat_mask(pos1, pos2, pos3)).count("1")
+
+
+def get_all_num_goats() -> np.ndarray:
+    """Get the number of stalemating goats of every set of tigers."""
+    catalog = load()
+    counts = np.zeros(len(catalog), dtype=np.int64)
+    for i in range(address.NUM_POSITIONS):
+        counts += (catalog >> np.uint32(i)) & np.uint32(1)
+    return counts
+
+
+def iter_stalemates() -> Iterable[Tuple[Tuple[str, str, str], List[str]]]:
+    """Iterate over every set of tiger positions and its stalemating goats."""
+    catalog = load()
+    for triple, mask in zip(TRIPLES, catalog):
+        tigers = tuple(address.possible_pos[i] for i in triple)
+        mask = int(mask)
+        goats = [addr for i, addr in enumerate(address.possible_pos) if mask >> i & 1]
+        yield tigers, goats
@@ -0,0 +1,510 @@
+"""
+file: tablebase.py
+Description: Endgame tablebase for the movement phase, built by retrograde analysis
+
+Once every goat has been placed, a state is fully described by the tiger
+and goat positions, the number of captures the tigers still need, and the
+side to move. The states are split into slices by the number of goats on
+the board and the captures still needed. Captures lead from one slice into
+the slice with one goat less, so slices are solved in order, each one by
+working backwards from its terminal states with a reverse move generator.
+
+Every state is labeled WIN, LOSS or DRAW (for the side to move) with the
+number of moves until the result, and stored as a uint16 in a file that is
+memory-mapped when probed. To build the tablebase for the real game, run
+
+    python -m huligutta.tablebase tablebase.bin
+
+"""
+
+import argparse
+import json
+import time
+from math import comb
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from huligutta.bitboard import NEIGHBOR_MASKS, FULL_MASK, from_board, get_masks
+from huligutta.board import NUM_TIGERS, MAX_GOATS, CAPTURES_TO_WIN
+from huligutta.ranking import (
+    compress,
+    compress_masks,
+    expand_masks,
+    get_sets,
+    popcount,
+    rank_set,
+    rank_sets,
+)
+import address
+
+# results, from the point of view of the side to move
+DRAW = 0
+WIN = 1
+LOSS = 2
+
+# the side to move
+TIGER_TO_MOVE = 0
+GOAT_TO_MOVE = 1
+
+# the result is stored in the top two bits of a value, the distance below it
+_RESULT_SHIFT = 14
+_DISTANCE_MASK = (1 << _RESULT_SHIFT) - 1
+
+_MAGIC = b"HULITB01"
+
+# marks a state without a capture in _Solver.capture_max
+# (distances are never this large, see _DISTANCE_MASK)
+_NO_CAPTURE = np.iinfo(np.uint16).max
+
+_N = address.NUM_POSITIONS
+
+# the number of positions that don't hold a tiger
+_NUM_FREE = _N - NUM_TIGERS
+
+_NEIGHBOR_MASKS = np.array(NEIGHBOR_MASKS, dtype=np.int64)
+
+# every directed pair of adjacent positions
+_EDGES = [(i, j) for i, adjs in enumerate(address.NEIGHBORS) for j in adjs]
+
+# every (tiger, goat, landing) capture
+_CAPTURES = [(i, j, k) for i, j, k in address.JUMPS if not address.CORNERS[j]]
+
+# every set of tiger positions, ordered by rank (see huligutta.ranking)
+_TIGER_MASKS = get_sets(_N, NUM_TIGERS)
+_NUM_TIGER_SETS = len(_TIGER_MASKS)
+
+
+def _count_steps(pieces: np.ndarray, empty: np.ndarray) -> np.ndarray:
+    """Count the moves to adjacent empty positions the pieces can make."""
+    steps = np.zeros(pieces.shape, dtype=np.int64)
+    for i in range(_N):
+        steps += ((pieces >> i) & 1) * popcount(_NEIGHBOR_MASKS[i] & empty)
+    return steps
+
+
+def _can_tigers_move(tigers: np.ndarray, goats: np.ndarray) -> np.ndarray:
+    empty = FULL_MASK & ~(tigers | goats)
+    mobile = _count_steps(tigers, empty) > 0
+    for i, j, k in _CAPTURES:
+        mobile |= ((tigers >> i) & (goats >> j) & (empty >> k) & 1).astype(bool)
+    return mobile
+
+
+def pack(result: int, distance: int) -> int:
+    """Pack a result and distance into a stored value."""
+    return result << _RESULT_SHIFT | distance
+
+
+def unpack(value: int) -> Tuple[int, int]:
+    """Unpack a stored value into a result and distance."""
+    return value >> _RESULT_SHIFT, value & _DISTANCE_MASK
+
+
+class Slice:
+    """
+    The states with a given number of goats on the board and
+    a given number of captures the tigers still need.
+
+    State indices are (side * T + tiger rank) * G + goat rank, where
+    there are T sets of tiger positions and G sets of goat positions
+    (the same as within a block of huligutta.ranking).
+    """
+
+    def __init__(self, num_goats: int, captures_needed: int, offset: int = 0):
+        self.num_goats = num_goats
+        self.captures_needed = captures_needed
+        # where this slice starts in the tablebase file (in values)
+        self.offset = offset
+
+        self.num_goat_sets = comb(_NUM_FREE, num_goats)
+        self.size = 2 * _NUM_TIGER_SETS * self.num_goat_sets
+        self._goat_masks: Optional[np.ndarray] = None
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (self.num_goats, self.captures_needed)
+
+    @property
+    def goat_masks(self) -> np.ndarray:
+        """Every set of (compressed) goat positions, ordered by rank."""
+        if self._goat_masks is None:
+            self._goat_masks = get_sets(_NUM_FREE, self.num_goats)
+        return self._goat_masks
+
+    def index(self, side, tigers, goats) -> np.ndarray:
+        """Get the index of states."""
+        tiger_rank = rank_sets(tigers)
+        goat_rank = rank_sets(compress_masks(goats, tigers), _NUM_FREE)
+        return (side * _NUM_TIGER_SETS + tiger_rank) * self.num_goat_sets + goat_rank
+
+    def index_scalar(self, side: int, tigers: int, goats: int) -> int:
+        """Get the index of a single state."""
+        tiger_rank = rank_set(tigers)
+        goat_rank = rank_set(compress(goats, tigers))
+        return (side * _NUM_TIGER_SETS + tiger_rank) * self.num_goat_sets + goat_rank
+
+    def decode(self, index: np.ndarray) -> tuple:
+        """Get the side to move, tiger masks and goat masks of states."""
+        rest, goat_rank = np.divmod(index, self.num_goat_sets)
+        side, tiger_rank = np.divmod(rest, _NUM_TIGER_SETS)
+        tigers = _TIGER_MASKS[tiger_rank]
+        goats = expand_masks(self.goat_masks[goat_rank], tigers)
+        return side, tigers, goats
+
+
+class _Solver:
+    """Retrograde analysis of a single slice."""
+
+    def __init__(self, s: Slice, values: np.ndarray, prev: Optional[tuple]):
+        self.slice = s
+        # the result of every state, filled in by solve()
+        self.values = values
+        # the slice captures lead into, and its values
+        self.prev = prev
+
+        # the number of moves of each unlabeled state that
+        # don't lead to a win for the opponent (yet)
+        self.count = np.zeros(s.size, dtype=np.uint8)
+        # the greatest distance of a capture that loses (tigers only),
+        # or _NO_CAPTURE if no capture loses
+        self.capture_max = np.full(s.size // 2, _NO_CAPTURE, dtype=np.uint16)
+
+        # states to label, by distance
+        self.wins: Dict[int, List[np.ndarray]] = {}
+        self.losses: Dict[int, List[np.ndarray]] = {}
+
+    def _add(self, buckets: dict, distance, index):
+        """Add states to label at their distances."""
+        if np.isscalar(distance):
+            if len(index):
+                buckets.setdefault(int(distance), []).append(index)
+            return
+        for d in np.unique(distance):
+            buckets.setdefault(int(d), []).append(index[distance == d])
+
+    def _init_states(self, start: int, stop: int):
+        """Count the moves of the states with tiger ranks in [start, stop)."""
+        s = self.slice
+        num_sets = s.num_goat_sets
+        tiger_rank = np.repeat(np.arange(start, stop), num_sets)
+        tigers = _TIGER_MASKS[tiger_rank]
+        goats = expand_masks(np.tile(s.goat_masks, stop - start), tigers)
+        empty = FULL_MASK & ~(tigers | goats)
+        tiger_index = tiger_rank * num_sets + np.tile(np.arange(num_sets), stop - start)
+        goat_index = tiger_index + _NUM_TIGER_SETS * num_sets
+
+        # tiger to move
+        # ----------------
+        tiger_steps = _count_steps(tigers, empty)
+        num_captures = np.zeros(tigers.shape, dtype=np.int64)
+        count = tiger_steps.copy()
+        capture_min = np.full(tigers.shape, -1, dtype=np.int64)
+        capture_max = np.zeros(tigers.shape, dtype=np.uint16)
+        has_losing_capture = np.zeros(tigers.shape, dtype=bool)
+
+        for i, j, k in _CAPTURES:
+            can = ((tigers >> i) & (goats >> j) & (empty >> k) & 1).astype(bool)
+            if not can.any():
+                continue
+            num_captures += can
+            if s.captures_needed == 1:  # capturing wins the game
+                capture_min[can] = 0
+                continue
+
+            prev_slice, prev_values = self.prev
+            new_tigers = tigers[can] ^ ((1 << i) | (1 << k))
+            new_goats = goats[can] ^ (1 << j)
+            result, distance = np.divmod(
+                prev_values[prev_slice.index(GOAT_TO_MOVE, new_tigers, new_goats)],
+                1 << _RESULT_SHIFT,
+            )
+            rows = np.flatnonzero(can)
+            # the goats lose after this capture
+            lose = rows[result == LOSS]
+            d = distance[result == LOSS].astype(np.int64)
+            better = (capture_min[lose] < 0) | (d < capture_min[lose])
+            capture_min[lose[better]] = d[better]
+            # the goats win after this capture
+            win = rows[result == WIN]
+            capture_max[win] = np.maximum(capture_max[win], distance[result == WIN])
+            has_losing_capture[win] = True
+            # the capture draws
+            count[rows[result == DRAW]] += 1
+
+        # states that win by capturing can never run out of moves
+        can_win = capture_min >= 0
+        count[can_win] = 255
+        self.count[tiger_index] = np.minimum(count, 255)
+        self.capture_max[tiger_index] = np.where(
+            has_losing_capture, capture_max, _NO_CAPTURE
+        )
+
+        stuck = (tiger_steps + num_captures) == 0
+        self._add(self.losses, 0, tiger_index[stuck])
+
+        self._add(self.wins, capture_min[can_win] + 1, tiger_index[can_win])
+
+        # every move is a capture that loses
+        all_lose = ~stuck & ~can_win & (count == 0)
+        self._add(self.losses, capture_max[all_lose] + 1, tiger_index[all_lose])
+
+        # goat to move
+        # ----------------
+        # the goats win as soon as the tigers cannot move
+        mobile = _can_tigers_move(tigers, goats)
+        self._add(self.wins, 0, goat_index[~mobile])
+
+        # goats that cannot move pass their turn
+        goat_steps = _count_steps(goats, empty)
+        self.count[goat_index] = np.minimum(np.maximum(goat_steps, 1), 255)
+
+    def _predecessors(self, index: np.ndarray) -> np.ndarray:
+        """
+        Get the states that can reach the given states in one move
+        (including passes), without captures.
+        """
+        s = self.slice
+        side, tigers, goats = s.decode(index)
+        found_side, found_tigers, found_goats = [], [], []
+
+        # tiger moves lead to goat-to-move states
+        is_goat = side == GOAT_TO_MOVE
+        t, g = tigers[is_goat], goats[is_goat]
+        empty = FULL_MASK & ~(t | g)
+        for i, j in _EDGES:  # a tiger moved from i to j
+            can = ((t >> j) & (empty >> i) & 1).astype(bool)
+            if can.any():
+                found_tigers.append(t[can] ^ ((1 << i) | (1 << j)))
+                found_goats.append(g[can])
+                found_side.append(np.full(can.sum(), TIGER_TO_MOVE))
+
+        # goat moves and passes lead to tiger-to-move states
+        t, g = tigers[~is_goat], goats[~is_goat]
+        empty = FULL_MASK & ~(t | g)
+        goat_tigers, goat_goats = [], []
+        for i, j in _EDGES:  # a goat moved from i to j
+            can = ((g >> j) & (empty >> i) & 1).astype(bool)
+            if can.any():
+                goat_tigers.append(t[can])
+                goat_goats.append(g[can] ^ ((1 << i) | (1 << j)))
+        passed = _count_steps(g, empty) == 0
+        goat_tigers.append(t[passed])
+        goat_goats.append(g[passed])
+
+        t, g = np.concatenate(goat_tigers), np.concatenate(goat_goats)
+        # the game was already over if the tigers couldn't move
+        mobile = _can_tigers_move(t, g)
+        found_tigers.append(t[mobile])
+        found_goats.append(g[mobile])
+        found_side.append(np.full(mobile.sum(), GOAT_TO_MOVE))
+
+        return s.index(
+            np.concatenate(found_side),
+            np.concatenate(found_tigers),
+            np.concatenate(found_goats),
+        )
+
+    def _pop(self, buckets: dict, d: int) -> np.ndarray:
+        index = np.unique(np.concatenate(buckets.pop(d, [np.empty(0, np.int64)])))
+        return index[self.values[index] == 0]  # skip labeled states
+
+    def _label(self, wins: np.ndarray, losses: np.ndarray, d: int):
+        """Find the states that are decided by states labeled at distance d."""
+        # moving into a loss for the opponent wins
+        if len(losses):
+            self._add(self.wins, d + 1, self._predecessors(losses))
+
+        # moving into a win for the opponent is one less way out
+        if len(wins):
+            found = self._predecessors(wins)
+            found = found[self.values[found] == 0]
+            np.subtract.at(self.count, found, 1)
+            lost = np.unique(found[self.count[found] == 0])
+            distance = np.full(lost.shape, d, dtype=np.int64)
+            is_tiger = lost < self.slice.size // 2
+            capture_max = self.capture_max[lost[is_tiger]]
+            has_capture = capture_max != _NO_CAPTURE
+            distance[is_tiger] = np.where(has_capture, np.maximum(d, capture_max), d)
+            self._add(self.losses, distance + 1, lost)
+
+    def solve(self, chunk_size=1 << 20):
+        s = self.slice
+        step = max(1, chunk_size // s.num_goat_sets)
+        for start in range(0, _NUM_TIGER_SETS, step):
+            self._init_states(start, min(start + step, _NUM_TIGER_SETS))
+
+        d = 0
+        while self.wins or self.losses:
+            if d > _DISTANCE_MASK:
+                raise OverflowError("distance too large to store")
+
+            wins = self._pop(self.wins, d)
+            self.values[wins] = pack(WIN, d)
+            losses = self._pop(self.losses, d)
+            self.values[losses] = pack(LOSS, d)
+
+            # all the states at this distance are labeled before
+            # any of their predecessors are looked at
+            for start in range(0, max(len(wins), len(losses)), chunk_size):
+                stop = start + chunk_size
+                self._label(wins[start:stop], losses[start:stop], d)
+            d += 1
+
+
+def get_slices(max_goats=MAX_GOATS, captures_to_win=CAPTURES_TO_WIN) -> List[Slice]:
+    """
+    Get every slice of the movement phase, in the order they are solved.
+
+    With c goats captured, at least max_goats - c goats are on the board.
+    """
+    slices = []
+    offset = 0
+    for captures_needed in range(1, captures_to_win + 1):
+        num_captured = captures_to_win - captures_needed
+        for num_goats in range(max(0, max_goats - num_captured), max_goats + 1):
+            s = Slice(num_goats, captures_needed, offset)
+            slices.append(s)
+            offset += s.size
+    return slices
+
+
+def build(path: str, max_goats=MAX_GOATS, captures_to_win=CAPTURES_TO_WIN, verbose=True):
+    """Solve every slice and write the tablebase to a file."""
+    slices = get_slices(max_goats, captures_to_win)
+    header = json.dumps(
+        {
+            "version": 1,
+            "num_positions": _N,
+            "num_tigers": NUM_TIGERS,
+            "max_goats": max_goats,
+            "captures_to_win": captures_to_win,
+            "slices": [[s.num_goats, s.captures_needed, s.offset] for s in slices],
+        }
+    ).encode()
+    data_offset = -(-(len(_MAGIC) + 4 + len(header)) // 16) * 16
+    total = sum(s.size for s in slices)
+
+    with open(path, "wb") as file:
+        file.write(_MAGIC)
+        file.write(len(header).to_bytes(4, "little"))
+        file.write(header)
+        file.truncate(data_offset + total * 2)
+
+    data = np.memmap(path, dtype="<u2", mode="r+", offset=data_offset, shape=(total,))
+    solved = {}
+    for s in slices:
+        start = time.perf_counter()
+        values = data[s.offset : s.offset + s.size]
+        prev = solved.get((s.num_goats - 1, s.captures_needed - 1))
+        _Solver(s, values, prev).solve()
+        solved[s.key] = (s, values)
+
+        if verbose:
+            results = np.bincount(values >> _RESULT_SHIFT, minlength=3)
+            print(
+                f"goats: {s.num_goats}, captures needed: {s.captures_needed}, "
+                f"states: {s.size}, win/loss/draw: "
+                f"{results[WIN]}/{results[LOSS]}/{results[DRAW]} "
+                f"({time.perf_counter() - start:.1f}s)"
+            )
+
+    data.flush()
+
+
+class Tablebase:
+    """A tablebase file, memory-mapped for probing."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            if file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a tablebase file")
+            header_size = int.from_bytes(file.read(4), "little")
+            header = json.loads(file.read(header_size))
+
+        self.captures_to_win = header["captures_to_win"]
+        self.slices = {}
+        for num_goats, captures_needed, offset in header["slices"]:
+            s = Slice(num_goats, captures_needed, offset)
+            self.slices[s.key] = s
+
+        data_offset = -(-(len(_MAGIC) + 4 + header_size) // 16) * 16
+        self.data = np.memmap(path, dtype="<u2", mode="r", offset=data_offset)
+
+    def probe_masks(
+        self, tigers: int, goats: int, num_captured: int, is_goat_turn: bool
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Get the (result, distance) of a state for the side to move,
+        or None if the state isn't in the tablebase.
+        """
+        captures_needed = self.captures_to_win - num_captured
+        s = self.slices.get((bin(goats).count("1"), captures_needed))
+        if s is None or bin(tigers).count("1") != NUM_TIGERS:
+            return None
+        side = GOAT_TO_MOVE if is_goat_turn else TIGER_TO_MOVE
+        return unpack(int(self.data[s.offset + s.index_scalar(side, tigers, goats)]))
+
+    def probe(self, board, is_goat_turn=None) -> Optional[Tuple[int, int]]:
+        """
+        Get the (result, distance) of a board for the side to move.
+
+        The side to move defaults to board.is_goat_turn. None is returned
+        if the board isn't in the movement phase.
+        """
+        if not board.is_all_goats_placed:
+            return None
+        if is_goat_turn is None:
+            is_goat_turn = board.is_goat_turn
+        tigers, goats = get_masks(board)
+        return self.probe_masks(tigers, goats, board.num_captured, is_goat_turn)
+
+    def best_move(self, board, is_goat_turn: bool) -> Optional[tuple]:
+        """
+        Get the best move for the side to move, in the format used by cpu.py.
+
+        Wins are played as quickly as possible and losses delayed as long
+        as possible. None is returned if the board isn't in the tablebase
+        or the side to move has no moves.
+        """
+        if self.probe(board, is_goat_turn) is None:
+            return None
+
+        bit_board = from_board(board)
+        if is_goat_turn:
+            moves = bit_board.get_goat_possible_moves()
+        else:
+            moves = bit_board.get_tiger_possible_moves()
+
+        best_move, best_score = None, None
+        for move in moves:
+            bit_board.move_piece(*move)
+            if bit_board.num_captured >= self.captures_to_win:
+                result = (LOSS, 0)
+            else:
+                result = self.probe(bit_board, not is_goat_turn)
+            bit_board.unmake_move()
+
+            # score the move for the side to move (higher is better)
+            if result is None or result[0] == DRAW:
+                score = 0
+            elif result[0] == LOSS:
+                score = _DISTANCE_MASK * 2 - result[1]
+            else:
+                score = -_DISTANCE_MASK * 2 + result[1]
+
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+
+        return best_move
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the endgame tablebase.")
+    parser.add_argument("path")
+    parser.add_argument("--max-goats", type=int, default=MAX_GOATS)
+    parser.add_argument("--captures-to-win", type=int, default=CAPTURES_TO_WIN)
+    args = parser.parse_args()
+    build(args.path, args.max_goats, args.captures_to_win)
+
+
+if __name__ == "__main__":
+    main()
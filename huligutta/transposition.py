@@ -0,0 +1,129 @@
+"""
+file: transposition.py
+Description: Fixed-size table of values keyed by board hashes
+"""
+
+from typing import Any, List, NamedTuple, Optional
+
+# the kinds of value an entry can hold (for alpha-beta search)
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TableEntry(NamedTuple):
+    """A value stored in a TranspositionTable."""
+
+    # the full hash of the board
+    key: int
+
+    # how deep the value was searched (0 for static evaluations)
+    depth: int
+
+    # the stored value
+    value: Any
+
+    # EXACT, LOWER_BOUND or UPPER_BOUND
+    flag: int
+
+    # the best move found, if any
+    move: Optional[tuple]
+
+    # the table generation the entry was stored in
+    generation: int
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of values keyed by board hashes
+    (i.e. Board.zobrist_hash).
+
+    Each hash maps to a bucket of two slots. The first slot keeps the
+    entry searched to the greatest depth, unless that entry is from an
+    older generation (see new_search()). The second slot always takes
+    whatever was stored last. This keeps both valuable deep results and
+    recent results without the table ever growing.
+    """
+
+    def __init__(self, size: int = 1 << 20):
+        # round the number of buckets up to a power of two
+        num_buckets = 1
+        while num_buckets * 2 < size:
+            num_buckets *= 2
+
+        self._mask = num_buckets - 1
+        self._slots: List[Optional[TableEntry]] = [None] * (num_buckets * 2)
+
+        # incremented by new_search()
+        self.generation = 0
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def capacity(self) -> int:
+        """The maximum number of entries the table can hold."""
+        return len(self._slots)
+
+    def __len__(self) -> int:
+        return sum(entry is not None for entry in self._slots)
+
+    def clear(self):
+        """Remove all entries."""
+        self._slots = [None] * len(self._slots)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def new_search(self):
+        """
+        Start a new generation.
+
+        Deep entries from previous generations can then be replaced by
+        shallower ones, so the table doesn't fill up with stale results.
+        """
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[TableEntry]:
+        """Get the entry stored for a hash, or None if there isn't one."""
+        i = (key & self._mask) * 2
+        for entry in (self._slots[i], self._slots[i + 1]):
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def get(self, key: int, default: Any = None) -> Any:
+        """Get the value stored for a hash."""
+        entry = self.probe(key)
+        return default if entry is None else entry.value
+
+    def store(
+        self,
+        key: int,
+        value: Any,
+        depth: int = 0,
+        flag: int = EXACT,
+        move: Optional[tuple] = None,
+    ):
+        """Store a value for a hash, replacing an older entry if needed."""
+        i = (key & self._mask) * 2
+        entry = TableEntry(key, depth, value, flag, move, self.generation)
+
+        deep = self._slots[i]
+        if (
+            deep is None
+            or deep.key == key
+            or deep.generation != self.generation
+            or depth >= deep.depth
+        ):
+            self._slots[i] = entry
+            # don't keep a second copy of this hash in the other slot
+            recent = self._slots[i + 1]
+            if recent is not None and recent.key == key:
+                self._slots[i + 1] = None
+        else:
+            self._slots[i + 1] = entry
@@ -0,0 +1,250 @@
+"""
+file: vectorized.py
+Description: Simulate many games in lockstep with NumPy arrays
+"""
+
+from typing import Optional
+import numpy as np
+from huligutta.actions import ACTIONS, NUM_ACTIONS, PASS_ACTION, PLACE, STEP, JUMP
+from huligutta.bitboard import BitBoard, get_masks, iter_bits
+from huligutta.board import NUM_TIGERS, MAX_GOATS, CAPTURES_TO_WIN
+from huligutta import zobrist
+import address
+
+# the contents of a position
+EMPTY = 0
+TIGER = 1
+GOAT = 2
+
+# the winner of a game (draws and unfinished games have no winner)
+NO_WINNER = 0
+TIGER_WIN = 1
+GOAT_WIN = 2
+
+# games longer than this many moves are counted as draws
+MAX_MOVES = 500
+
+# the action table as arrays (positions that don't apply are 0)
+_KIND = np.array([action.kind for action in ACTIONS], dtype=np.int8)
+_FROM = np.array([max(action.pos_from, 0) for action in ACTIONS], dtype=np.intp)
+_TO = np.array([max(action.pos_to, 0) for action in ACTIONS], dtype=np.intp)
+_OVER = np.array([max(action.pos_over, 0) for action in ACTIONS], dtype=np.intp)
+
+_PLACE_ACTIONS = np.flatnonzero(_KIND == PLACE)
+_STEP_ACTIONS = np.flatnonzero(_KIND == STEP)
+_JUMP_ACTIONS = np.flatnonzero(_KIND == JUMP)
+
+# jumps over corners are never captures
+assert not any(address.CORNERS[j] for _, j, _ in address.JUMPS)
+
+
+class VectorizedGames:
+    """
+    A batch of games that are all advanced one move at a time.
+
+    Game b is stored in row b of each array:
+    `cells` holds EMPTY, TIGER or GOAT for each position in
+    address.possible_pos, and the other arrays hold the rest of the state.
+
+    The rules are the same as huligutta.Board as played by selfplay.py:
+    tigers are placed first, goats are placed until 15 are on the board
+    and then move, and the side to move passes if it has no legal move.
+    """
+
+    def __init__(self, num_games: int, max_moves=MAX_MOVES, seed=None):
+        self.num_games = num_games
+        self.max_moves = max_moves
+        self.rng = np.random.default_rng(seed)
+
+        self.cells = np.zeros((num_games, address.NUM_POSITIONS), dtype=np.int8)
+        self.num_captured = np.zeros(num_games, dtype=np.int16)
+        self.is_all_goats_placed = np.zeros(num_games, dtype=bool)
+        self.is_goat_turn = np.zeros(num_games, dtype=bool)
+        self.num_moves = np.zeros(num_games, dtype=np.int32)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winner = np.zeros(num_games, dtype=np.int8)
+
+    def reset(self, games=None):
+        """
+        Start new games.
+
+        `games` selects which games to reset (as indices or a boolean
+        mask); by default every game is reset.
+        """
+        if games is None:
+            games = slice(None)
+        self.cells[games] = EMPTY
+        self.num_captured[games] = 0
+        self.is_all_goats_placed[games] = False
+        self.is_goat_turn[games] = False
+        self.num_moves[games] = 0
+        self.done[games] = False
+        self.winner[games] = NO_WINNER
+
+    def get_tiger_mobility(self) -> np.ndarray:
+        """For each game, check if any tiger can move or capture."""
+        tiger = self.cells == TIGER
+        goat = self.cells == GOAT
+        empty = self.cells == EMPTY
+
+        can_step = tiger[:, _FROM[_STEP_ACTIONS]] & empty[:, _TO[_STEP_ACTIONS]]
+        can_jump = (
+            tiger[:, _FROM[_JUMP_ACTIONS]]
+            & goat[:, _OVER[_JUMP_ACTIONS]]
+            & empty[:, _TO[_JUMP_ACTIONS]]
+        )
+        return can_step.any(axis=1) | can_jump.any(axis=1)
+
+    def get_legal_actions(self) -> np.ndarray:
+        """
+        Get a (num_games, NUM_ACTIONS) boolean array of the actions
+        the side to move can make in each game.
+
+        Finished games have no legal actions.
+        """
+        tiger = self.cells == TIGER
+        goat = self.cells == GOAT
+        empty = self.cells == EMPTY
+        num_tigers = tiger.sum(axis=1)
+
+        tiger_turn = ~self.is_goat_turn & ~self.done
+        goat_turn = self.is_goat_turn & ~self.done
+        tigers_placed = num_tigers >= NUM_TIGERS
+
+        legal = np.zeros((self.num_games, NUM_ACTIONS), dtype=bool)
+
+        # placing pieces (goats pass until all the tigers are placed)
+        can_place = (tiger_turn & ~tigers_placed) | (
+            goat_turn & tigers_placed & ~self.is_all_goats_placed
+        )
+        legal[:, _PLACE_ACTIONS] = empty[:, _TO[_PLACE_ACTIONS]] & can_place[:, None]
+
+        # moving pieces
+        can_move = (tiger_turn & tigers_placed) | (goat_turn & self.is_all_goats_placed)
+        movers = np.where(self.is_goat_turn[:, None], goat, tiger)
+        legal[:, _STEP_ACTIONS] = (
+            movers[:, _FROM[_STEP_ACTIONS]]
+            & empty[:, _TO[_STEP_ACTIONS]]
+            & can_move[:, None]
+        )
+
+        # capturing goats
+        legal[:, _JUMP_ACTIONS] = (
+            tiger[:, _FROM[_JUMP_ACTIONS]]
+            & goat[:, _OVER[_JUMP_ACTIONS]]
+            & empty[:, _TO[_JUMP_ACTIONS]]
+            & (tiger_turn & tigers_placed)[:, None]
+        )
+
+        legal[:, PASS_ACTION] = ~self.done & ~legal.any(axis=1)
+        return legal
+
+    def get_random_actions(self, legal: Optional[np.ndarray] = None) -> np.ndarray:
+        """Choose a random legal action for each game."""
+        if legal is None:
+            legal = self.get_legal_actions()
+        noise = self.rng.random(legal.shape)
+        noise[~legal] = -1.0
+        return noise.argmax(axis=1)
+
+    def step(self, actions, check=True) -> np.ndarray:
+        """
+        Make one action in every unfinished game.
+
+        Actions for finished games are ignored. If `check` is True, a
+        ValueError is raised if any action is not legal.
+
+        Returns a boolean array of the games that finished on this step.
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        active = ~self.done
+        rows = np.arange(self.num_games)
+
+        if check:
+            legal = self.get_legal_actions()
+            if not legal[rows[active], actions[active]].all():
+                raise ValueError("illegal action")
+
+        kind = _KIND[actions]
+        pos_from, pos_to, pos_over = _FROM[actions], _TO[actions], _OVER[actions]
+
+        # place pieces
+        place = active & (kind == PLACE)
+        self.cells[rows[place], pos_to[place]] = np.where(
+            self.is_goat_turn[place], GOAT, TIGER
+        )
+
+        # move pieces
+        move = active & ((kind == STEP) | (kind == JUMP))
+        r = rows[move]
+        self.cells[r, pos_to[move]] = self.cells[r, pos_from[move]]
+        self.cells[r, pos_from[move]] = EMPTY
+
+        # capture goats
+        jump = active & (kind == JUMP)
+        self.cells[rows[jump], pos_over[jump]] = EMPTY
+        self.num_captured += jump
+
+        self.num_moves += active & (kind != PASS_ACTION)
+
+        num_tigers = (self.cells == TIGER).sum(axis=1)
+        num_goats = (self.cells == GOAT).sum(axis=1)
+        self.is_all_goats_placed |= num_goats >= MAX_GOATS
+
+        # goats wait until all tigers are placed
+        self.is_goat_turn = np.where(
+            active, ~self.is_goat_turn & (num_tigers >= NUM_TIGERS), self.is_goat_turn
+        )
+
+        # check for the end of the games
+        tiger_win = active & (self.num_captured >= CAPTURES_TO_WIN)
+        goat_win = (
+            active
+            & ~tiger_win
+            & (num_tigers == NUM_TIGERS)
+            & ~self.get_tiger_mobility()
+        )
+        draw = active & ~tiger_win & ~goat_win & (self.num_moves >= self.max_moves)
+
+        self.winner[tiger_win] = TIGER_WIN
+        self.winner[goat_win] = GOAT_WIN
+        finished = tiger_win | goat_win | draw
+        self.done |= finished
+        return finished
+
+    def play_random(self):
+        """Play random moves until every game is finished."""
+        while not self.done.all():
+            self.step(self.get_random_actions(), check=False)
+
+    def set_board(self, game: int, board, is_goat_turn: Optional[bool] = None):
+        """
+        Copy the state of any board into a game, as a new game.
+
+        The side to move defaults to board.is_goat_turn.
+        """
+        tigers, goats = get_masks(board)
+        cells = self.cells[game]
+        cells[:] = EMPTY
+        cells[list(iter_bits(tigers))] = TIGER
+        cells[list(iter_bits(goats))] = GOAT
+        self.num_captured[game] = board.num_captured
+        self.is_all_goats_placed[game] = board.is_all_goats_placed
+        if is_goat_turn is None:
+            is_goat_turn = board.is_goat_turn
+        self.is_goat_turn[game] = is_goat_turn
+        self.num_moves[game] = 0
+        self.done[game] = False
+        self.winner[game] = NO_WINNER
+
+    def to_board(self, game: int) -> BitBoard:
+        """Copy the state of a game to a BitBoard (without its move history)."""
+        cells = self.cells[game]
+        board = BitBoard()
+        board.tigers = sum(1 << int(i) for i in np.flatnonzero(cells == TIGER))
+        board.goats = sum(1 << int(i) for i in np.flatnonzero(cells == GOAT))
+        board.num_captured = int(self.num_captured[game])
+        board.is_all_goats_placed = bool(self.is_all_goats_placed[game])
+        board.is_goat_turn = bool(self.is_goat_turn[game])
+        board.zobrist_hash = zobrist.compute_hash(board)
+        return board
@@ -0,0 +1,51 @@
+"""
+file: zobrist.py
+Description: Zobrist keys for hashing board states
+"""
+
+import random
+from typing import List
+import address
+
+# the keys are generated from a fixed seed so that hashes are the same
+# in every process (and can be saved to disk)
+_rng = random.Random(0x48554C49)
+
+
+def _key() -> int:
+    return _rng.getrandbits(64)
+
+
+# a key for a Tiger and a Goat in each position
+TIGER_KEYS: List[int] = [_key() for _ in range(address.NUM_POSITIONS)]
+GOAT_KEYS: List[int] = [_key() for _ in range(address.NUM_POSITIONS)]
+
+# a key for each number of captured goats
+# (no goats captured has no key, so an empty board hashes to 0)
+CAPTURED_KEYS: List[int] = [0] + [_key() for _ in range(address.NUM_POSITIONS)]
+
+# included once all goats have been placed
+PHASE_KEY = _key()
+
+# included when it is the goats' turn
+GOAT_TURN_KEY = _key()
+
+
+def compute_hash(board) -> int:
+    """
+    Compute the hash of a board from scratch.
+
+    Boards keep their hash up to date as moves are made, so this is only
+    needed to check that hash or to hash a board that was edited directly.
+    """
+    h = 0
+    for pos in board.get_all_tiger_positions():
+        h ^= TIGER_KEYS[address.ADDR_INDEX[pos.address]]
+    for pos in board.get_all_goat_positions():
+        h ^= GOAT_KEYS[address.ADDR_INDEX[pos.address]]
+    h ^= CAPTURED_KEYS[board.num_captured]
+    if board.is_all_goats_placed:
+        h ^= PHASE_KEY
+    if board.is_goat_turn:
+        h ^= GOAT_TURN_KEY
+    return h
@@ -0,0 +1,261 @@
+"""
+Counts the positions reachable in N moves, to test and time the rules.
+
+Every board backend must reach the same number of positions (nodes)
+with the same number of captures on the last move, which are checked
+against a golden table. To run,
+
+    python perft.py --depth 4 --board all
+
+"""
+import argparse
+import random
+import sys
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from huligutta import Board, BitBoard, VectorizedGames
+from huligutta.actions import ACTIONS, JUMP
+from huligutta.board import NUM_TIGERS
+from huligutta.search import get_moves, make_move, unmake_move
+from huligutta import zobrist
+import address
+
+# the board backends that can be counted with
+BACKENDS = ["object", "bit", "vectorized"]
+
+
+class StartPosition(NamedTuple):
+    """A position to count from, with pieces given by their addresses."""
+
+    tigers: str
+    goats: str
+    num_captured: int = 0
+    is_all_goats_placed: bool = False
+    is_goat_turn: bool = False
+
+
+# the positions to count from (goats don't take turns until all the
+# tigers are placed, so goats never move first from "start")
+POSITIONS: Dict[str, StartPosition] = {
+    "start": StartPosition("", ""),
+    "placement": StartPosition("a3 b0 d4", "b1 b2 c1 c2 c4 e1 e4"),
+    "movement": StartPosition(
+        "b3 c4 d1", "a1 a2 b1 b2 c1 c2 c3 d2 e1 e2 e3 e4 f1 f2 f3", 1, True
+    ),
+    "endgame": StartPosition(
+        "a3 c2 d3", "a1 a2 b0 b3 c3 c4 d2 e2 e3 e4 f2 f3", 4, True
+    ),
+}
+
+# the (nodes, captures) of each position at each depth, which every
+# backend must reach (random positions are only checked against each other)
+GOLDEN: Dict[Tuple[str, int], Tuple[int, int]] = {
+    ("start", 1): (23, 0),
+    ("start", 2): (506, 0),
+    ("start", 3): (10626, 0),
+    ("start", 4): (212520, 0),
+    ("start", 5): (1883280, 63840),
+    ("placement", 1): (6, 2),
+    ("placement", 2): (80, 0),
+    ("placement", 3): (541, 133),
+    ("placement", 4): (6815, 0),
+    ("placement", 5): (44956, 9519),
+    ("placement", 6): (532856, 0),
+    ("placement", 7): (3417651, 654645),
+    ("movement", 1): (7, 2),
+    ("movement", 2): (60, 0),
+    ("movement", 3): (315, 62),
+    ("movement", 4): (3063, 0),
+    ("movement", 5): (14889, 3258),
+    ("movement", 6): (157183, 0),
+    ("movement", 7): (754437, 167743),
+    ("endgame", 1): (4, 1),
+    ("endgame", 2): (44, 0),
+    ("endgame", 3): (216, 68),
+    ("endgame", 4): (2188, 0),
+    ("endgame", 5): (10727, 3307),
+    ("endgame", 6): (111841, 0),
+    ("endgame", 7): (586976, 178201),
+}
+
+_IS_JUMP = np.array([action.kind == JUMP for action in ACTIONS])
+
+
+class PerftResult(NamedTuple):
+    """The counts of a position at a depth, and how long they took."""
+
+    # the number of positions reached at the depth
+    nodes: int
+
+    # the number of those reached by a capture
+    captures: int
+
+    # the time the count took in seconds
+    seconds: float
+
+    @property
+    def nps(self) -> float:
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+
+def _is_capture(move: Optional[tuple]) -> bool:
+    return move is not None and len(move) == 2 and not address.is_adjacent(*move)
+
+
+def _get_moves(board, is_goat_turn: bool) -> Tuple[list, bool]:
+    # goats skip their turn until all the tigers are placed
+    if is_goat_turn and board.get_num_tigers() < NUM_TIGERS:
+        is_goat_turn = False
+    return get_moves(board, is_goat_turn), is_goat_turn
+
+
+def count(board, is_goat_turn: bool, depth: int) -> Tuple[int, int]:
+    """
+    Count the (nodes, captures) reachable from a board (of any kind) in
+    `depth` moves. Games that end before then don't count.
+    """
+    if depth == 0:
+        return 1, 0
+    moves, is_goat_turn = _get_moves(board, is_goat_turn)
+    if depth == 1:
+        return len(moves), sum(map(_is_capture, moves))
+
+    nodes, captures = 0, 0
+    for move in moves:
+        make_move(board, move, is_goat_turn)
+        if board.get_winner() is None:
+            n, c = count(board, not is_goat_turn, depth - 1)
+            nodes += n
+            captures += c
+        unmake_move(board, move)
+    return nodes, captures
+
+
+def count_vectorized(board, is_goat_turn: bool, depth: int) -> Tuple[int, int]:
+    """Like count(), with every position of a move played as one batch."""
+    if depth == 0:
+        return 1, 0
+    games = VectorizedGames(1, max_moves=sys.maxsize)
+    games.set_board(0, board, is_goat_turn and board.get_num_tigers() >= NUM_TIGERS)
+
+    for ply in range(depth):
+        rows, actions = np.nonzero(games.get_legal_actions())
+        if ply == depth - 1:
+            return len(actions), int(_IS_JUMP[actions].sum())
+
+        # a game for each move of each game
+        children = VectorizedGames(len(rows), max_moves=sys.maxsize)
+        for name in ("cells", "num_captured", "is_all_goats_placed", "is_goat_turn"):
+            setattr(children, name, getattr(games, name)[rows])
+        children.step(actions, check=False)
+        games = children
+    return 0, 0
+
+
+def setup(backend: str, position: StartPosition):
+    """Set up a position on a new board. Returns (board, is_goat_turn)."""
+    board = BitBoard() if backend == "bit" else Board()
+    for addr in position.tigers.split():
+        board.place_tiger(addr)
+    for addr in position.goats.split():
+        board.place_goat(addr)
+    board.move_history = []
+    board.num_captured = position.num_captured
+    board.is_all_goats_placed = position.is_all_goats_placed
+    board.is_goat_turn = position.is_goat_turn
+    board.zobrist_hash = zobrist.compute_hash(board)
+    return board, position.is_goat_turn
+
+
+def random_position(seed: int, num_moves: int) -> StartPosition:
+    """Get the position after random moves, stopping early if the game ends."""
+    rng = random.Random(seed)
+    board, is_goat_turn = BitBoard(), False
+    for _ in range(num_moves):
+        moves, is_goat_turn = _get_moves(board, is_goat_turn)
+        move = rng.choice(moves)
+        make_move(board, move, is_goat_turn)
+        if board.get_winner() is not None:
+            unmake_move(board, move)
+            break
+        is_goat_turn = not is_goat_turn
+
+    _, is_goat_turn = _get_moves(board, is_goat_turn)
+    return StartPosition(
+        " ".join(pos.address for pos in board.get_all_tiger_positions()),
+        " ".join(pos.address for pos in board.get_all_goat_positions()),
+        board.num_captured,
+        board.is_all_goats_placed,
+        is_goat_turn,
+    )
+
+
+def perft(backend: str, position: StartPosition, depth: int) -> PerftResult:
+    """Count the nodes and captures of a position with a backend."""
+    # the vectorized backend starts from a copy of an object board
+    board_name = "object" if backend == "vectorized" else backend
+    board, is_goat_turn = setup(board_name, position)
+    start = time.perf_counter()
+    if board.get_winner() is not None:
+        nodes, captures = (1, 0) if depth == 0 else (0, 0)
+    elif backend == "vectorized":
+        nodes, captures = count_vectorized(board, is_goat_turn, depth)
+    else:
+        nodes, captures = count(board, is_goat_turn, depth)
+    return PerftResult(nodes, captures, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-d", "--depth", type=int, default=4)
+    parser.add_argument("--board", choices=BACKENDS + ["all"], default="bit")
+    parser.add_argument(
+        "-p", "--position", choices=POSITIONS, action="append", help="(default: all)"
+    )
+    parser.add_argument(
+        "--random", type=int, default=0, help="also count this many random positions"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--random-moves", type=int, default=30)
+    args = parser.parse_args()
+
+    backends = BACKENDS if args.board == "all" else [args.board]
+    positions = {name: POSITIONS[name] for name in args.position or POSITIONS}
+    for i in range(args.random):
+        seed = args.seed + i
+        positions[f"random-{seed}"] = random_position(seed, args.random_moves)
+
+    failed = False
+    print(
+        f"{'position':<12} {'depth':>5} {'backend':<10} {'nodes':>10} "
+        f"{'captures':>9} {'seconds':>8} {'nodes/sec':>11}  check"
+    )
+    for name, position in positions.items():
+        for depth in range(1, args.depth + 1):
+            counts = set()
+            for backend in backends:
+                result = perft(backend, position, depth)
+                counts.add(result[:2])
+                golden = GOLDEN.get((name, depth))
+                if golden is None:
+                    check = "-"
+                else:
+                    check = "ok" if golden == result[:2] else f"FAIL {golden}"
+                    failed |= golden != result[:2]
+                print(
+                    f"{name:<12} {depth:>5} {backend:<10} {result.nodes:>10} "
+                    f"{result.captures:>9} {result.seconds:>8.3f} "
+                    f"{result.nps:>11.0f}  {check}"
+                )
+            if len(counts) > 1:
+                print(f"{name} at depth {depth}: the backends disagree")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Plays CPU vs. CPU games without the GUI.
+
+Games are spread over a pool of worker processes. To run,
+
+    python selfplay.py -n 10000
+
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Iterable, List, NamedTuple, Optional
+
+from huligutta import Board, BitBoard
+import cpu
+
+# the board backends that can be used
+BOARDS = {"bit": BitBoard, "object": Board}
+
+# games longer than this many moves are counted as draws
+MAX_MOVES = 500
+
+
+class GameResult(NamedTuple):
+    """The outcome of a self-play game."""
+
+    # the seed the game was played with
+    seed: int
+
+    # "tiger", "goat", or None if the game was a draw
+    winner: Optional[str]
+
+    # the number of moves made by both sides
+    num_moves: int
+
+    # the number of goats captured
+    num_captured: int
+
+    # the notation of every move, if requested
+    moves: Optional[List[str]] = None
+
+
+def play_game(
+    seed: int, board_name: str = "bit", max_moves: int = MAX_MOVES, keep_moves=False
+) -> GameResult:
+    """Play a game of cpu.compute_tiger_move vs. cpu.compute_goat_move."""
+    random.seed(seed)
+    board = BOARDS[board_name]()
+
+    while board.num_moves < max_moves:
+        move = cpu.compute_tiger_move(board)
+        if move is None:  # tigers cannot move
+            break
+        cpu.play_move(board, move, is_tiger=True)
+        if board.get_winner():
+            break
+
+        if board.num_moves >= max_moves:
+            break
+
+        # goats wait until all tigers are placed
+        move = cpu.compute_goat_move(board)
+        if move is not None:
+            cpu.play_move(board, move, is_tiger=False)
+            if board.get_winner():
+                break
+
+    moves = [entry[0] for entry in board.move_history] if keep_moves else None
+    return GameResult(
+        seed, board.get_winner(), board.num_moves, board.num_captured, moves
+    )
+
+
+def _play_game(args: tuple) -> GameResult:
+    return play_game(*args)
+
+
+def run(
+    num_games: int,
+    processes: Optional[int] = None,
+    seed: int = 0,
+    board_name: str = "bit",
+    max_moves: int = MAX_MOVES,
+    keep_moves=False,
+) -> Iterable[GameResult]:
+    """
+    Play games in a pool of worker processes (or in this process,
+    if there is only one, so it can be profiled).
+
+    Game i is played with seed + i, so runs can be reproduced.
+    Results are yielded as soon as they finish, in no particular order.
+    """
+    tasks = (
+        (seed + i, board_name, max_moves, keep_moves) for i in range(num_games)
+    )
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1:
+        yield from map(_play_game, tasks)
+        return
+
+    chunksize = max(1, min(256, num_games // (processes * 8)))
+
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(_play_game, tasks, chunksize)
+
+
+def summarize(results: List[GameResult], elapsed: float) -> dict:
+    """Compute throughput, win rates and move count statistics."""
+    num_games = len(results)
+    winners = Counter(result.winner for result in results)
+    num_moves = sorted(result.num_moves for result in results)
+
+    summary = {
+        "games": num_games,
+        "seconds": round(elapsed, 3),
+        "games_per_sec": round(num_games / elapsed, 1) if elapsed else None,
+        "moves_per_sec": round(sum(num_moves) / elapsed, 1) if elapsed else None,
+        "tiger_win_rate": winners["tiger"] / num_games if num_games else None,
+        "goat_win_rate": winners["goat"] / num_games if num_games else None,
+        "draw_rate": winners[None] / num_games if num_games else None,
+    }
+    if num_games:
+        deciles = statistics.quantiles(num_moves, n=10) if num_games > 1 else []
+        summary["moves"] = {
+            "min": num_moves[0],
+            "mean": round(statistics.mean(num_moves), 1),
+            "median": statistics.median(num_moves),
+            "deciles": deciles,
+            "max": num_moves[-1],
+        }
+    return summary
+
+
+def print_histogram(results: List[GameResult], bins=10, width=50):
+    """Print a histogram of the number of moves per game."""
+    num_moves = [result.num_moves for result in results]
+    low, high = min(num_moves), max(num_moves)
+    size = max(1, -(-(high - low + 1) // bins))  # round up
+
+    counts = Counter((n - low) // size for n in num_moves)
+    most = max(counts.values())
+    for i in range(bins):
+        start = low + i * size
+        if start > high:
+            break
+        bar = "#" * round(width * counts[i] / most)
+        print(f"{start:>5}-{start + size - 1:<5} {counts[i]:>8} {bar}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--games", type=int, default=1000)
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board", choices=BOARDS, default="bit")
+    parser.add_argument("--max-moves", type=int, default=MAX_MOVES)
+    parser.add_argument(
+        "-o", "--output", help="write every game to this file as JSON lines"
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = []
+    output = open(args.output, "a") if args.output else None
+    try:
+        for result in run(
+            args.games,
+            args.processes,
+            args.seed,
+            args.board,
+            args.max_moves,
+            keep_moves=output is not None,
+        ):
+            results.append(result)
+            if output:
+                output.write(json.dumps(result._asdict()) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps(summarize(results, elapsed), indent=2))
+    if results:
+        print_histogram(results)
+
+
+if __name__ == "__main__":
+    main()